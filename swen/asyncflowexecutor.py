@@ -0,0 +1,124 @@
+from . import flowexecutor
+from . import dag
+from . import process
+from . import step as step_module
+import asyncio
+import logging
+
+
+class AsyncFlowExecutor(flowexecutor.FlowExecutor):
+    """
+    This class executes a flow on an asyncio event loop.
+    Steps are spawned with `asyncio.create_subprocess_exec` and awaited,
+    so a single thread can supervise any number of concurrent flows.
+    `on_status_change` callbacks may be coroutine functions.
+    """
+
+    def __init__(self, yaml_data, max_parallel=None, vars=None, timeout=None, trace_size=None, trace_file=None):
+        super().__init__(yaml_data, max_parallel=max_parallel, vars=vars, timeout=timeout,
+                         trace_size=trace_size, trace_file=trace_file)
+
+    async def execute(self):
+        try:
+            return await self._execute()
+        finally:
+            await self._stop_services_async()
+            self._trace.close()
+
+    async def _execute(self):
+        deadline = process.deadline_after(self._timeout)
+
+        if self.flow.is_dag:
+            return await self._execute_dag(deadline)
+
+        (exit_code, stdout, stderr) = None, None, None
+
+        for step in self.flow.next_step():
+            if step.step is None:
+                self._trace.add(step)
+            else:
+                (exit_code, stdout, stderr) = await self._execute_step_async(step, exit_code, stdout, stderr, deadline)
+
+                logging.debug("Executed step: %s, exit_code=%r, stdout=%r, stderr=%r", step.id, exit_code, stdout, stderr)
+
+                # Terminate the flow if the step exit code is not success
+                # and no on_failure/on_exit_code transition handles it
+                if not self.flow.routes(step):
+                    break
+
+                # No transition can help once the flow-wide deadline has passed
+                if self._deadline_expired(deadline):
+                    break
+
+        return (exit_code, stdout, stderr)
+
+    async def _stop_services_async(self):
+        loop = asyncio.get_event_loop()
+
+        for step in self.flow.steps.values():
+            if await loop.run_in_executor(None, step.stop_service):
+                await step.set_status_async(step_module.Status.TERMINATED)
+
+    async def _execute_step_async(self, step, exit_code=None, stdout=None, stderr=None, deadline=None, semaphore=None):
+        """
+        Same as `FlowExecutor._execute_step`, but waiting for a retry
+        is a sleep on the event loop, not in a thread, and doesn't hold
+        a slot of `semaphore`
+        """
+
+        attempt = 1
+
+        while True:
+            if semaphore is None:
+                result = await step.execute_async(exit_code=exit_code, stdout=stdout, stderr=stderr, deadline=deadline)
+            else:
+                async with semaphore:
+                    result = await step.execute_async(exit_code=exit_code, stdout=stdout, stderr=stderr, deadline=deadline)
+
+            self._record_attempt(step, attempt)
+
+            delay = self._retry_delay(step, attempt, result[0], deadline)
+            if delay is None:
+                return result
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _execute_dag(self, deadline=None):
+        """
+        Run steps as soon as their dependencies are satisfied,
+        up to `max_parallel` steps at a time
+        """
+
+        scheduler = dag.DagScheduler(self.flow.steps, self.flow.table)
+        semaphore = asyncio.Semaphore(self._max_parallel)
+        running = {}
+
+        logging.debug("Executing flow as a DAG (max_parallel=%s)", self._max_parallel)
+
+        try:
+            while not scheduler.finished:
+                for step in scheduler.ready():
+                    if step.step is None:
+                        self._trace.add(step)
+                        scheduler.complete(step, (None, None, None))
+                        continue
+
+                    execution = self._execute_step_async(step, stdout=scheduler.stdin_for(step), deadline=deadline, semaphore=semaphore)
+                    running[asyncio.ensure_future(execution)] = step
+
+                if not running:
+                    continue
+
+                (done, _) = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    step = running.pop(task)
+                    (exit_code, stdout, stderr) = task.result()
+                    logging.debug("Executed step: %s, exit_code=%r, stdout=%r, stderr=%r", step.id, exit_code, stdout, stderr)
+                    scheduler.complete(step, (exit_code, stdout, stderr))
+        finally:
+            for task in running:
+                task.cancel()
+
+        return scheduler.result()
@@ -0,0 +1,184 @@
+import os
+import glob
+import json
+import heapq
+import time
+import logging
+import itertools
+import concurrent.futures
+
+from . import flowexecutor
+from . import loader
+
+
+class BatchResult:
+    """
+    This class holds the outcome of a single flow executed in a batch
+    """
+
+    def __init__(self, path, exit_code=None, elapsed=None, error=None, priority=0):
+        self.path = path
+        self.exit_code = exit_code
+        self.elapsed = elapsed
+        self.error = error
+        self.priority = priority
+
+    @property
+    def passed(self):
+        return self.error is None and self.exit_code in (0, None)
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'priority': self.priority,
+            'exit_code': self.exit_code,
+            'elapsed': self.elapsed,
+            'error': self.error,
+            'passed': self.passed,
+        }
+
+
+class BatchReport:
+    """
+    This class aggregates the results of a batch run
+    """
+
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def passed(self):
+        return [r for r in self.results if r.passed]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.passed]
+
+    @property
+    def exit_code(self):
+        return 0 if not self.failed else 1
+
+    def summary(self):
+        lines = []
+
+        for r in self.results:
+            line = "{:<4} {:>9.3f}s  {}".format('PASS' if r.passed else 'FAIL', r.elapsed or 0.0, r.path)
+            if r.error is not None:
+                line += " ({})".format(r.error)
+            elif not r.passed:
+                line += " (exit_code={!r})".format(r.exit_code)
+            lines.append(line)
+
+        lines.append("{} flows, {} passed, {} failed in {:.3f}s".format(
+            len(self.results), len(self.passed), len(self.failed), self.elapsed))
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return json.dumps({
+            'elapsed': self.elapsed,
+            'total': len(self.results),
+            'passed': len(self.passed),
+            'failed': len(self.failed),
+            'results': [r.as_dict() for r in self.results],
+        }, indent=4)
+
+
+def _execute_flow(path, streaming, max_parallel=None):
+    """
+    Execute a flow file in a worker. Kept at module level so that
+    it can be sent to a process pool.
+    """
+
+    start = time.monotonic()
+
+    try:
+        with open(path) as yml:
+            fe = flowexecutor.FlowExecutor(yml, streaming=streaming, max_parallel=max_parallel)
+            (exit_code, stdout, stderr) = fe.execute()
+        return (exit_code, time.monotonic() - start, None)
+    except Exception as e:
+        logging.exception("Flow %r raised an exception", path)
+        return (None, time.monotonic() - start, '{}: {}'.format(type(e).__name__, e))
+
+
+class BatchRunner:
+    """
+    This class executes many flows on a pool of workers.
+
+    Flows with a higher priority are started first (the priority
+    is given to `add` or read from the flow's `priority:` key).
+    At most `workers` flows run at any moment, and at most `max_parallel`
+    steps at once in each of the DAG flows.
+    """
+
+    def __init__(self, workers=None, processes=False, streaming=False, max_parallel=None):
+        self._workers = workers or os.cpu_count() or 1
+        self._processes = processes
+        self._streaming = streaming
+        self._max_parallel = max_parallel
+        self._queue = []
+        self._counter = itertools.count()
+
+    @staticmethod
+    def expand(pattern):
+        """
+        Expand a flow file, a directory (all *.yml files under it) or a glob.
+        Raise a FileNotFoundError if a directory or a glob has no flow.
+        """
+
+        paths = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        flows = []
+
+        for path in paths:
+            if os.path.isdir(path):
+                flows.extend(sorted(glob.glob(os.path.join(path, '**', '*.yml'), recursive=True)))
+            else:
+                flows.append(path)
+
+        if not flows:
+            raise FileNotFoundError("No flow found in {!r}".format(pattern))
+
+        return flows
+
+    @staticmethod
+    def _read_priority(path):
+        try:
+            with open(path) as yml:
+                parsed_yaml = loader.load(yml)
+            return int(parsed_yaml.get('priority', 0))
+        except Exception:
+            return 0
+
+    def add(self, path, priority=None):
+        if priority is None:
+            priority = self._read_priority(path)
+
+        heapq.heappush(self._queue, (-priority, next(self._counter), path))
+
+    def run(self):
+        """
+        Execute every added flow and return a `BatchReport`
+        """
+
+        pool_class = concurrent.futures.ProcessPoolExecutor if self._processes else concurrent.futures.ThreadPoolExecutor
+        results = []
+        running = {}
+        start = time.monotonic()
+
+        logging.debug("Executing %s flows on %s workers", len(self._queue), self._workers)
+
+        with pool_class(max_workers=self._workers) as pool:
+            while self._queue or running:
+                while self._queue and len(running) < self._workers:
+                    (priority, _, path) = heapq.heappop(self._queue)
+                    running[pool.submit(_execute_flow, path, self._streaming, self._max_parallel)] = (path, -priority)
+
+                (done, _) = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    (path, priority) = running.pop(future)
+                    (exit_code, elapsed, error) = future.result()
+                    results.append(BatchResult(path, exit_code, elapsed, error, priority))
+
+        return BatchReport(results, time.monotonic() - start)
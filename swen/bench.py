@@ -0,0 +1,388 @@
+"""
+Benchmarks of swen's own overhead, independent of the commands it runs.
+
+    python -m swen.bench [--steps 10 1000 10000] [--loop 100000]
+                         [--spawn 200] [--heap 0] [--payloads 1K 1M 100M]
+                         [--only import yaml load vars memory next_step dag spawn pipe]
+                         [--compare baseline.jsonl] [--threshold 0.2]
+
+Every benchmark prints one JSON object per line, so that the results
+of two versions can be saved and compared with `--compare`, which exits
+with 1 when a benchmark got slower by more than `--threshold`.
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+import tracemalloc
+import subprocess
+
+from . import flow
+from . import flowcache
+from . import loader
+from . import step
+from . import capture
+from . import dag
+from . import process
+from . import flowexecutor
+
+BENCHMARKS = ('import', 'yaml', 'load', 'vars', 'memory', 'next_step', 'dag', 'spawn', 'pipe')
+
+# Payloads above this size are only measured in streaming mode,
+# buffering them would exhaust the memory of most machines
+MAX_BUFFERED_PAYLOAD = '1G'
+
+
+def synthetic_flow(n_steps, loop=False, with_vars=False, chain=False):
+    """
+    Return the YAML of a flow with `n_steps` steps. With `loop` set,
+    the last step transitions to itself on success, like flow_0007.
+    With `with_vars` set, the commands of the steps use vars.
+    With `chain` set, every step depends on the previous one.
+    """
+
+    lines = ['version: 1.0', 'id: "synthetic-{}"'.format(n_steps)]
+
+    if with_vars:
+        lines.extend(['vars:', '  cmd: "true"', '  prefix: s', '  arg: $prefix/$cmd'])
+
+    lines.append('flow:')
+
+    for i in range(n_steps):
+        lines.append('- id: s_{}'.format(i))
+        lines.append('  step: $cmd $arg/{}'.format(i) if with_vars else '  step: "true"')
+        if chain and i > 0:
+            lines.append('  depends_on: s_{}'.format(i - 1))
+
+    if loop:
+        lines.append('  on_success: s_{}'.format(n_steps - 1))
+
+    return '\n'.join(lines) + '\n'
+
+
+def _result(name, seconds, count, **params):
+    result = {'benchmark': name, 'seconds': seconds, 'count': count,
+              'per_op_us': seconds / count * 1e6 if count else None}
+    result.update(params)
+    return result
+
+
+def bench_import(module='swen.flowexecutor'):
+    """
+    Measure the cumulative import time of `module` in a fresh interpreter,
+    as reported by `python -X importtime`
+    """
+
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+    for line in p.stderr.decode('utf-8').splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return _result('import', int(fields[1]) / 1e6, 1, module=module)
+
+    raise RuntimeError('No import time reported for {}'.format(module))
+
+
+def bench_yaml(n_steps, pure_python=True):
+    """
+    Measure the parse of a flow of `n_steps` steps by `loader.load` against
+    `yaml.load` with libyaml and (with `pure_python` set) without it
+    """
+
+    import yaml
+
+    data = synthetic_flow(n_steps)
+    parsers = [('swen', loader.load), ('libyaml', lambda d: yaml.load(d, Loader=loader.yaml_loader()))]
+
+    if pure_python:
+        parsers.append(('python', lambda d: yaml.load(d, Loader=yaml.SafeLoader)))
+
+    results = []
+
+    for (name, parse) in parsers:
+        start = time.perf_counter()
+        parse(data)
+        results.append(_result('yaml', time.perf_counter() - start, n_steps, steps=n_steps, parser=name))
+
+    return results
+
+
+def bench_load(n_steps):
+    """
+    Measure the time to instantiate a flow of `n_steps` steps
+    (YAML parse and Cheetah rendering) with and without the flow cache
+    """
+
+    data = synthetic_flow(n_steps)
+    results = []
+
+    start = time.perf_counter()
+    flow.Flow(data, cache=False)
+    results.append(_result('load', time.perf_counter() - start, n_steps, steps=n_steps))
+
+    cache = flowcache.FlowCache()
+    flow.Flow(data, cache=cache)
+    start = time.perf_counter()
+    flow.Flow(data, cache=cache)
+    results.append(_result('load_cached', time.perf_counter() - start, n_steps, steps=n_steps))
+
+    return results
+
+
+def bench_vars(n_steps, instances=10):
+    """
+    Measure the instantiation of a flow of `n_steps` steps using vars,
+    first with its default vars then with `instances` sets of new vars,
+    substituted natively and by Cheetah (forced with a directive)
+    """
+
+    data = synthetic_flow(n_steps, with_vars=True)
+    results = []
+
+    for (engine, source) in (('native', data), ('cheetah', data + '## rendered by Cheetah\n')):
+        cache = flowcache.FlowCache()
+
+        start = time.perf_counter()
+        flow.Flow(source, cache=cache)
+        results.append(_result('vars_first', time.perf_counter() - start, n_steps, steps=n_steps, engine=engine))
+
+        start = time.perf_counter()
+        for i in range(instances):
+            flow.Flow(source, vars={'prefix': 'run_{}'.format(i)}, cache=cache)
+        results.append(_result('vars_new', time.perf_counter() - start, n_steps * instances,
+                               steps=n_steps, engine=engine))
+
+    return results
+
+
+def bench_memory(n_steps):
+    """
+    Measure the memory held by a flow of `n_steps` steps (its steps and
+    transition table, the parsed YAML is shared with the flow cache)
+    """
+
+    data = synthetic_flow(n_steps)
+    cache = flowcache.FlowCache()
+    flow.Flow(data, cache=cache)
+
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        f = flow.Flow(data, cache=cache)
+        seconds = time.perf_counter() - start
+        (size, _) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = _result('memory', seconds, n_steps, steps=len(f.steps))
+    result['bytes_per_step'] = size / n_steps
+    return result
+
+
+def bench_next_step(n_steps, transitions=None):
+    """
+    Measure the cost of a transition in `Flow.next_step`: walk a flow of
+    `n_steps` steps from start to end or, with `transitions` set, loop on
+    its last step until that many transitions were made
+    """
+
+    f = flow.Flow(synthetic_flow(n_steps, loop=transitions is not None), cache=False)
+
+    for s in f.steps.values():
+        s._exit_code = 0
+
+    count = 0
+    limit = transitions if transitions is not None else n_steps
+    start = time.perf_counter()
+
+    for s in f.next_step():
+        count += 1
+        if count >= limit:
+            break
+
+    return _result('next_step_loop' if transitions is not None else 'next_step',
+                   time.perf_counter() - start, count, steps=n_steps)
+
+
+def bench_dag(n_steps):
+    """
+    Measure the cost of scheduling a step with `DagScheduler`
+    on a chain of `n_steps` steps, without executing them
+    """
+
+    f = flow.Flow(synthetic_flow(n_steps, chain=True), cache=False)
+
+    start = time.perf_counter()
+    scheduler = dag.DagScheduler(f.steps, f.table)
+
+    while not scheduler.finished:
+        for s in scheduler.ready():
+            scheduler.complete(s, (0, None, None))
+
+    return _result('dag', time.perf_counter() - start, n_steps, steps=n_steps)
+
+
+def bench_spawn(count, backend='auto', heap=0):
+    """
+    Measure the cost of `Step.execute` for a command doing nothing
+    with the given spawn `backend`, from a process holding `heap`
+    extra megabytes of touched memory
+    """
+
+    ballast = bytearray(heap * 1024 * 1024)
+    for i in range(0, len(ballast), 4096):
+        ballast[i] = 1
+
+    s = step.Step(id='spawn', step='true')
+    saved = process.SPAWN_BACKEND
+    process.SPAWN_BACKEND = backend
+
+    try:
+        start = time.perf_counter()
+        for _ in range(count):
+            s.execute()
+        seconds = time.perf_counter() - start
+    finally:
+        process.SPAWN_BACKEND = saved
+
+    return _result('spawn', seconds, count, backend=backend, heap_mb=heap)
+
+
+def payload_flow(size):
+    """
+    Return the YAML of a flow producing `size` bytes and passing them
+    through a `with_stdin` chain
+    """
+
+    return '\n'.join([
+        'version: 1.0',
+        'id: "payload-{}"'.format(size),
+        'flow:',
+        '- id: produce',
+        '  step: head -c {} /dev/zero'.format(size),
+        '- id: forward',
+        '  step: cat',
+        '  with_stdin: true',
+        '- id: count',
+        '  step: wc -c',
+        '  with_stdin: true',
+    ]) + '\n'
+
+
+def bench_pipe(size, streaming):
+    """
+    Measure the throughput of a `with_stdin` chain carrying `size` bytes
+    """
+
+    fe = flowexecutor.FlowExecutor(payload_flow(size), streaming=streaming)
+    start = time.perf_counter()
+    (exit_code, stdout, _) = fe.execute()
+    seconds = time.perf_counter() - start
+
+    if exit_code != 0 or int(stdout) != size:
+        raise RuntimeError('Pipe benchmark failed: exit_code={!r}, stdout={!r}'.format(exit_code, stdout))
+
+    result = _result('pipe_streaming' if streaming else 'pipe_buffered', seconds, 1, payload=size)
+    result['mb_per_s'] = size / seconds / 1e6 if seconds else None
+    return result
+
+
+def _key(result):
+    return tuple(sorted((k, v) for (k, v) in result.items()
+                        if k not in ('seconds', 'count', 'per_op_us', 'mb_per_s', 'bytes_per_step')))
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the results annotated with their ratio to the matching
+    baseline result and whether they regressed by more than `threshold`
+    """
+
+    previous = {_key(r): r for r in baseline}
+    compared = []
+
+    for r in results:
+        r = dict(r)
+        base = previous.get(_key(r))
+        if base is not None and base['seconds']:
+            r['ratio'] = (r['seconds'] / r['count']) / (base['seconds'] / base['count'])
+            r['regression'] = r['ratio'] > 1 + threshold
+        compared.append(r)
+
+    return compared
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='swen.bench')
+    parser.add_argument('--steps', type=int, nargs='+', default=[10, 1000, 10000],
+                        help='sizes of the synthetic flows')
+    parser.add_argument('--loop', type=int, default=100000,
+                        help='number of transitions of the looping flow')
+    parser.add_argument('--spawn', type=int, default=200,
+                        help='number of steps executed by the spawn benchmark')
+    parser.add_argument('--heap', type=int, default=0,
+                        help='megabytes of memory held by the process during the spawn benchmark')
+    parser.add_argument('--payloads', nargs='+', default=['1K', '1M', '100M'],
+                        help='sizes of the payloads of the pipe benchmark (e.g. 1K, 10G)')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help='benchmarks to run')
+    parser.add_argument('--compare',
+                        help='JSON lines file of previous results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='slowdown ratio reported as a regression by --compare')
+
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+
+    results = []
+
+    if 'import' in args.only:
+        results.append(bench_import())
+
+    if 'yaml' in args.only:
+        for n in args.steps:
+            results.extend(bench_yaml(n))
+
+    if 'load' in args.only:
+        for n in args.steps:
+            results.extend(bench_load(n))
+
+    if 'vars' in args.only:
+        for n in args.steps:
+            results.extend(bench_vars(n))
+
+    if 'memory' in args.only:
+        results.extend(bench_memory(n) for n in args.steps)
+
+    if 'next_step' in args.only:
+        results.extend(bench_next_step(n) for n in args.steps)
+        results.append(bench_next_step(2, transitions=args.loop))
+
+    if 'dag' in args.only:
+        results.extend(bench_dag(n) for n in args.steps)
+
+    if 'spawn' in args.only:
+        for backend in ('popen', 'posix_spawn'):
+            results.append(bench_spawn(args.spawn, backend, args.heap))
+
+    if 'pipe' in args.only:
+        for size in map(capture.parse_size, args.payloads):
+            results.append(bench_pipe(size, streaming=True))
+            if size <= capture.parse_size(MAX_BUFFERED_PAYLOAD):
+                results.append(bench_pipe(size, streaming=False))
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            results = compare(results, [json.loads(line) for line in f if line.strip()], args.threshold)
+
+    for r in results:
+        print(json.dumps(r))
+
+    return not any(r.get('regression') for r in results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
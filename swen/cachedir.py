@@ -0,0 +1,30 @@
+import os
+import stat
+import logging
+
+
+def private(path):
+    """
+    Create the cache directory `path` if needed and return True if it
+    can be trusted: a directory (not a symlink) owned by the current user
+    that nobody else can access. What is read back from a cache ends up
+    in the commands swen runs, so a directory others can write to (a shared
+    or /tmp-style cache) is not used.
+    """
+
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+    except OSError as e:
+        logging.warning("Not using cache directory %s: %s", path, e)
+        return False
+
+    if not stat.S_ISDIR(st.st_mode):
+        logging.warning("Not using cache directory %s: not a directory", path)
+        return False
+
+    if st.st_uid != os.geteuid() or st.st_mode & 0o077:
+        logging.warning("Not using cache directory %s: it must be owned by the current user with mode 0700", path)
+        return False
+
+    return True
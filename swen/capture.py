@@ -0,0 +1,314 @@
+import os
+import io
+import time
+import mmap
+import weakref
+import selectors
+import logging
+import tempfile
+import collections
+
+
+# Chunk sizes used when moving data between swen and child processes.
+# Writes are non-blocking, so a chunk larger than the free space of a pipe
+# is written partially instead of blocking.
+READ_CHUNK = 64 * 1024
+WRITE_CHUNK = 1024 * 1024
+
+_SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# Captured outputs above this size are moved from memory to a temporary file.
+# Unset by default: outputs stay `bytes` unless spilling is asked for,
+# here or with the `capture: {spill: ...}` setting of a step
+SPILL_THRESHOLD = os.environ.get('SWEN_SPILL_THRESHOLD')
+
+
+def parse_size(value):
+    """
+    Convert a size given in YAML (e.g. 4096, "64K", "10M", "1G") to bytes
+    """
+
+    if value is None or isinstance(value, int):
+        return value
+
+    value = str(value).strip().upper().rstrip('B')
+
+    if value and value[-1] in _SIZE_SUFFIXES:
+        return int(float(value[:-1]) * _SIZE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+class SpilledOutput(mmap.mmap):
+    """
+    This class is a captured output that was spilled to a temporary file.
+
+    It is a read-only `mmap` of the file, so in-process consumers can use
+    it wherever bytes-like objects are accepted without loading it in memory,
+    while child processes read the file directly through `open()`.
+    The file is removed once the output is closed or garbage collected.
+    """
+
+    def __new__(cls, path):
+        with open(path, 'rb') as f:
+            self = super().__new__(cls, f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.path = path
+        self._finalizer = weakref.finalize(self, _remove, path)
+        return self
+
+    def open(self):
+        """
+        Return a new file object reading the output from its start,
+        suitable as the stdin of a child process
+        """
+
+        return open(self.path, 'rb')
+
+    def close(self):
+        super().close()
+        self._finalizer()
+
+    def __eq__(self, other):
+        if isinstance(other, (bytes, bytearray, memoryview, mmap.mmap)):
+            return len(self) == len(other) and self[:] == bytes(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Pickled as plain bytes
+        return (bytes, (self[:],))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class Capture:
+    """
+    This class collects the output of a child process stream.
+
+    By default everything is kept. With `head` and/or `tail` set only the
+    first `head` and the last `tail` bytes are retained and the rest is
+    counted in `dropped`. With `spill` (or `SPILL_THRESHOLD`) set, retained
+    data above `spill` bytes is moved from memory to a temporary file and
+    an unbounded capture then returns it as a `SpilledOutput`.
+    """
+
+    def __init__(self, head=None, tail=None, spill=None):
+        self._head_limit = parse_size(head)
+        self._tail_limit = parse_size(tail)
+        self._spill = parse_size(SPILL_THRESHOLD if spill is None else spill)
+        self._bounded = self._head_limit is not None or self._tail_limit is not None
+        self._head = io.BytesIO()
+        self._spill_path = None
+        self._value = None
+        self._head_size = 0
+        self._tail = collections.deque()
+        self._tail_size = 0
+        self._size = 0
+        self._dropped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Create a capture from a step's `capture:` settings
+        """
+
+        if config is None:
+            return cls()
+        return cls(head=config.get('head'), tail=config.get('tail'), spill=config.get('spill'))
+
+    @property
+    def size(self):
+        """
+        Total number of bytes written to the capture
+        """
+
+        return self._size
+
+    @property
+    def dropped(self):
+        """
+        Number of bytes discarded because of the head/tail limits
+        """
+
+        return self._dropped
+
+    def _write_head(self, data):
+        self._head.write(data)
+        self._head_size += len(data)
+
+        if self._spill_path is None and self._spill and self._head_size > self._spill:
+            (fd, self._spill_path) = tempfile.mkstemp(prefix='swen-output-')
+            spilled = open(fd, 'w+b')
+            spilled.write(self._head.getbuffer())
+            self._head = spilled
+
+    def write(self, data):
+        self._size += len(data)
+
+        if not self._bounded:
+            self._write_head(data)
+            return
+
+        if self._head_limit:
+            room = self._head_limit - self._head_size
+            if room > 0:
+                self._write_head(data[:room])
+                data = data[room:]
+
+        if not data:
+            return
+
+        if not self._tail_limit:
+            self._dropped += len(data)
+            return
+
+        self._tail.append(bytes(data))
+        self._tail_size += len(data)
+
+        while self._tail_size > self._tail_limit:
+            excess = self._tail_size - self._tail_limit
+            chunk = self._tail[0]
+
+            if len(chunk) <= excess:
+                self._tail.popleft()
+                self._tail_size -= len(chunk)
+                self._dropped += len(chunk)
+            else:
+                self._tail[0] = chunk[excess:]
+                self._tail_size -= excess
+                self._dropped += excess
+
+    def getvalue(self):
+        if self._value is not None:
+            return self._value
+
+        if self._spill_path is not None and not self._tail:
+            # Hand the file over to the output, which removes it when done
+            self._head.close()
+            self._value = SpilledOutput(self._spill_path)
+            self._spill_path = None
+            return self._value
+
+        self._head.seek(0)
+        return self._head.read() + b''.join(self._tail)
+
+    def close(self):
+        self._head.close()
+
+        if self._spill_path is not None:
+            _remove(self._spill_path)
+            self._spill_path = None
+
+
+def drain(readers, writers=None, deadline=None):
+    """
+    Move data between swen and child processes without blocking on any
+    single stream: `readers` maps readable streams to the `Capture` that
+    collects them, `writers` maps writable streams to the bytes to feed
+    them (None just closes the stream).
+
+    All streams are multiplexed with a selector in the calling thread,
+    so a child filling one pipe can never deadlock on another.
+    Every stream is closed when done.
+
+    Return False if `deadline` (a `time.monotonic()` value) expired
+    before all streams were done, True otherwise.
+    """
+
+    writers = writers or {}
+
+    with selectors.DefaultSelector() as selector:
+        pending = {}
+
+        for stream, data in writers.items():
+            if data:
+                os.set_blocking(stream.fileno(), False)
+                pending[stream] = [memoryview(data), 0]
+                selector.register(stream, selectors.EVENT_WRITE)
+            else:
+                _close(stream)
+
+        for stream in readers:
+            selector.register(stream, selectors.EVENT_READ)
+
+        while selector.get_map():
+            timeout = None if deadline is None else deadline - time.monotonic()
+
+            if timeout is not None and timeout <= 0:
+                for key in list(selector.get_map().values()):
+                    selector.unregister(key.fileobj)
+                    _close(key.fileobj)
+                return False
+
+            for key, events in selector.select(timeout):
+                stream = key.fileobj
+
+                if stream in pending:
+                    view, offset = pending[stream]
+                    try:
+                        offset += os.write(key.fd, view[offset:offset + WRITE_CHUNK])
+                    except BlockingIOError:
+                        continue
+                    except BrokenPipeError:
+                        logging.debug("Child closed its stdin before consuming all input")
+                        offset = len(view)
+
+                    pending[stream][1] = offset
+                    if offset >= len(view):
+                        selector.unregister(stream)
+                        del pending[stream]
+                        _close(stream)
+                else:
+                    data = os.read(key.fd, READ_CHUNK)
+                    if data:
+                        readers[stream].write(data)
+                    else:
+                        selector.unregister(stream)
+                        _close(stream)
+
+    return True
+
+
+async def drain_async(readers, writers=None):
+    """
+    Event-loop counterpart of `drain`: `readers` maps asyncio
+    StreamReaders to captures, `writers` maps StreamWriters to
+    the bytes to feed them
+    """
+
+    import asyncio
+
+    async def _read(stream, capture):
+        while True:
+            data = await stream.read(READ_CHUNK)
+            if not data:
+                break
+            capture.write(data)
+
+    async def _write(stream, data):
+        try:
+            if data:
+                stream.write(data)
+                await stream.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            logging.debug("Child closed its stdin before consuming all input")
+        finally:
+            stream.close()
+
+    coros = [_read(stream, capture) for (stream, capture) in readers.items()]
+    coros += [_write(stream, data) for (stream, data) in (writers or {}).items()]
+
+    await asyncio.gather(*coros)
+
+
+def _close(stream):
+    try:
+        stream.close()
+    except BrokenPipeError:
+        pass
@@ -0,0 +1,105 @@
+"""
+Thin client of the swen daemon (see `swen.server`).
+
+    python -m swen.client -f flow.yml [--socket PATH] [--streaming] [--timeout SECONDS]
+
+The flow is executed by the daemon, its stdout and stderr are written
+to the client's and the client exits with the exit code of the flow.
+Only the standard library is imported, so the client starts in the time
+it takes to start the interpreter.
+"""
+
+import os
+import sys
+import json
+import base64
+import socket
+import argparse
+
+
+class ClientError(RuntimeError):
+    """
+    Raised when the daemon could not execute a flow
+    """
+
+
+def default_socket_path():
+    """
+    Return $SWEN_SOCKET, or swen.sock in $XDG_RUNTIME_DIR (/tmp otherwise)
+    """
+
+    if 'SWEN_SOCKET' in os.environ:
+        return os.environ['SWEN_SOCKET']
+
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'swen.sock')
+
+    return '/tmp/swen-{}.sock'.format(os.getuid())
+
+
+def request(message, socket_path=None):
+    """
+    Send one JSON message to the daemon and return its JSON reply
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or default_socket_path())
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+        with sock.makefile('rb') as f:
+            reply = f.readline()
+
+    if not reply:
+        raise ClientError('The daemon closed the connection without replying')
+
+    return json.loads(reply)
+
+
+def submit(flow, socket_path=None, vars=None, streaming=False, timeout=None):
+    """
+    Execute the YAML `flow` on the daemon and return (exit_code, stdout, stderr)
+    """
+
+    reply = request({'flow': flow, 'vars': vars, 'streaming': streaming, 'timeout': timeout}, socket_path)
+
+    if reply.get('error') is not None:
+        raise ClientError(reply['error'])
+
+    return (reply['exit_code'],
+            None if reply['stdout'] is None else base64.b64decode(reply['stdout']),
+            None if reply['stderr'] is None else base64.b64decode(reply['stderr']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='swen.client')
+    parser.add_argument('-f', '--flow', required=True,
+                        help='flow file to execute')
+    parser.add_argument('--socket',
+                        help='socket of the daemon (default: {})'.format(default_socket_path()))
+    parser.add_argument('-s', '--streaming', action='store_true',
+                        help='connect consecutive with_stdin steps with OS pipes')
+    parser.add_argument('-t', '--timeout', type=float,
+                        help='deadline of the whole flow in seconds')
+
+    args = parser.parse_args(argv)
+
+    with open(args.flow) as f:
+        flow = f.read()
+
+    try:
+        (exit_code, stdout, stderr) = submit(flow, args.socket, streaming=args.streaming, timeout=args.timeout)
+    except (ClientError, OSError) as e:
+        print('swen: {}'.format(e), file=sys.stderr)
+        return 1
+
+    if stdout:
+        sys.stdout.buffer.write(stdout)
+    if stderr:
+        sys.stderr.buffer.write(stderr)
+
+    return exit_code or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
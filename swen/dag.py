@@ -0,0 +1,181 @@
+import heapq
+import logging
+import collections
+
+from . import graph
+
+
+class DagScheduler:
+    """
+    This class keeps track of which steps of a flow can run next
+    when steps declare their dependencies with `depends_on:` (or `needs:`).
+
+    The scheduler does not execute anything itself: executors ask it for
+    the steps that are `ready()`, run them however they like (thread pool,
+    event loop) and report results back with `complete()`.
+
+    Steps without dependencies that no transition leads to all start at
+    once: once a flow uses `depends_on:`, file order no longer sequences
+    steps (a warning names the steps concerned when the flow is loaded,
+    unless they declare `depends_on: []`).
+
+    Transitions keep their meaning:
+    - a step runs once all of its dependencies have succeeded;
+      if any of them failed or was skipped, the step is skipped too
+    - steps that are `on_success`/`on_failure`/`on_exit_code` targets
+      only run when some step transitions to them
+    - a failed step without a transition for its exit code stops the flow:
+      nothing new is scheduled and its result becomes the result of the flow
+    """
+
+    def __init__(self, steps, table=None):
+        self._steps = steps
+        self._table = graph.TransitionTable(steps) if table is None else table
+        self._order = {step_id: i for (i, step_id) in enumerate(steps)}
+        self._dependents = collections.defaultdict(list)
+        self._waiting = {}
+
+        # Unknown and cyclic dependencies are rejected by the table
+        for s in steps.values():
+            self._waiting[s.id] = len(s.depends_on or [])
+            for dep in s.depends_on or []:
+                self._dependents[dep].append(s.id)
+
+        routed = {target for s in steps.values() for target in (s.on_success, s.on_failure) if target is not None}
+        routed.update(self._table.ids[target]
+                      for targets in self._table.on_exit_code if targets is not None
+                      for target in targets.values())
+
+        self._triggered = {step_id for step_id in steps if step_id not in routed}
+        self._routed_from = {}
+        self._pending = set(steps)
+        self._running = set()
+        self._succeeded = set()
+        self._blocked = set()
+        self._results = {}
+        self._failed = None
+
+        # Triggered steps whose dependencies all succeeded, by flow order
+        self._ready = [(self._order[step_id], step_id) for step_id in self._triggered if not self._waiting[step_id]]
+        heapq.heapify(self._ready)
+
+    @property
+    def finished(self):
+        return not self._running and (self._failed is not None or not self._ready)
+
+    @property
+    def failed_step(self):
+        """
+        The step that failed without `on_failure` and stopped the flow (if any)
+        """
+
+        return self._failed
+
+    def ready(self):
+        """
+        Return the steps that can be started now and mark them as running
+        """
+
+        if self._failed is not None:
+            return []
+
+        ready = []
+        while self._ready:
+            (_, step_id) = heapq.heappop(self._ready)
+            self._pending.discard(step_id)
+            self._running.add(step_id)
+            ready.append(self._steps[step_id])
+
+        return ready
+
+    def stdin_for(self, step):
+        """
+        Return the input of a `with_stdin` step: the outputs of its
+        dependencies in declaration order, or the output of the step
+        that transitioned to it
+        """
+
+        if not step.with_stdin:
+            return None
+
+        sources = list(step.depends_on or [])
+        if step.id in self._routed_from:
+            sources.append(self._routed_from[step.id])
+
+        outputs = [self._results[s][1] for s in sources if self._results.get(s, (None, None))[1]]
+
+        if len(outputs) == 1:
+            # Passed as is, so that spilled outputs are not loaded in memory
+            return outputs[0]
+        return b''.join(outputs) if outputs else None
+
+    def complete(self, step, result):
+        """
+        Record the (exit_code, stdout, stderr) of a finished step
+        and work out what it unblocks
+        """
+
+        self._running.discard(step.id)
+        self._results[step.id] = result
+        exit_code = result[0]
+        succeeded = exit_code is None or exit_code == 0
+
+        targets = self._table.on_exit_code[self._table.index[step.id]]
+
+        if targets is not None and exit_code in targets:
+            target = self._table.ids[targets[exit_code]]
+        else:
+            target = step.on_success if succeeded else step.on_failure
+
+        self._trigger(step, target)
+
+        if succeeded:
+            self._succeeded.add(step.id)
+            for dependent in self._dependents[step.id]:
+                self._waiting[dependent] -= 1
+                if not self._waiting[dependent] and dependent in self._triggered:
+                    self._push(dependent)
+            return
+
+        if target is None and self._failed is None:
+            logging.debug("Step %r failed with exit_code=%r, stopping the flow", step.id, exit_code)
+            self._failed = step
+
+        self._skip_dependents(step.id)
+
+    def _trigger(self, step, target):
+        if target is None or target not in self._pending:
+            return
+
+        self._routed_from[target] = step.id
+
+        if target not in self._triggered:
+            self._triggered.add(target)
+            if not self._waiting[target]:
+                self._push(target)
+
+    def _push(self, step_id):
+        heapq.heappush(self._ready, (self._order[step_id], step_id))
+
+    def _skip_dependents(self, step_id):
+        queue = collections.deque(self._dependents[step_id])
+
+        while queue:
+            dependent = queue.popleft()
+            if dependent in self._pending and dependent not in self._blocked:
+                logging.debug("Skipping step %r: dependency %r did not succeed", dependent, step_id)
+                self._blocked.add(dependent)
+                self._pending.discard(dependent)
+                queue.extend(self._dependents[dependent])
+
+    def result(self):
+        """
+        Return the result of the flow: the result of the step that stopped
+        it, otherwise the result of the last executed step in flow order
+        """
+
+        if self._failed is not None:
+            return self._results[self._failed.id]
+
+        executed = sorted(self._results, key=self._order.get)
+        return self._results[executed[-1]] if executed else (None, None, None)
@@ -1,10 +1,44 @@
-import yaml
 import json
 import copy
 import logging
 import io
-from Cheetah.Template import Template
+import gc
+import threading
 from . import step
+from . import flowcache
+from . import graph
+from . import loader
+
+
+class _GcPause:
+    """
+    This class pauses the cyclic garbage collector while at least one
+    thread is inside it. The collector is process-wide: flows loaded
+    concurrently (by the server or a batch) share one pause, and the
+    collector is only enabled again, if it was enabled before, when the
+    last of them is done. Other threads are not collected meanwhile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._was_enabled = False
+
+    def __enter__(self):
+        with self._lock:
+            if self._depth == 0:
+                self._was_enabled = gc.isenabled()
+                gc.disable()
+            self._depth += 1
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self._depth -= 1
+            if self._depth == 0 and self._was_enabled:
+                gc.enable()
+
+
+_gc_pause = _GcPause()
 
 
 class FlowEncoder(json.JSONEncoder):
@@ -22,6 +56,9 @@ class FlowEncoder(json.JSONEncoder):
         if "template" in obj_copy:
             obj_copy["template"] = ""
 
+        for k in ("cache", "table"):
+            obj_copy.pop(k, None)
+
         return json.JSONEncoder.encode(self, obj_copy)
 
 
@@ -30,33 +67,90 @@ class Flow:
     This class facilitates access and representation of raw YAML
     """
 
-    def __init__(self, data):
-        self._parsed_yaml = self._parse_yaml(data)
-        self._flow_vars = self._parsed_yaml['vars'] if 'vars' in self._parsed_yaml else None
+    def __init__(self, data, vars=None, cache=None):
+        """
+        `vars` override or extend the `vars:` section of the flow.
+        Compiled flows are looked up in `cache` (the shared
+        `flowcache.default_cache` by default, False disables caching).
+        """
 
         if issubclass(type(data), io.IOBase):
-            data.seek(0)
-            self._template = Template(file=data, searchList=[self._flow_vars])
-        else:
-            self._template = Template(source=data, searchList=[self._flow_vars])
+            data = data.read()
 
-        logging.debug("Template after variable substitution:\n{}".format(str(self._template)))
+        if cache is None:
+            cache = flowcache.default_cache
+        elif cache is False:
+            cache = flowcache.FlowCache(size=0)
 
-        self._parsed_yaml = self._parse_yaml(str(self._template))
+        self._cache = cache
+        compiled = cache.compile(data, self._parse_yaml)
+
+        self._flow_vars = compiled.flow_vars
+        if vars:
+            self._flow_vars = dict(self._flow_vars or {}, **vars)
+
+        self._parsed_yaml = cache.render(compiled, self._flow_vars, self._parse_yaml)
         self._id = self._parsed_yaml['id'] if 'id' in self._parsed_yaml else None
         self._doc = self._parsed_yaml['doc'] if 'doc' in self._parsed_yaml else None
-        self._steps = self._create_steps(self._parsed_yaml['flow']) if 'flow' in self._parsed_yaml else {}
+        self._max_parallel = self._parsed_yaml['max_parallel'] if 'max_parallel' in self._parsed_yaml else None
+        self._timeout = self._parsed_yaml['timeout'] if 'timeout' in self._parsed_yaml else None
+        self._table = self._create_table(self._parsed_yaml['flow'] if 'flow' in self._parsed_yaml else None)
+        self._steps = graph.StepMap(self._table)
         self._current_step = None
 
+    @property
+    def id(self):
+        return self._id
+
     @property
     def parsed_yaml(self):
         return self._parsed_yaml
 
-    def _parse_yaml(self, data):
-        parsed_yaml = yaml.load(data)
-        logging.debug("Parsed YAML: {}".format(parsed_yaml))
+    @property
+    def steps(self):
+        return self._steps
+
+    @property
+    def table(self):
+        return self._table
+
+    @property
+    def max_parallel(self):
+        return self._max_parallel
+
+    @property
+    def timeout(self):
+        """
+        Flow-wide deadline in seconds
+        """
+
+        return self._timeout
+
+    @property
+    def is_dag(self):
+        """
+        A flow is executed as a DAG once any of its steps declares `depends_on:`.
+        Steps are then ordered by their dependencies only, not by file order.
+        """
+
+        return any(s.depends_on is not None for s in self._steps.values())
+
+    @staticmethod
+    def _parse_yaml(data):
+        parsed_yaml = loader.load(data)
+        logging.debug("Parsed YAML: %s", parsed_yaml)
         return parsed_yaml
 
+    def _create_table(self, steps):
+        """
+        Create the steps and compile them into a transition table. None of
+        the objects created can be garbage, so the cyclic garbage collector
+        (which would otherwise run over and over on huge flows) is paused.
+        """
+
+        with _gc_pause:
+            return graph.TransitionTable(self._create_steps(steps))
+
     def _create_steps(self, steps):
         """
         Convert steps in a flow from YAML to internal representation
@@ -71,7 +165,7 @@ class Flow:
             s = step.Step(**st)
             created_steps[s.id] = s
 
-        logging.debug('Created {} steps:\n{}'.format(len(created_steps), created_steps))
+        logging.debug('Created %s steps:\n%s', len(created_steps), created_steps)
         return created_steps
 
     def next_step(self):
@@ -80,56 +174,77 @@ class Flow:
         on the exit code from the previous step
         """
 
-        def _is_last_step(step):
-            return list(self._steps.items())[-1][0] == step.id
+        table = self._table
 
-        def _can_proceed(step):
-            return step.on_failure is not None \
-                or step.on_success is not None \
-                or step.on_exit_code is not None
+        while True:
+            logging.debug('Determining next step (current-step=%r)...', None if self._current_step is None else self._current_step.id)
 
-        def _ready_to_stop(step):
-            return _is_last_step(step) and not _can_proceed(step)
+            if len(table) == 0:
+                return
 
-        def _next_step_id(step):
-            if step.exit_code == 0 and step.on_success is not None:
-                return step.on_success
+            if self._current_step is None:
+                i = 0
+            else:
+                i = table.next(table.index[self._current_step.id], self._current_step.exit_code)
 
-            if step.exit_code != 0 and step.on_failure is not None:
-                return step.on_failure
+                if i is None:
+                    logging.debug('No more steps to process. Stopping!')
+                    return
 
-            ids = list(self._steps.keys())
-            i = ids.index(step.id)
+            self._current_step = table.steps[i]
+            logging.debug('Next step: %r', self._current_step.id)
+            yield self._current_step
 
-            try:
-                return ids[i + 1]
-            except IndexError:
-                return None
+    def routes(self, step):
+        """
+        Return True if the exit code of `step` is handled by its
+        transitions, False if the flow must stop because of it
+        """
 
-        while True:
-            logging.debug('Determining next step (current-step={!r})...'.format(None if self._current_step is None else self._current_step.id))
+        return self._table.routes(self._table.index[step.id], step.exit_code)
 
-            if len(self._steps) == 0:
-                return
+    def pipeline(self, step):
+        """
+        Return the longest run of steps starting with `step` that can
+        be streamed: every following step is the sequential successor of
+        the previous one, reads its input from it (`with_stdin`) and the
+        previous step has no explicit transitions that could route elsewhere.
+        Cached, parallel and retried steps are never streamed: they need
+        their whole input before they start. Nor are services, which
+        don't produce an output for the next step.
+        """
 
-            if self._current_step is None:
-                self._current_step = list(self._steps.items())[0][1]
-                logging.debug('Next step: {!r}'.format(self._current_step.id))
-                yield self._current_step
-                continue
+        table = self._table
+        chain = [step]
 
-            if _ready_to_stop(self._current_step):
-                logging.debug('No more steps to process. Stopping!')
-                return
+        if step.step is None or step.cache or step.parallel or step.retry or step.service is not None:
+            return chain
 
-            next_step_id = _next_step_id(self._current_step)
+        i = table.successor[table.index[step.id]]
 
-            if next_step_id is None:
-                return
+        while i is not None:
+            prev, nxt = chain[-1], table.steps[i]
 
-            self._current_step = self._steps[next_step_id]
-            logging.debug('Next step: {!r}'.format(self._current_step.id))
-            yield self._current_step
+            if prev.on_success is not None \
+                    or prev.on_failure is not None \
+                    or prev.on_exit_code is not None:
+                break
+
+            if nxt.step is None or not nxt.with_stdin or nxt.cache or nxt.parallel or nxt.retry or nxt.service is not None:
+                break
+
+            chain.append(nxt)
+            i = table.successor[i]
+
+        return chain
+
+    def skip_to(self, step):
+        """
+        Make `step` the current step, so that `next_step` continues from it.
+        Used when several steps were executed at once (e.g. as a pipeline).
+        """
+
+        self._current_step = step
 
     def __str__(self):
         return json.dumps(self.__dict__, cls=FlowEncoder, indent=4)
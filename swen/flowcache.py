@@ -0,0 +1,233 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import collections
+
+from . import cachedir
+from . import substitution
+
+
+# Key of the JSON object holding a mapping whose keys are not all strings
+_ITEMS = '\0items'
+
+
+def _dumps(data):
+    """
+    Encode parsed YAML as JSON, keeping the type of mapping keys
+    (e.g. the exit codes of `on_exit_code`). Raise a TypeError for
+    values that JSON cannot represent.
+    """
+
+    def _encode(obj):
+        if isinstance(obj, dict):
+            if _ITEMS not in obj and all(isinstance(k, str) for k in obj):
+                return {k: _encode(v) for (k, v) in obj.items()}
+            return {_ITEMS: [[_encode(k), _encode(v)] for (k, v) in obj.items()]}
+        if isinstance(obj, list):
+            return [_encode(v) for v in obj]
+        if obj is None or isinstance(obj, (str, bool, int, float)):
+            return obj
+        raise TypeError("{} values are not stored in the flow cache".format(type(obj).__name__))
+
+    return json.dumps(_encode(data)).encode('utf-8')
+
+
+def _loads(data):
+    def _decode(obj):
+        if len(obj) == 1 and _ITEMS in obj:
+            return {k: v for (k, v) in obj[_ITEMS]}
+        return obj
+
+    return json.loads(data.decode('utf-8'), object_hook=_decode)
+
+
+class CompiledFlow:
+    """
+    This class holds what is known about a flow definition
+    independently of the values of its vars: the YAML as parsed before
+    variable substitution and either its substitution plan or, for flows
+    using more than `$name` placeholders, the compiled Cheetah template class
+    """
+
+    def __init__(self, key, source, parsed_yaml):
+        self.key = key
+        self.source = source
+        self.parsed_yaml = parsed_yaml
+        self.template_class = None
+        self.uses_cheetah = substitution.CHEETAH_SYNTAX.search(source) is not None
+        self.substitution = None
+
+        if not self.uses_cheetah:
+            plan = substitution.Substitution(parsed_yaml)
+            if plan.has_placeholders:
+                self.substitution = plan
+
+        self.is_template = self.uses_cheetah or self.substitution is not None
+
+    @property
+    def flow_vars(self):
+        if isinstance(self.parsed_yaml, dict) and 'vars' in self.parsed_yaml:
+            return self.parsed_yaml['vars']
+        return None
+
+
+class FlowCache:
+    """
+    This class caches compiled flow definitions and their rendered,
+    parsed YAML so that instantiating a known flow skips both YAML
+    parses and the Cheetah template compilation.
+
+    Flows whose only template syntax is `$name` placeholders are not
+    rendered by Cheetah: their parsed YAML is substituted directly, which
+    is cheap enough that only the memory cache is used for them.
+
+    Entries are keyed by the SHA-256 of the flow source (and of its vars
+    for rendered flows) and kept in memory in LRU order. With `cache_dir`
+    set, parsed YAML is also stored on disk as JSON and survives the
+    process. Only data is stored there, never code: Cheetah templates are
+    compiled again by each process. The directory must be private to the
+    user (see `cachedir.private`), it is not used otherwise.
+
+    Cached parsed YAML is shared between flows and must be treated as read-only.
+    """
+
+    def __init__(self, size=256, cache_dir=None):
+        self._size = size
+        self._cache_dir = cache_dir if cache_dir is None or cachedir.private(cache_dir) else None
+        self._compiled = collections.OrderedDict()
+        self._rendered = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(data):
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def compile(self, source, parse):
+        """
+        Return the `CompiledFlow` for `source`, parsing it with `parse` on a miss
+        """
+
+        key = self._hash(source)
+        compiled = self._get(self._compiled, key)
+
+        if compiled is None:
+            parsed_yaml = self._load(key + '.yaml.json')
+            if parsed_yaml is None:
+                parsed_yaml = parse(source)
+                self._store(key + '.yaml.json', parsed_yaml)
+
+            compiled = CompiledFlow(key, source, parsed_yaml)
+            self._put(self._compiled, key, compiled)
+
+        return compiled
+
+    def render(self, compiled, flow_vars, parse):
+        """
+        Return the parsed YAML of `compiled` after substituting `flow_vars`.
+        Flows without any template syntax are returned as parsed by `compile`.
+        """
+
+        if not compiled.is_template:
+            return compiled.parsed_yaml
+
+        key = '{}-{}'.format(compiled.key, self._hash(json.dumps(flow_vars, sort_keys=True, default=str)))
+        parsed_yaml = self._get(self._rendered, key)
+
+        if parsed_yaml is None and compiled.substitution is not None:
+            parsed_yaml = compiled.substitution.render(flow_vars)
+            self._put(self._rendered, key, parsed_yaml)
+
+        elif parsed_yaml is None:
+            parsed_yaml = self._load(key + '.json')
+            if parsed_yaml is None:
+                # Cheetah sees the vars defined with other vars resolved, like the native path
+                template = self.template_class(compiled)(searchList=[substitution.resolve(flow_vars or {})])
+                text = str(template)
+                logging.debug("Template after variable substitution:\n%s", text)
+                parsed_yaml = parse(text)
+                self._store(key + '.json', parsed_yaml)
+
+            self._put(self._rendered, key, parsed_yaml)
+
+        return parsed_yaml
+
+    def template_class(self, compiled):
+        """
+        Return the Cheetah template class of `compiled`, compiled once per process
+        """
+
+        if compiled.template_class is None:
+            # Cheetah is only imported when a flow actually needs compiling
+            from Cheetah.Template import Template
+
+            compiled.template_class = Template.compile(source=compiled.source,
+                                                       moduleName='swen_flow_' + compiled.key,
+                                                       className='FlowTemplate')
+
+        return compiled.template_class
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+            self._rendered.clear()
+
+    def _get(self, entries, key):
+        with self._lock:
+            if key not in entries:
+                return None
+            entries.move_to_end(key)
+            return entries[key]
+
+    def _put(self, entries, key, value):
+        if self._size <= 0:
+            return
+
+        with self._lock:
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > self._size:
+                entries.popitem(last=False)
+
+    def _load(self, name):
+        if self._cache_dir is None:
+            return None
+
+        path = os.path.join(self._cache_dir, name)
+
+        try:
+            with open(path, 'rb') as f:
+                return _loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logging.warning("Ignoring corrupted flow cache entry: %s", path)
+            return None
+
+    def _store(self, name, parsed_yaml):
+        if self._cache_dir is None:
+            return
+
+        try:
+            data = _dumps(parsed_yaml)
+        except TypeError as e:
+            logging.debug("Not storing %s in the flow cache: %s", name, e)
+            return
+
+        # Write to a temporary file first so that concurrent readers
+        # never see a partially written entry
+        (fd, tmp_path) = tempfile.mkstemp(dir=self._cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self._cache_dir, name))
+
+
+def _default_cache_dir():
+    cache_dir = os.environ.get('SWEN_CACHE_DIR')
+    return None if cache_dir is None else os.path.join(cache_dir, 'flows')
+
+
+# Cache shared by all flows unless one is passed explicitly
+default_cache = FlowCache(cache_dir=_default_cache_dir())
@@ -1,5 +1,18 @@
 from . import flow
+from . import pipeline
+from . import dag
+from . import process
+from . import journal
+from . import metrics
+from . import step as step_module
+from . import retry
+from . import trace
+import os
+import time
+import heapq
 import logging
+import itertools
+import concurrent.futures
 
 
 class FlowExecutor:
@@ -7,28 +20,252 @@ class FlowExecutor:
     This class is responsible for flow execution
     """
 
-    def __init__(self, yaml_data):
-        self.flow = flow.Flow(yaml_data)
-        self._execution_graph = []
+    def __init__(self, yaml_data, streaming=False, max_parallel=None, vars=None, timeout=None,
+                 journal=None, resume=False, trace_size=None, trace_file=None):
+        """
+        `trace_size` bounds the number of records of the execution
+        trace kept in memory, older ones go to `trace_file` if set,
+        and the number of step executions whose metrics are kept
+        """
+
+        self.flow = flow.Flow(yaml_data, vars=vars)
+        self._trace = trace.ExecutionTrace(self.flow.table, capacity=trace_size, spill=trace_file)
+        self._streaming = streaming
+        self._max_parallel = max_parallel or self.flow.max_parallel or os.cpu_count() or 1
+        self._timeout = timeout or self.flow.timeout
+        self._journal_path = journal
+        self._resume = resume
+        self._metrics = metrics.FlowMetrics(self.flow.id, capacity=trace_size)
+
+    def _deadline_expired(self, deadline):
+        if deadline is not None and process.remaining(deadline) == 0:
+            logging.warning("Flow %r exceeded its deadline of %ss", self.flow.id, self._timeout)
+            return True
+        return False
 
     def execute(self):
-        (exit_code, stdout, stderr) = None, None, None
+        try:
+            return self._execute()
+        finally:
+            self._stop_services()
+            self._trace.close()
+
+    def _execute(self):
+        deadline = process.deadline_after(self._timeout)
+
+        if self.flow.is_dag:
+            if self._journal_path is not None:
+                logging.warning("Checkpointing is not supported for DAG flows, ignoring journal %r", self._journal_path)
+            return self._execute_dag(deadline)
+
+        if self._journal_path is None:
+            return self._execute_sequentially(deadline)
+
+        with journal.Journal(self._journal_path, self.flow, resume=self._resume) as j:
+            return self._execute_sequentially(deadline, j)
+
+    def _resume_from(self, j):
+        """
+        Restore the state of the steps recorded in the journal and make
+        the last checkpoint the current step of the flow. Steps that
+        stopped the flow are not checkpoints: they are executed again.
+        Nor is anything from the first service on, as services don't
+        outlive the run that started them.
+        Return the (exit_code, stdout, stderr) of the last checkpoint.
+        """
+
+        result = (None, None, None)
+        checkpoint = None
+        state = None
+
+        for record in j.records:
+            step = self.flow.steps[record['step']]
+
+            if step.service is not None:
+                break
+
+            step._exit_code = record['exit_code']
+            step._status = step_module.Status[record['status']]
+
+            if step.step is not None and not self.flow.routes(step):
+                continue
+
+            self._trace.add(step)
+            checkpoint = step
+            state = (step.exit_code, step.status)
+            result = (record['exit_code'], record['stdout'], record['stderr'])
+
+        if checkpoint is not None:
+            # A later record of the same step (a looping step that stopped
+            # the flow) must not decide where the flow goes from the checkpoint
+            (checkpoint._exit_code, checkpoint._status) = state
+            logging.info("Resuming flow %r after step %r", self.flow.id, checkpoint.id)
+            self.flow.skip_to(checkpoint)
+
+        return result
+
+    def _execute_sequentially(self, deadline=None, j=None):
+        (exit_code, stdout, stderr) = self._resume_from(j) if j is not None else (None, None, None)
 
         for step in self.flow.next_step():
-            self._execution_graph.append(step)
+            if step.step is None:
+                self._trace.add(step)
+                if j is not None:
+                    j.record(step)
+            else:
+                chain = self.flow.pipeline(step) if self._streaming else [step]
+
+                if len(chain) > 1:
+                    # Consecutive `with_stdin` steps are connected with OS pipes
+                    # and run concurrently instead of buffering each output
+                    (exit_code, stdout, stderr, step) = pipeline.Pipeline(chain).execute(stdout=stdout, deadline=deadline)
+                    self.flow.skip_to(chain[-1])
+                    for stage in chain:
+                        self._metrics.add(stage.metrics)
+                        self._trace.add(stage)
+                    if j is not None:
+                        for stage in chain[:-1]:
+                            j.record(stage)
+                        j.record(chain[-1], stdout, stderr)
+                else:
+                    (exit_code, stdout, stderr) = self._execute_step(step, exit_code, stdout, stderr, deadline)
+                    if j is not None:
+                        j.record(step, stdout, stderr)
 
-            if step.step is not None:
-                (exit_code, stdout, stderr) = step.execute(exit_code=exit_code, stdout=stdout, stderr=stderr)
-                
-                logging.debug("Executed step: {}, exit_code={!r}, stdout={!r}, stderr={!r}".format(step.id, exit_code, stdout, stderr))
+                logging.debug("Executed step: %s, exit_code=%r, stdout=%r, stderr=%r", step.id, exit_code, stdout, stderr)
 
                 # Terminate the flow if the step exit code is not success
-                # and we don't have on_failure transition set explicitly on that step
-                if exit_code != 0 and step.on_failure is None:
+                # and no on_failure/on_exit_code transition handles it
+                if not self.flow.routes(step):
+                    break
+
+                # No transition can help once the flow-wide deadline has passed
+                if self._deadline_expired(deadline):
                     break
 
         return (exit_code, stdout, stderr)
 
+    def _stop_services(self):
+        """
+        Tear down the services started by the steps of the flow
+        """
+
+        for step in self.flow.steps.values():
+            if step.stop_service():
+                step.status = step_module.Status.TERMINATED
+
+    def _record_attempt(self, step, attempt):
+        if step.metrics is not None:
+            step.metrics.attempt = attempt
+            self._metrics.add(step.metrics)
+        self._trace.add(step)
+
+    def _retry_delay(self, step, attempt, exit_code, deadline=None):
+        """
+        Return how long to wait before executing `step` again after its
+        `attempt`-th execution finished with `exit_code`, or None if it
+        must not be retried (no retry left or not enough time left)
+        """
+
+        policy = step.retry
+
+        if policy is None or not policy.should_retry(attempt, exit_code):
+            return None
+
+        delay = policy.delay(attempt)
+
+        if deadline is not None and process.remaining(deadline) <= delay:
+            return None
+
+        retry.log_retry(step, attempt, exit_code, delay)
+        return delay
+
+    def _execute_step(self, step, exit_code=None, stdout=None, stderr=None, deadline=None):
+        """
+        Execute `step`, retrying it as its `retry:` settings say.
+        Every attempt is recorded in the execution trace and the metrics.
+        """
+
+        attempt = 1
+
+        while True:
+            result = step.execute(exit_code=exit_code, stdout=stdout, stderr=stderr, deadline=deadline)
+            self._record_attempt(step, attempt)
+
+            delay = self._retry_delay(step, attempt, result[0], deadline)
+            if delay is None:
+                return result
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _execute_dag(self, deadline=None):
+        """
+        Run steps as soon as their dependencies are satisfied,
+        up to `max_parallel` steps at a time. Steps waiting for a retry
+        don't hold a worker: they are resubmitted once their backoff is over.
+        """
+
+        scheduler = dag.DagScheduler(self.flow.steps, self.flow.table)
+        running = {}
+        retries = []
+        order = itertools.count()
+
+        logging.debug("Executing flow as a DAG (max_parallel=%s)", self._max_parallel)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._max_parallel) as pool:
+            def _submit(step, stdin, attempt):
+                running[pool.submit(step.execute, stdout=stdin, deadline=deadline)] = (step, stdin, attempt)
+
+            while not scheduler.finished:
+                for step in scheduler.ready():
+                    if step.step is None:
+                        self._trace.add(step)
+                        scheduler.complete(step, (None, None, None))
+                        continue
+
+                    _submit(step, scheduler.stdin_for(step), 1)
+
+                while retries and retries[0][0] <= time.monotonic():
+                    (_, _, step, stdin, attempt) = heapq.heappop(retries)
+                    _submit(step, stdin, attempt)
+
+                timeout = max(0.0, retries[0][0] - time.monotonic()) if retries else None
+
+                if not running:
+                    if timeout is not None:
+                        time.sleep(timeout)
+                    continue
+
+                (done, _) = concurrent.futures.wait(running, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    (step, stdin, attempt) = running.pop(future)
+                    (exit_code, stdout, stderr) = future.result()
+                    self._record_attempt(step, attempt)
+                    logging.debug("Executed step: %s, exit_code=%r, stdout=%r, stderr=%r", step.id, exit_code, stdout, stderr)
+
+                    delay = self._retry_delay(step, attempt, exit_code, deadline)
+                    if delay is not None:
+                        heapq.heappush(retries, (time.monotonic() + delay, next(order), step, stdin, attempt + 1))
+                        continue
+
+                    scheduler.complete(step, (exit_code, stdout, stderr))
+
+        return scheduler.result()
+
     @property
     def execution_graph(self):
-        return self._execution_graph
+        """
+        The `trace.ExecutionTrace` of the steps executed so far
+        """
+
+        return self._trace
+
+    @property
+    def metrics(self):
+        """
+        Timings and resource usage of every step executed so far
+        """
+
+        return self._metrics
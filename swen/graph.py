@@ -0,0 +1,319 @@
+import re
+import logging
+import collections.abc
+
+
+# Keys of `on_exit_code`: a single exit code ("3") or a range ("2-5", "-15--1")
+_EXIT_CODE_KEY = re.compile(r'(-?\d+)(?:\s*-\s*(-?\d+))?')
+
+# Widest range of exit codes a single `on_exit_code` entry may cover
+MAX_EXIT_CODE_RANGE = 512
+
+
+class FlowError(ValueError):
+    """
+    Raised when a flow definition is invalid
+    """
+
+
+def parse_exit_codes(step_id, key):
+    """
+    Return the (low, high) exit codes covered by `key`, a single
+    exit code (3, "3") or a range ("2-5")
+    """
+
+    if isinstance(key, int):
+        return (key, key)
+
+    match = _EXIT_CODE_KEY.fullmatch(str(key).strip())
+    if match is None:
+        raise FlowError("Step {!r}: invalid exit code {!r}".format(step_id, key))
+
+    low = int(match.group(1))
+    high = low if match.group(2) is None else int(match.group(2))
+
+    if high < low or high - low > MAX_EXIT_CODE_RANGE:
+        raise FlowError("Step {!r}: invalid exit code range {!r}".format(step_id, key))
+
+    return (low, high)
+
+
+class TransitionTable:
+    """
+    This class is a flow's steps compiled into arrays indexed by
+    step position, so that finding the next step is O(1) whatever
+    the number of steps:
+
+    - `ids[i]`/`steps[i]` is the i-th step and `index` maps ids back to positions
+    - `successor[i]` is the step following step i in the flow (or None)
+    - `on_success[i]`/`on_failure[i]` are the positions of transition targets
+    - `on_exit_code[i]` maps exit codes to the positions of their targets
+    - `terminal[i]` is True when the flow stops after step i
+    - `reachable[i]` is True when step i can be executed at all
+
+    The table is built when the flow is loaded, so that errors which would
+    only show up deep into a run fail before any step is executed: unknown
+    transition targets and loops that the flow can never leave or, in DAG
+    flows, unknown and cyclic dependencies.
+    """
+
+    def __init__(self, steps):
+        self.ids = tuple(steps)
+        self.steps = tuple(steps.values())
+        n = len(self.ids)
+
+        # Every array refers to the same int objects for the same position
+        positions = list(range(n))
+        self.index = dict(zip(self.ids, positions))
+
+        self.successor = tuple(positions[1:]) + (None,) if n else ()
+        self.on_success = tuple(self._target(s.on_success) for s in self.steps)
+        self.on_failure = tuple(self._target(s.on_failure) for s in self.steps)
+        self.on_exit_code = tuple(self._exit_code_targets(s) for s in self.steps)
+        self.terminal = tuple(i == n - 1
+                              and s.on_success is None
+                              and s.on_failure is None
+                              and s.on_exit_code is None
+                              for (i, s) in enumerate(self.steps))
+        edges = [self.edges(i) for i in range(n)]
+        self.reachable = self._reachable(edges)
+
+        # Steps of a DAG run when their dependencies are satisfied,
+        # not by following transitions from the first step
+        if any(s.depends_on is not None for s in self.steps):
+            self._check_dependencies()
+        else:
+            self._check_reachability()
+            self._check_loops(edges)
+
+    def _target(self, step_id):
+        if step_id is None:
+            return None
+
+        if step_id not in self.index:
+            raise FlowError("Transition to unknown step {!r}".format(step_id))
+
+        return self.index[step_id]
+
+    def _exit_code_targets(self, step):
+        """
+        Compile `on_exit_code: {code|"low-high": step_id}` into a dict
+        from every covered exit code to the position of its target.
+        Single codes take precedence over ranges.
+        """
+
+        if step.on_exit_code is None:
+            return None
+
+        if not isinstance(step.on_exit_code, dict):
+            raise FlowError("Step {!r}: on_exit_code must be a mapping of exit codes to step ids".format(step.id))
+
+        codes = {}
+        ranges = {}
+
+        for (key, target) in step.on_exit_code.items():
+            if target not in self.index:
+                raise FlowError("Step {!r}: on_exit_code {!r} targets unknown step {!r}".format(step.id, key, target))
+
+            (low, high) = parse_exit_codes(step.id, key)
+
+            if low == high:
+                codes[low] = self.index[target]
+                continue
+
+            for code in range(low, high + 1):
+                if code in ranges:
+                    raise FlowError("Step {!r}: on_exit_code ranges overlap on exit code {}".format(step.id, code))
+                ranges[code] = self.index[target]
+
+        ranges.update(codes)
+        return ranges
+
+    def edges(self, i):
+        """
+        Return the positions the flow may go to after step `i`,
+        None standing for the end of the flow
+        """
+
+        if self.terminal[i]:
+            return {None}
+
+        step = self.steps[i]
+        targets = set()
+
+        on_success = self.on_success[i]
+        targets.add(self.successor[i] if on_success is None else on_success)
+
+        on_failure = self.on_failure[i]
+        if on_failure is not None:
+            targets.add(on_failure)
+        elif step.step is None:
+            # Steps without a command have no exit code: they always go on
+            targets.add(self.successor[i])
+        else:
+            # A failure that no transition handles stops the flow
+            targets.add(None)
+
+        if self.on_exit_code[i] is not None:
+            targets.update(self.on_exit_code[i].values())
+
+        return targets
+
+    def _reachable(self, edges):
+        reachable = [False] * len(self.ids)
+        pending = [0] if self.ids else []
+
+        while pending:
+            i = pending.pop()
+            if reachable[i]:
+                continue
+            reachable[i] = True
+            pending.extend(j for j in edges[i] if j is not None)
+
+        return tuple(reachable)
+
+    def _check_reachability(self):
+        for (step_id, reachable) in zip(self.ids, self.reachable):
+            if not reachable:
+                logging.warning("Step %r can never be executed: no transition leads to it", step_id)
+
+    def _check_loops(self, edges):
+        """
+        Raise a `FlowError` if the flow can reach a step from which
+        every path loops forever, whatever the exit codes of the steps
+        """
+
+        sources = [[] for _ in self.ids]
+        pending = []
+
+        for (i, targets) in enumerate(edges):
+            for j in targets:
+                if j is None:
+                    pending.append(i)
+                else:
+                    sources[j].append(i)
+
+        # Walk back from the steps that may end the flow
+        finishes = [False] * len(self.ids)
+
+        while pending:
+            i = pending.pop()
+            if finishes[i]:
+                continue
+            finishes[i] = True
+            pending.extend(sources[i])
+
+        for (i, step_id) in enumerate(self.ids):
+            if self.reachable[i] and not finishes[i]:
+                raise FlowError("Step {!r} is part of a loop that never ends".format(step_id))
+
+    def _check_dependencies(self):
+        """
+        Raise a `FlowError` for dependencies on unknown steps and cycles of
+        dependencies, and warn about the steps that will run in parallel
+        instead of in file order
+        """
+
+        dependents = [[] for _ in self.ids]
+        indegree = []
+
+        for (i, s) in enumerate(self.steps):
+            for dep in s.depends_on or []:
+                if dep not in self.index:
+                    raise FlowError("Step {!r} depends on unknown step {!r}".format(s.id, dep))
+                dependents[self.index[dep]].append(i)
+            indegree.append(len(s.depends_on or []))
+
+        pending = [i for (i, n) in enumerate(indegree) if n == 0]
+        visited = 0
+
+        while pending:
+            i = pending.pop()
+            visited += 1
+            for j in dependents[i]:
+                indegree[j] -= 1
+                if indegree[j] == 0:
+                    pending.append(j)
+
+        if visited != len(self.ids):
+            cycle = [step_id for (step_id, n) in zip(self.ids, indegree) if n > 0]
+            raise FlowError("Cyclic step dependencies: {}".format(cycle))
+
+        # Steps that no transition leads to and without dependencies all
+        # start at once. `depends_on: []` says that this is intended.
+        routed = {j for i in range(len(self.ids)) for j in (self.on_success[i], self.on_failure[i]) if j is not None}
+        routed.update(j for targets in self.on_exit_code if targets is not None for j in targets.values())
+        roots = [i for (i, s) in enumerate(self.steps) if not s.depends_on and i not in routed]
+        implicit = [self.ids[i] for i in roots[1:] if self.steps[i].depends_on is None]
+
+        if implicit:
+            logging.warning("Steps %s have no depends_on: they run in parallel with %r, not after the "
+                            "steps before them (use depends_on: [] to silence this warning)",
+                            implicit, self.ids[roots[0]])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def next(self, i, exit_code):
+        """
+        Return the position of the step to execute after step `i`
+        finished with `exit_code`, or None if the flow is over
+        """
+
+        if self.terminal[i]:
+            return None
+
+        on_exit_code = self.on_exit_code[i]
+
+        if on_exit_code is not None and exit_code in on_exit_code:
+            return on_exit_code[exit_code]
+
+        if exit_code == 0:
+            target = self.on_success[i]
+        else:
+            target = self.on_failure[i]
+
+        if target is None:
+            return self.successor[i]
+
+        return target
+
+    def routes(self, i, exit_code):
+        """
+        Return True if a failure of step `i` with `exit_code` is handled
+        by one of its transitions instead of stopping the flow
+        """
+
+        if exit_code == 0 or self.on_failure[i] is not None:
+            return True
+
+        on_exit_code = self.on_exit_code[i]
+        return on_exit_code is not None and exit_code in on_exit_code
+
+
+class StepMap(collections.abc.Mapping):
+    """
+    This class is a read-only mapping of step ids to the steps
+    of a `TransitionTable`, looked up through the table's own index
+    instead of a dict of its own
+    """
+
+    __slots__ = ('_table',)
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, step_id):
+        return self._table.steps[self._table.index[step_id]]
+
+    def __contains__(self, step_id):
+        return step_id in self._table.index
+
+    def __iter__(self):
+        return iter(self._table.ids)
+
+    def __len__(self):
+        return len(self._table.ids)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import base64
+import logging
+
+
+# Records written before the journal is fsync'ed, whichever limit comes first
+SYNC_EVERY = 16
+SYNC_INTERVAL = 1.0
+
+
+class JournalError(ValueError):
+    """
+    Raised when a journal does not belong to the flow being resumed
+    """
+
+
+class Journal:
+    """
+    This class is an append-only checkpoint log of a flow execution.
+
+    The journal is a JSON lines file: a header identifying the flow,
+    followed by one record per executed step with its exit code, status
+    and captured outputs. Records are written as soon as steps finish,
+    but only fsync'ed every `sync_every` records or `sync_interval` seconds
+    so that checkpointing doesn't slow down flows of short steps.
+    """
+
+    def __init__(self, path, flow, resume=False, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL):
+        self._path = path
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._header = {'flow': flow.id, 'steps': list(flow.table.ids)}
+        self._records = []
+
+        if resume and os.path.exists(path):
+            (self._records, end) = self._replay()
+            # Drop what follows the last complete record (a record cut short
+            # by a crash), new records would be appended to it otherwise
+            os.truncate(path, end)
+            self._file = open(path, 'a')
+        else:
+            self._file = open(path, 'w')
+            self._write(self._header)
+            self.sync()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def records(self):
+        """
+        Records replayed from an existing journal when resuming
+        """
+
+        return self._records
+
+    def _replay(self):
+        """
+        Return the records of the journal and the size in bytes
+        of its part made of complete records
+        """
+
+        records = []
+
+        with open(self._path, 'rb') as f:
+            lines = f.readlines()
+
+        if not lines:
+            raise JournalError("Journal {!r} is empty".format(self._path))
+
+        header = json.loads(lines[0].decode('utf-8'))
+
+        if header != self._header:
+            raise JournalError("Journal {!r} was written by another flow ({!r})".format(self._path, header.get('flow')))
+
+        end = len(lines[0])
+
+        for (n, line) in enumerate(lines[1:], start=2):
+            try:
+                if not line.endswith(b'\n'):
+                    raise ValueError("missing end of line")
+                record = json.loads(line.decode('utf-8'))
+            except ValueError:
+                # The last record may have been cut short by a crash
+                logging.warning("Ignoring truncated record at %s:%s", self._path, n)
+                break
+
+            end += len(line)
+
+            for stream in ('stdout', 'stderr'):
+                if record[stream] is not None:
+                    record[stream] = base64.b64decode(record[stream])
+
+            records.append(record)
+
+        logging.debug("Replayed %s records from journal %r", len(records), self._path)
+        return (records, end)
+
+    def _write(self, obj):
+        self._file.write(json.dumps(obj) + '\n')
+        self._file.flush()
+
+    def record(self, step, stdout=None, stderr=None):
+        """
+        Append the outcome of `step` to the journal
+        """
+
+        self._write({
+            'step': step.id,
+            'exit_code': step.exit_code,
+            'status': step.status.name,
+            'stdout': None if stdout is None else base64.b64encode(stdout).decode('ascii'),
+            'stderr': None if stderr is None else base64.b64encode(stderr).decode('ascii'),
+        })
+
+        self._unsynced += 1
+
+        if self._unsynced >= self._sync_every or time.monotonic() - self._last_sync >= self._sync_interval:
+            self.sync()
+
+    def sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+
+        self.sync()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,119 @@
+"""
+Parsing of flow definitions.
+
+Flows are plain data: mappings, sequences and untagged scalars. Instead
+of composing a node graph and constructing Python objects from it like
+`yaml.load` does, `load` builds the dicts and lists directly from the
+event stream of libyaml (`CSafeLoader`, or the pure Python `SafeLoader`
+when PyYAML was built without it). Documents using anything else
+(anchors, aliases, explicit tags, merge keys) are handed to `yaml.load`.
+"""
+
+
+class _Unsupported(Exception):
+    """
+    Raised when a document needs the full YAML loader
+    """
+
+
+# Placeholder for the key of a mapping that is not read yet
+_NO_KEY = object()
+
+# Placeholder for a plain scalar that is not resolved yet
+_UNRESOLVED = object()
+
+
+def yaml_loader():
+    """
+    Return the fastest safe loader class available
+    """
+
+    # Imported on first use: flows found in the on-disk cache are never parsed
+    import yaml
+
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def load(data):
+    """
+    Parse the YAML document `data` (a string or a file) into plain Python data
+    """
+
+    import yaml
+
+    if not isinstance(data, str):
+        data = data.read()
+
+    try:
+        return _load_events(yaml, data)
+    except _Unsupported:
+        return yaml.load(data, Loader=yaml_loader())
+
+
+def _load_events(yaml, data):
+    from yaml import events
+
+    resolver = yaml.resolver.Resolver()
+    constructor = yaml.constructor.SafeConstructor()
+
+    # Plain scalars are resolved (to bool, int, null...) once per distinct value
+    plain = {}
+
+    documents = []
+    containers = []
+    keys = []
+
+    for event in yaml.parse(data, Loader=yaml_loader()):
+        cls = type(event)
+
+        if cls is events.ScalarEvent:
+            if event.anchor is not None:
+                raise _Unsupported()
+
+            if event.implicit[0]:
+                value = plain.get(event.value, _UNRESOLVED)
+                if value is _UNRESOLVED:
+                    tag = resolver.resolve(yaml.ScalarNode, event.value, (True, False))
+                    if tag not in constructor.yaml_constructors or tag == 'tag:yaml.org,2002:merge':
+                        raise _Unsupported()
+                    value = constructor.yaml_constructors[tag](constructor, yaml.ScalarNode(tag, event.value))
+                    plain[event.value] = value
+            elif event.tag in (None, '!'):
+                value = event.value
+            else:
+                raise _Unsupported()
+
+        elif cls is events.MappingStartEvent or cls is events.SequenceStartEvent:
+            if event.anchor is not None or not event.implicit:
+                raise _Unsupported()
+
+            containers.append({} if cls is events.MappingStartEvent else [])
+            keys.append(_NO_KEY)
+            continue
+
+        elif cls is events.MappingEndEvent or cls is events.SequenceEndEvent:
+            value = containers.pop()
+            keys.pop()
+
+        elif cls is events.AliasEvent:
+            raise _Unsupported()
+
+        else:
+            continue
+
+        if not containers:
+            documents.append(value)
+        elif type(containers[-1]) is list:
+            containers[-1].append(value)
+        elif keys[-1] is _NO_KEY:
+            if isinstance(value, (dict, list)):
+                raise _Unsupported()
+            keys[-1] = value
+        else:
+            containers[-1][keys[-1]] = value
+            keys[-1] = _NO_KEY
+
+    if len(documents) > 1:
+        raise _Unsupported()
+
+    return documents[0] if documents else None
@@ -0,0 +1,154 @@
+import os
+import time
+import tempfile
+import collections
+
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if os.uname().sysname == 'Darwin' else 1024
+
+
+class StepMetrics:
+    """
+    This class holds the timings and resource usage of one step execution.
+    Values that could not be measured (e.g. the rusage of processes
+    reaped by an event loop) are None.
+    """
+
+    def __init__(self, step_id):
+        self.step_id = step_id
+        self.start = time.monotonic()
+        self.wall_time = None
+        self.spawn_latency = None
+        self.user_time = None
+        self.system_time = None
+        self.max_rss = None
+        self.stdin_bytes = None
+        self.stdout_bytes = None
+        self.stderr_bytes = None
+        self.exit_code = None
+        self.attempt = 1
+
+    def spawned(self):
+        self.spawn_latency = time.monotonic() - self.start
+
+    def finished(self, exit_code, rusage=None, stdin=None, out=None, err=None):
+        """
+        Record the end of the execution: its exit code, the rusage
+        returned by `os.wait4` and the sizes of the streams
+        """
+
+        self.wall_time = time.monotonic() - self.start
+        self.exit_code = exit_code
+
+        if rusage is not None:
+            self.user_time = rusage.ru_utime
+            self.system_time = rusage.ru_stime
+            self.max_rss = rusage.ru_maxrss * _MAXRSS_UNIT
+
+        if stdin is not None:
+            self.stdin_bytes = len(stdin)
+        if out is not None:
+            self.stdout_bytes = out.size
+        if err is not None:
+            self.stderr_bytes = err.size
+
+    def as_dict(self):
+        return {k: v for (k, v) in self.__dict__.items() if k != 'start'}
+
+
+class FlowMetrics:
+    """
+    This class holds the metrics of every step executed by a flow,
+    in execution order, and exports them as OpenMetrics text.
+    With `capacity` set, only the metrics of the last `capacity`
+    executions are kept (like the execution trace), older ones
+    are only counted in `dropped`.
+    """
+
+    # name, StepMetrics attribute, unit, help
+    _EXPORTED = (
+        ('swen_step_wall_seconds', 'wall_time', 'seconds', 'Wall time of the step'),
+        ('swen_step_spawn_seconds', 'spawn_latency', 'seconds', 'Time to spawn the step process'),
+        ('swen_step_user_seconds', 'user_time', 'seconds', 'User CPU time of the step process'),
+        ('swen_step_system_seconds', 'system_time', 'seconds', 'System CPU time of the step process'),
+        ('swen_step_max_rss_bytes', 'max_rss', 'bytes', 'Maximum resident set size of the step process'),
+        ('swen_step_stdin_bytes', 'stdin_bytes', 'bytes', 'Bytes written to the step stdin'),
+        ('swen_step_stdout_bytes', 'stdout_bytes', 'bytes', 'Bytes read from the step stdout'),
+        ('swen_step_stderr_bytes', 'stderr_bytes', 'bytes', 'Bytes read from the step stderr'),
+        ('swen_step_exit_code', 'exit_code', None, 'Exit code of the step'),
+        ('swen_step_attempt', 'attempt', None, 'Attempt number of the execution (1 unless retried)'),
+    )
+
+    def __init__(self, flow_id, capacity=None):
+        self._flow_id = flow_id
+        self._steps = collections.deque(maxlen=capacity)
+        self._dropped = 0
+
+    @property
+    def steps(self):
+        return list(self._steps)
+
+    @property
+    def dropped(self):
+        """
+        Number of executions whose metrics are no longer kept
+        """
+
+        return self._dropped
+
+    def add(self, step_metrics):
+        if step_metrics is None:
+            return
+
+        if len(self._steps) == self._steps.maxlen:
+            self._dropped += 1
+        self._steps.append(step_metrics)
+
+    def by_step(self):
+        """
+        Return the metrics grouped by step id
+        """
+
+        grouped = {}
+        for m in self._steps:
+            grouped.setdefault(m.step_id, []).append(m)
+        return grouped
+
+    def as_dicts(self):
+        return [m.as_dict() for m in self._steps]
+
+    @staticmethod
+    def _escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def to_openmetrics(self):
+        lines = []
+
+        for (name, attribute, unit, doc) in self._EXPORTED:
+            lines.append('# TYPE {} gauge'.format(name))
+            if unit is not None:
+                lines.append('# UNIT {} {}'.format(name, unit))
+            lines.append('# HELP {} {}'.format(name, doc))
+
+            for (n, m) in enumerate(self._steps):
+                value = getattr(m, attribute)
+                if value is None:
+                    continue
+                lines.append('{}{{flow="{}",step="{}",execution="{}"}} {}'.format(
+                    name, self._escape(self._flow_id), self._escape(m.step_id), self._dropped + n, value))
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Write the metrics to `path` in OpenMetrics text format, atomically
+        so that a scraper never reads a partial file
+        """
+
+        directory = os.path.dirname(os.path.abspath(path))
+        (fd, tmp_path) = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.to_openmetrics())
+        os.replace(tmp_path, path)
@@ -0,0 +1,143 @@
+import os
+import logging
+import concurrent.futures
+
+from subprocess import PIPE, TimeoutExpired
+from . import capture
+from . import process
+
+
+def config(parallel):
+    """
+    Normalize the `parallel:` setting of a step, which is either a number
+    of workers or a mapping:
+
+        parallel: {workers: 8, chunk: 4M, ordered: false}
+
+    `chunk` is the target size of every partition of the input (by default
+    the input is split in one partition per worker), `ordered` (true by
+    default) keeps the outputs in input order instead of completion order.
+    """
+
+    if isinstance(parallel, dict):
+        settings = dict(parallel)
+    elif parallel is True:
+        settings = {}
+    else:
+        settings = {'workers': parallel}
+
+    return {
+        'workers': int(settings.get('workers') or os.cpu_count() or 1),
+        'chunk': capture.parse_size(settings.get('chunk')),
+        'ordered': settings.get('ordered', True),
+    }
+
+
+def split_lines(data, partitions=None, chunk=None):
+    """
+    Split `data` into about `partitions` parts (or parts of about `chunk`
+    bytes) without ever cutting a line. Parts are memoryviews of `data`.
+    """
+
+    if not data:
+        return [memoryview(b'')]
+
+    if chunk is None:
+        chunk = -(-len(data) // max(1, partitions or 1))
+
+    view = memoryview(data)
+    parts = []
+    start = 0
+
+    while start < len(data):
+        end = start + chunk
+        if end < len(data):
+            newline = data.find(b'\n', end - 1)
+            end = len(data) if newline < 0 else newline + 1
+        parts.append(view[start:end])
+        start = end
+
+    return parts
+
+
+def _run(argv, stdin, captures, deadline):
+    """
+    Run one copy of a command on `stdin` and return (exit_code, timed_out)
+    """
+
+    (out, err) = captures
+    p = process.spawn(argv, stdin=PIPE, stdout=PIPE, stderr=PIPE, start_new_session=deadline is not None)
+
+    try:
+        finished = capture.drain({p.stdout: out, p.stderr: err}, {p.stdin: stdin}, deadline=deadline)
+        if finished:
+            process.wait(p, timeout=process.remaining(deadline))
+    except TimeoutExpired:
+        finished = False
+    except BaseException:
+        p.kill()
+        p.wait()
+        raise
+
+    if not finished:
+        process.kill_group(p)
+        return (None, True)
+
+    return (p.returncode, False)
+
+
+def execute(step, stdin, deadline=None):
+    """
+    Run the command of `step` on partitions of `stdin` in parallel, merge
+    the outputs and pipe them through the `reduce:` command if there is one.
+    Return (exit_code, stdout, stderr, timed_out): the exit code is the
+    first non-zero exit code of the copies (in input order) or of the reducer.
+    """
+
+    settings = config(step.parallel)
+    parts = split_lines(stdin, settings['workers'], settings['chunk'])
+
+    logging.debug("Step %r: running %s partitions on %s workers", step.id, len(parts), settings['workers'])
+
+    results = [None] * len(parts)
+    outputs = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=settings['workers']) as pool:
+        futures = {}
+        for (i, part) in enumerate(parts):
+            captures = step.create_captures()
+            futures[pool.submit(_run, step.step, part, captures, deadline)] = (i, captures)
+
+        done = futures if settings['ordered'] else concurrent.futures.as_completed(futures)
+
+        for future in done:
+            (i, captures) = futures[future]
+            results[i] = future.result()
+            outputs.append((i, captures))
+
+    if settings['ordered']:
+        outputs.sort(key=lambda output: output[0])
+
+    stdout = b''.join(out.getvalue() for (_, (out, _)) in outputs)
+    stderr = b''.join(err.getvalue() for (_, (_, err)) in outputs)
+
+    for (_, (out, err)) in outputs:
+        out.close()
+        err.close()
+
+    if any(timed_out for (_, timed_out) in results):
+        return (None, stdout, stderr, True)
+
+    exit_code = next((code for (code, _) in results if code != 0), 0)
+
+    if exit_code != 0 or step.reduce is None:
+        return (exit_code, stdout, stderr, False)
+
+    captures = step.create_captures()
+    (exit_code, timed_out) = _run(step.reduce, stdout, captures, deadline)
+    (out, err) = captures
+    result = (exit_code, out.getvalue(), stderr + err.getvalue(), timed_out)
+    out.close()
+    err.close()
+
+    return result
@@ -0,0 +1,116 @@
+import logging
+import signal
+
+from subprocess import PIPE, TimeoutExpired
+from . import capture
+from . import process
+from . import metrics
+from . import step as step_module
+
+
+class Pipeline:
+    """
+    This class runs a chain of steps connected with OS pipes.
+    Every step in the chain runs at the same time and reads its
+    input directly from the stdout of the step before it, so no
+    intermediate output is ever buffered by swen.
+    """
+
+    def __init__(self, steps):
+        self._steps = list(steps)
+
+    @property
+    def steps(self):
+        return self._steps
+
+    def execute(self, stdout=None, deadline=None):
+        """
+        Run the chain and return a tuple of
+        (exit_code, stdout, stderr, step) where `step` is the step
+        whose result is reported: the first failed step of the chain,
+        or the last step if all of them succeeded (like `set -o pipefail`).
+        A step killed by SIGPIPE because a downstream step stopped reading
+        its input is not considered failed.
+
+        `stdout` is the buffered output of the step preceding the chain
+        and is fed to the first step only if it has `with_stdin` set.
+
+        The whole chain is stopped when `deadline` or the shortest
+        `timeout` of its steps expires; steps still running then are
+        reported as timed out.
+        """
+
+        logging.debug("Executing pipeline: %s", [s.id for s in self._steps])
+
+        for s in self._steps:
+            deadline = process.deadline_after(s.timeout, deadline)
+
+        procs = []
+        captures = [s.create_captures() for s in self._steps]
+        timed_out = set()
+        rusages = {}
+        prev_stdout = None
+
+        # A spilled output is read by the first step straight from its file
+        if self._steps[0].with_stdin and isinstance(stdout, capture.SpilledOutput):
+            prev_stdout = stdout.open()
+
+        try:
+            for i, s in enumerate(self._steps):
+                if i == 0 and prev_stdout is None:
+                    stdin = PIPE if s.with_stdin else None
+                else:
+                    stdin = prev_stdout
+
+                s.status = step_module.Status.RUNNING
+                s._metrics = metrics.StepMetrics(s.id)
+                p = process.spawn(s.step, stdin=stdin, stdout=PIPE, stderr=PIPE, start_new_session=deadline is not None)
+                s._metrics.spawned()
+                procs.append(p)
+
+                # The child holds its own copy of the read end now. Closing
+                # ours lets the upstream step see EPIPE if this one exits early.
+                if prev_stdout is not None:
+                    prev_stdout.close()
+                prev_stdout = p.stdout
+
+            readers = {p.stderr: err for (p, (out, err)) in zip(procs, captures)}
+            readers[procs[-1].stdout] = captures[-1][0]
+            writers = None if procs[0].stdin is None else {procs[0].stdin: stdout}
+
+            finished = capture.drain(readers, writers, deadline=deadline)
+
+            for i, p in enumerate(procs):
+                try:
+                    rusages[i] = process.wait(p, timeout=process.remaining(deadline) if finished else 0)
+                except TimeoutExpired:
+                    logging.warning("Step %r timed out, terminating it", self._steps[i].id)
+                    finished = False
+                    timed_out.add(i)
+                    process.kill_group(p)
+        except BaseException:
+            if prev_stdout is not None:
+                prev_stdout.close()
+            for p in procs:
+                p.kill()
+                p.wait()
+            raise
+
+        last = len(self._steps) - 1
+
+        for i, (s, p) in enumerate(zip(self._steps, procs)):
+            if i in timed_out:
+                s._set_exit_code_and_status(step_module.TIMEOUT_EXIT_CODE, step_module.Status.TIMED_OUT)
+            else:
+                s._set_exit_code_and_status(p.returncode, step_module.Status.TERMINATED)
+
+            # Intermediate outputs go straight to the next step and are never counted
+            (out, err) = captures[i]
+            s._metrics.finished(s.exit_code, rusages.get(i),
+                                stdin=stdout if i == 0 and s.with_stdin else None,
+                                out=out if i == last else None, err=err)
+
+        for i, s in enumerate(self._steps):
+            if i == last or s.exit_code not in (0, -signal.SIGPIPE):
+                (out, err) = captures[i]
+                return (s.exit_code, out.getvalue() if i == last else b'', err.getvalue(), s)
@@ -0,0 +1,270 @@
+import os
+import sys
+import time
+import select
+import signal
+import logging
+import subprocess
+
+
+# Seconds a process group gets to exit after SIGTERM before it is sent SIGKILL
+KILL_GRACE = 5.0
+
+# How steps are spawned: "posix_spawn", "popen" or "auto"
+# (posix_spawn where available and Popen would fork)
+SPAWN_BACKEND = os.environ.get('SWEN_SPAWN', 'auto')
+
+# Popen starts processes with vfork on Linux since Python 3.10,
+# which is as cheap as posix_spawn whatever the size of the heap
+_POPEN_USES_VFORK = (sys.platform.startswith('linux') and sys.version_info >= (3, 10)
+                     and getattr(subprocess, '_USE_VFORK', True))
+
+# Signals Python ignores or handles itself, reset to their default
+# action in children (like Popen's `restore_signals`)
+_RESTORED_SIGNALS = tuple(getattr(signal, name) for name in ('SIGPIPE', 'SIGXFSZ') if hasattr(signal, name))
+
+
+def deadline_after(timeout, deadline=None):
+    """
+    Return the earliest of `deadline` and `timeout` seconds from now
+    (both are optional, deadlines are `time.monotonic()` values)
+    """
+
+    if timeout is None:
+        return deadline
+
+    own_deadline = time.monotonic() + float(timeout)
+    return own_deadline if deadline is None else min(own_deadline, deadline)
+
+
+def remaining(deadline):
+    """
+    Return the number of seconds left until `deadline` (None means no deadline)
+    """
+
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _signal_group(pid, sig):
+    try:
+        os.killpg(pid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def kill_group(p, grace=KILL_GRACE):
+    """
+    Stop `p` and everything it started: its whole process group gets
+    SIGTERM and, if `p` is still alive after `grace` seconds, SIGKILL.
+    `p` must have been started as a process group leader
+    (e.g. with `start_new_session=True`).
+    """
+
+    logging.debug("Terminating process group %s", p.pid)
+
+    if _signal_group(p.pid, signal.SIGTERM):
+        try:
+            p.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            logging.debug("Process group %s ignored SIGTERM, sending SIGKILL", p.pid)
+
+    _signal_group(p.pid, signal.SIGKILL)
+    p.wait()
+
+
+async def kill_group_async(p, grace=KILL_GRACE):
+    """
+    Same as `kill_group` for an asyncio subprocess
+    """
+
+    import asyncio
+
+    logging.debug("Terminating process group %s", p.pid)
+
+    if _signal_group(p.pid, signal.SIGTERM):
+        try:
+            await asyncio.wait_for(p.wait(), grace)
+        except asyncio.TimeoutError:
+            logging.debug("Process group %s ignored SIGTERM, sending SIGKILL", p.pid)
+
+    _signal_group(p.pid, signal.SIGKILL)
+    await p.wait()
+
+
+def wait(p, timeout=None):
+    """
+    Same as `p.wait(timeout)`, but the process is reaped with `os.wait4`
+    and its resource usage is returned (None if `p` was already reaped).
+    Without `timeout`, or where pidfds exist, the call blocks until the
+    process exits; it is polled at growing intervals otherwise.
+    """
+
+    if p.returncode is not None:
+        return None
+
+    if timeout is not None and timeout > 0:
+        exited = _wait_pidfd(p.pid, timeout)
+        if exited is False:
+            raise subprocess.TimeoutExpired(p.args, timeout)
+        if exited:
+            # Reaping can't block anymore
+            timeout = None
+
+    if timeout is None:
+        (_, status, rusage) = os.wait4(p.pid, 0)
+    else:
+        deadline = time.monotonic() + timeout
+        delay = 0.0005
+
+        while True:
+            (pid, status, rusage) = os.wait4(p.pid, os.WNOHANG)
+            if pid != 0:
+                break
+            if time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(p.args, timeout)
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, 0.05)
+
+    # Same convention as Popen.returncode: -N when killed by signal N
+    p.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    return rusage
+
+
+def _wait_pidfd(pid, timeout):
+    """
+    Wait up to `timeout` seconds for the process `pid` to exit. Return
+    True if it did, False if it didn't and None if pidfds are not supported.
+    """
+
+    if not hasattr(os, 'pidfd_open'):
+        return None
+
+    try:
+        fd = os.pidfd_open(pid)
+    except OSError:
+        return None
+
+    try:
+        (readable, _, _) = select.select([fd], [], [], timeout)
+        return bool(readable)
+    finally:
+        os.close(fd)
+
+
+class SpawnedProcess:
+    """
+    This class is a minimal `Popen` look-alike for processes started
+    with `os.posix_spawnp`. Unlike `fork`, `posix_spawn` doesn't copy the
+    page tables of the parent, so spawning stays cheap in processes with
+    a large heap.
+
+    Only what swen needs is supported: `stdin` may be None, PIPE or a
+    file object, `stdout`/`stderr` None or PIPE. There is no `close_fds`:
+    the child inherits every inheritable file descriptor of the parent
+    (Python creates them non-inheritable, but not everything is created
+    by Python), `spawn` only uses this class when there is none.
+    """
+
+    def __init__(self, args, stdin=None, stdout=None, stderr=None, start_new_session=False):
+        self.args = args
+        self.returncode = None
+        self.stdin = self.stdout = self.stderr = None
+
+        file_actions = []
+        child_fds = []
+
+        try:
+            if stdin == subprocess.PIPE:
+                (r, w) = os.pipe()
+                child_fds.append(r)
+                self.stdin = open(w, 'wb')
+                file_actions.append((os.POSIX_SPAWN_DUP2, r, 0))
+            elif stdin is not None:
+                file_actions.append((os.POSIX_SPAWN_DUP2, stdin.fileno(), 0))
+
+            for (fd, target) in ((1, stdout), (2, stderr)):
+                if target == subprocess.PIPE:
+                    (r, w) = os.pipe()
+                    child_fds.append(w)
+                    setattr(self, 'stdout' if fd == 1 else 'stderr', open(r, 'rb'))
+                    file_actions.append((os.POSIX_SPAWN_DUP2, w, fd))
+
+            self.pid = os.posix_spawnp(args[0], args, os.environ,
+                                       file_actions=file_actions,
+                                       setsigdef=_RESTORED_SIGNALS,
+                                       setsid=start_new_session)
+        except BaseException:
+            for stream in (self.stdin, self.stdout, self.stderr):
+                if stream is not None:
+                    stream.close()
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+
+    def poll(self):
+        if self.returncode is None:
+            try:
+                wait(self, timeout=0)
+            except subprocess.TimeoutExpired:
+                pass
+        return self.returncode
+
+    def wait(self, timeout=None):
+        wait(self, timeout)
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            os.kill(self.pid, sig)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+def _inheritable_fds():
+    """
+    Return the inheritable file descriptors of the process other than
+    0, 1 and 2, or None if they can't be listed
+    """
+
+    for fd_dir in ('/proc/self/fd', '/dev/fd'):
+        try:
+            names = os.listdir(fd_dir)
+        except OSError:
+            continue
+
+        fds = []
+        for fd in map(int, names):
+            try:
+                if fd > 2 and os.get_inheritable(fd):
+                    fds.append(fd)
+            except OSError:
+                # The descriptor used for the listing, closed since
+                pass
+        return fds
+
+    return None
+
+
+def spawn(args, stdin=None, stdout=None, stderr=None, start_new_session=False):
+    """
+    Start `args` with the configured `SPAWN_BACKEND` and return
+    a `Popen` (or Popen-like) object. In "auto" mode, posix_spawn is only
+    used where `Popen` would fork. Processes are started with `Popen`
+    (which closes them in the child) while swen holds inheritable file
+    descriptors, so that they never leak into steps.
+    """
+
+    backend = SPAWN_BACKEND
+    if backend == 'auto':
+        backend = 'popen' if _POPEN_USES_VFORK else 'posix_spawn'
+
+    if backend == 'posix_spawn' and hasattr(os, 'posix_spawnp') and _inheritable_fds() == []:
+        return SpawnedProcess(args, stdin=stdin, stdout=stdout, stderr=stderr, start_new_session=start_new_session)
+
+    return subprocess.Popen(args, stdin=stdin, stdout=stdout, stderr=stderr, start_new_session=start_new_session)
@@ -0,0 +1,85 @@
+import random
+import logging
+
+from . import graph
+
+
+class RetryPolicy:
+    """
+    This class decides whether a failed step is executed again and how
+    long to wait before that, from the step's `retry:` settings:
+
+        retry: 3
+        retry: {max: 5, backoff: 0.5, factor: 2, max_backoff: 30, jitter: 0.1, on_codes: [1, "75-78"]}
+
+    `max` is the number of retries after the first attempt. The n-th retry
+    waits `backoff * factor ** (n - 1)` seconds (at most `max_backoff`),
+    randomly spread by +/- `jitter` of that delay. Only the exit codes
+    listed in `on_codes` are retried, any failure is when it is not set.
+    """
+
+    def __init__(self, step_id=None, max=0, backoff=0.0, factor=2.0, max_backoff=None, jitter=0.0, on_codes=None):
+        self.max = int(max)
+        self.backoff = float(backoff)
+        self.factor = float(factor)
+        self.max_backoff = None if max_backoff is None else float(max_backoff)
+        self.jitter = float(jitter)
+        self.on_codes = None
+
+        if on_codes is not None:
+            self.on_codes = set()
+            for key in on_codes if isinstance(on_codes, list) else [on_codes]:
+                (low, high) = graph.parse_exit_codes(step_id, key)
+                self.on_codes.update(range(low, high + 1))
+
+    @classmethod
+    def parse(cls, step_id, config):
+        """
+        Return the policy of the `retry:` settings `config` of a step,
+        or None if it is never retried
+        """
+
+        if not config:
+            return None
+
+        if not isinstance(config, dict):
+            config = {'max': config}
+
+        try:
+            return cls(step_id, **config)
+        except (TypeError, ValueError) as e:
+            raise graph.FlowError("Step {!r}: invalid retry settings: {}".format(step_id, e))
+
+    def as_dict(self):
+        return {'max': self.max, 'backoff': self.backoff, 'factor': self.factor, 'max_backoff': self.max_backoff,
+                'jitter': self.jitter, 'on_codes': None if self.on_codes is None else sorted(self.on_codes)}
+
+    def should_retry(self, attempt, exit_code):
+        """
+        Return True if a step whose `attempt`-th execution
+        finished with `exit_code` must be executed again
+        """
+
+        if exit_code == 0 or exit_code is None or attempt > self.max:
+            return False
+
+        return self.on_codes is None or exit_code in self.on_codes
+
+    def delay(self, attempt):
+        """
+        Return the number of seconds to wait after the `attempt`-th execution
+        """
+
+        delay = self.backoff * self.factor ** (attempt - 1)
+
+        if self.max_backoff is not None:
+            delay = min(delay, self.max_backoff)
+
+        if self.jitter:
+            delay += delay * random.uniform(-self.jitter, self.jitter)
+
+        return max(0.0, delay)
+
+
+def log_retry(step, attempt, exit_code, delay):
+    logging.warning("Step %r failed with exit_code=%r (attempt %s), retrying in %.3fs", step.id, exit_code, attempt, delay)
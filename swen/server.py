@@ -0,0 +1,172 @@
+"""
+Long-running swen daemon executing flows submitted over a Unix socket.
+
+    python -m swen.server [--socket PATH] [--max-flows N]
+
+Modules stay imported and compiled flows stay in the flow cache between
+submissions, so a flow starts as soon as its request is read.
+Steps run in the working directory and environment of the daemon.
+
+The protocol is one JSON object per line in each direction:
+
+    {"flow": "<yaml>", "vars": {...}, "streaming": false, "timeout": null}
+    {"exit_code": 0, "stdout": "<base64>", "stderr": "<base64>", "error": null}
+
+`{"command": "ping"}` is answered with `{"pong": true}`.
+"""
+
+import os
+import sys
+import stat
+import json
+import base64
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+
+from . import client
+from . import flowexecutor
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            reply = {'error': 'Invalid request: {}'.format(e)}
+        else:
+            if isinstance(message, dict):
+                reply = self.server.dispatch(message)
+            else:
+                reply = {'error': 'Invalid request: a JSON object is expected'}
+
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+def _remove_stale_socket(path):
+    """
+    Remove the socket left at `path` by a daemon that is no longer running.
+    Anything else found there (a file, a live daemon) is left untouched
+    and raises a FileExistsError.
+    """
+
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(st.st_mode):
+        raise FileExistsError("{} exists and is not a socket".format(path))
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            logging.debug("Removing stale socket %s", path)
+            os.unlink(path)
+            return
+
+    raise FileExistsError("A daemon is already listening on {}".format(path))
+
+
+class FlowServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    This class is the swen daemon: every connection carries one flow
+    submission, executed in its own thread. At most `max_flows` flows run
+    at once, the others wait for a free slot.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=None, max_flows=None):
+        self._socket_path = socket_path or client.default_socket_path()
+        self._slots = threading.BoundedSemaphore(max_flows or os.cpu_count() or 1)
+
+        _remove_stale_socket(self._socket_path)
+
+        # Only the owner may submit flows
+        umask = os.umask(0o177)
+        try:
+            super().__init__(self._socket_path, _RequestHandler)
+        finally:
+            os.umask(umask)
+
+        self._socket_inode = os.lstat(self._socket_path).st_ino
+
+    @property
+    def socket_path(self):
+        return self._socket_path
+
+    def dispatch(self, message):
+        if message.get('command') == 'ping':
+            return {'pong': True}
+
+        if 'flow' not in message:
+            return {'error': 'Invalid request: no flow given'}
+
+        with self._slots:
+            return self._execute(message)
+
+    @staticmethod
+    def _execute(message):
+        try:
+            fe = flowexecutor.FlowExecutor(message['flow'],
+                                           streaming=message.get('streaming', False),
+                                           vars=message.get('vars'),
+                                           timeout=message.get('timeout'))
+            (exit_code, stdout, stderr) = fe.execute()
+        except Exception as e:
+            logging.exception("Submitted flow raised an exception")
+            return {'error': '{}: {}'.format(type(e).__name__, e)}
+
+        return {
+            'exit_code': exit_code,
+            'stdout': None if stdout is None else base64.b64encode(stdout).decode('ascii'),
+            'stderr': None if stderr is None else base64.b64encode(stderr).decode('ascii'),
+            'error': None,
+        }
+
+    def server_close(self):
+        super().server_close()
+
+        # Only remove the socket if it is still the one of this daemon
+        try:
+            if os.lstat(self._socket_path).st_ino == self._socket_inode:
+                os.unlink(self._socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='swen.server')
+    parser.add_argument('--socket',
+                        help='socket to listen on (default: {})'.format(client.default_socket_path()))
+    parser.add_argument('-n', '--max-flows', type=int,
+                        help='maximum number of flows running at once')
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        level=logging.INFO
+    )
+
+    with FlowServer(args.socket, args.max_flows) as server:
+        logging.info("Listening on %s", server.socket_path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
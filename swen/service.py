@@ -0,0 +1,168 @@
+import os
+import re
+import socket
+import threading
+
+from subprocess import PIPE
+from . import process
+from . import graph
+
+
+# Bounds of the interval between two checks of the probes that have no
+# event to wait for (ports and files); it doubles from the first to the second
+PROBE_INTERVAL = (0.001, 0.1)
+
+
+def probes(step_id, config):
+    """
+    Normalize the `service:` setting of a step, which is either true
+    (the service is ready as soon as it is started) or a mapping of
+    readiness probes that must all succeed:
+
+        service: {tcp: "localhost:8080", log: "listening on", file: /run/app.pid}
+
+    `tcp` is a port or a host:port that accepts connections, `log` a regular
+    expression matching a line of stdout or stderr and `file` a path that exists.
+    """
+
+    if config is True:
+        return {}
+
+    if not isinstance(config, dict) or not set(config) <= {'tcp', 'log', 'file'}:
+        raise graph.FlowError("Step {!r}: service must be true or a mapping of tcp, log and file probes".format(step_id))
+
+    settings = {}
+
+    if config.get('tcp') is not None:
+        (host, _, port) = str(config['tcp']).rpartition(':')
+        try:
+            settings['tcp'] = (host or 'localhost', int(port))
+        except ValueError:
+            raise graph.FlowError("Step {!r}: invalid tcp probe {!r}".format(step_id, config['tcp']))
+
+    if config.get('log') is not None:
+        settings['log'] = re.compile(str(config['log']).encode())
+
+    if config.get('file') is not None:
+        settings['file'] = str(config['file'])
+
+    return settings
+
+
+def _port_open(address):
+    try:
+        socket.create_connection(address, timeout=PROBE_INTERVAL[1]).close()
+        return True
+    except OSError:
+        return False
+
+
+class Service:
+    """
+    This class supervises a step running in the background.
+
+    The process is started in its own process group, its outputs are
+    collected by reader threads which also look for the `log` probe, and a
+    watcher thread is notified as soon as the process exits. Waiting for
+    readiness blocks on these events instead of sleeping, only `tcp`
+    and `file` probes are checked again at short, growing intervals.
+    """
+
+    def __init__(self, argv, settings, captures):
+        self._settings = settings
+        self._captures = captures
+        self._changed = threading.Event()
+        self._exited = False
+        self._logged = 'log' not in settings
+
+        with open(os.devnull, 'rb') as devnull:
+            self._process = process.spawn(argv, stdin=devnull, stdout=PIPE, stderr=PIPE, start_new_session=True)
+
+        self._threads = [threading.Thread(target=self._read, args=(stream, out), daemon=True)
+                         for (stream, out) in zip((self._process.stdout, self._process.stderr), captures)]
+        self._threads.append(threading.Thread(target=self._watch, daemon=True))
+
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def pid(self):
+        return self._process.pid
+
+    def _read(self, stream, out):
+        log = self._settings.get('log')
+
+        for line in stream:
+            out.write(line)
+            if not self._logged and log.search(line):
+                self._logged = True
+                self._changed.set()
+
+        stream.close()
+
+    def _watch(self):
+        # WNOWAIT: the process is only reaped by `wait_ready` or `stop`
+        try:
+            os.waitid(os.P_PID, self._process.pid, os.WEXITED | os.WNOWAIT)
+        except ChildProcessError:
+            pass
+
+        self._exited = True
+        self._changed.set()
+
+    def _ready(self):
+        if not self._logged:
+            return False
+
+        if 'file' in self._settings and not os.path.exists(self._settings['file']):
+            return False
+
+        return 'tcp' not in self._settings or _port_open(self._settings['tcp'])
+
+    def wait_ready(self, deadline=None):
+        """
+        Wait until every probe succeeds and return 0, or the exit code of the
+        process if it exited before (1 if it exited with 0), or None if it
+        isn't ready by `deadline`
+        """
+
+        polled = 'tcp' in self._settings or 'file' in self._settings
+        interval = PROBE_INTERVAL[0]
+
+        while True:
+            self._changed.clear()
+
+            if self._exited:
+                process.wait(self._process)
+                return self._process.returncode or 1
+
+            if self._ready():
+                return 0
+
+            timeout = process.remaining(deadline)
+            if timeout == 0:
+                return None
+
+            if polled:
+                timeout = interval if timeout is None else min(interval, timeout)
+                interval = min(interval * 2, PROBE_INTERVAL[1])
+
+            self._changed.wait(timeout)
+
+    def stop(self):
+        """
+        Terminate the process group of the service (what the service
+        started may outlive it) and return its (stdout, stderr)
+        """
+
+        process.kill_group(self._process)
+
+        for thread in self._threads:
+            thread.join()
+
+        outputs = tuple(out.getvalue() for out in self._captures)
+
+        for out in self._captures:
+            out.close()
+
+        return outputs
@@ -2,21 +2,43 @@ import logging
 import json
 import copy
 import shlex
+import sys
+import os
+import re
 
-from subprocess import Popen, PIPE
+from subprocess import PIPE, TimeoutExpired
 from enum import IntEnum
+from . import capture
+from . import process
+from . import stepcache
+from . import metrics
+from . import parallel as parallel_module
+from . import service as service_module
+from . import retry as retry_module
+from . import graph
+
+
+# Exit code reported for steps stopped by a timeout (same as coreutils `timeout`)
+TIMEOUT_EXIT_CODE = 124
+
+# Anything shlex would not treat as a plain word or whitespace: quotes,
+# escapes and characters `str.split` and shlex disagree on
+_SHELL_SYNTAX = re.compile(r'[\'"\\]|[^\x20-\x7e\t\r\n]')
 
 
 class Status(IntEnum):
     READY = 0
     RUNNING = 1
     TERMINATED = 2
-    # TIMED_OUT = 3
+    TIMED_OUT = 3
 
 
 class StepEncoder(json.JSONEncoder):
     status = 'status'
     on_status_change = 'on_status_change'
+    metrics = 'metrics'
+    supervisor = 'supervisor'
+    retry = 'retry'
 
     def encode(self, obj):
         obj_copy = copy.copy(obj)
@@ -29,27 +51,74 @@ class StepEncoder(json.JSONEncoder):
             obj_copy[StepEncoder.status] = str(obj_copy[StepEncoder.status].name)
         if StepEncoder.on_status_change in obj_copy and callable(obj_copy[StepEncoder.on_status_change]):
             obj_copy[StepEncoder.on_status_change] = obj_copy[StepEncoder.on_status_change].__name__
+        if obj_copy.get(StepEncoder.metrics) is not None:
+            obj_copy[StepEncoder.metrics] = obj_copy[StepEncoder.metrics].as_dict()
+        if obj_copy.get(StepEncoder.supervisor) is not None:
+            obj_copy[StepEncoder.supervisor] = obj_copy[StepEncoder.supervisor].pid
+        if obj_copy.get(StepEncoder.retry) is not None:
+            obj_copy[StepEncoder.retry] = obj_copy[StepEncoder.retry].as_dict()
 
         return json.JSONEncoder.encode(self, obj_copy)
 
 
+def split_command(command):
+    """
+    Same as `shlex.split(command)`, but commands without quotes or
+    escapes (most of them) are split without going through shlex
+    """
+
+    if _SHELL_SYNTAX.search(command) is None:
+        # Generated flows repeat the same commands over and over
+        return list(map(sys.intern, command.split()))
+    return shlex.split(command)
+
+
+def _intern(step_id):
+    return sys.intern(step_id) if isinstance(step_id, str) else step_id
+
+
 class Step:
     """
-    This class represents a step in a flow
+    This class represents a step in a flow.
+    Flows may have a huge number of steps: attributes are slots and
+    ids (and the ids of transition targets) are interned.
     """
 
+    __slots__ = ('_id', '_step', '_doc', '_with_stdin', '_on_success', '_on_failure', '_on_exit_code',
+                 '_capture', '_depends_on', '_timeout', '_cache', '_parallel', '_reduce', '_retry',
+                 '_service', '_exit_code', '_status', '_on_status_change', '_metrics', '_supervisor')
+
     def __init__(self, id=None, step=None, doc=None, with_stdin=False,
-                 on_success=None, on_failure=None, on_exit_code=None):
-        self._id = id
-        self._step = None if step is None else shlex.split(step)
+                 on_success=None, on_failure=None, on_exit_code=None, capture=None,
+                 depends_on=None, needs=None, timeout=None, cache=None, parallel=None, reduce=None,
+                 retry=None, service=None):
+        self._id = _intern(id)
+        self._step = None if step is None else split_command(step)
         self._doc = doc
         self._with_stdin = with_stdin
-        self._on_success = on_success
-        self._on_failure = on_failure
+        self._on_success = _intern(on_success)
+        self._on_failure = _intern(on_failure)
         self._on_exit_code = on_exit_code
+        self._capture = capture
+        self._depends_on = self._as_list(depends_on if depends_on is not None else needs)
+        self._timeout = timeout
+        self._cache = cache
+        self._parallel = parallel
+        self._reduce = None if reduce is None else split_command(reduce)
+        self._retry = retry_module.RetryPolicy.parse(id, retry)
+        self._service = None if not service else service_module.probes(id, service)
         self._exit_code = None
         self._status = Status.READY
         self._on_status_change = None
+        self._metrics = None
+        self._supervisor = None
+
+        if (parallel or reduce is not None) and not with_stdin:
+            raise graph.FlowError("Step {!r}: parallel and reduce need with_stdin".format(id))
+        if reduce is not None and not parallel:
+            raise graph.FlowError("Step {!r}: reduce needs parallel".format(id))
+        if service and (with_stdin or cache or parallel):
+            raise graph.FlowError("Step {!r}: a service can't read stdin, be cached or run in parallel".format(id))
 
     @property
     def id(self):
@@ -79,6 +148,47 @@ class Step:
     def on_exit_code(self):
         return self._on_exit_code
 
+    @property
+    def capture(self):
+        return self._capture
+
+    @property
+    def depends_on(self):
+        return self._depends_on
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def parallel(self):
+        return self._parallel
+
+    @property
+    def reduce(self):
+        return self._reduce
+
+    @property
+    def retry(self):
+        """
+        `RetryPolicy` built from the `retry:` settings (None if the step is never retried)
+        """
+
+        return self._retry
+
+    @property
+    def service(self):
+        """
+        Readiness probes of a step running in the background
+        until the end of the flow (None for ordinary steps)
+        """
+
+        return self._service
+
     @property
     def exit_code(self):
         return self._exit_code
@@ -98,6 +208,19 @@ class Step:
             self.on_status_change(current_status=self.status, new_status=value)
         self._status = value
 
+    async def set_status_async(self, value):
+        """
+        Same as setting `status`, but `on_status_change` may be a coroutine function
+        """
+
+        import inspect
+
+        if self.on_status_change is not None:
+            result = self.on_status_change(current_status=self.status, new_status=value)
+            if inspect.isawaitable(result):
+                await result
+        self._status = value
+
     @property
     def on_status_change(self):
         return self._on_status_change
@@ -106,35 +229,368 @@ class Step:
     def on_status_change(self, callback):
         self._on_status_change = callback
 
-    def execute(self, exit_code=None, stdout=None, stderr=None):
-        logging.debug("Executing step: {}, exit_code={!r}, stdout={!r}, stderr={!r}".format(self, exit_code, stdout, stderr))
+    @property
+    def metrics(self):
+        """
+        Timings and resource usage of the last execution of the step
+        """
+
+        return self._metrics
+
+    @staticmethod
+    def _as_list(value):
+        if value is None or isinstance(value, list):
+            return value
+        return [value]
+
+    def execute(self, exit_code=None, stdout=None, stderr=None, deadline=None, step_cache=None):
+        """
+        Run the step and return (exit_code, stdout, stderr).
+        The step is stopped once its own `timeout` or the flow-wide
+        `deadline` (a `time.monotonic()` value) expires.
+        Steps with `cache:` set are looked up in `step_cache`
+        (the default store if None) before being run.
+        """
+
+        logging.debug("Executing step: %s, exit_code=%r, stdout=%r, stderr=%r", self, exit_code, stdout, stderr)
+
+        deadline = process.deadline_after(self.timeout, deadline)
+
+        if deadline is not None and process.remaining(deadline) == 0:
+            self._expired()
+            return self._time_out(None, None)
+
+        self._metrics = metrics.StepMetrics(self.id)
+
+        if self.service is not None:
+            self.status = Status.RUNNING
+            (code, status, out, err) = self._service_outcome(self._start_service().wait_ready(deadline))
+            self._exit_code = code
+            if status != self.status:
+                self.status = status
+            return (code, out, err)
+
+        (store, key) = self._cache_lookup(stdout, step_cache)
+
+        if key is not None:
+            cached = store.get(key)
+            if cached is not None:
+                return self._cache_hit(cached)
 
         self.status = Status.RUNNING
 
-        if self.with_stdin:
-            return self._execute_with_communicate(stdout)
-        return self._execute_normally()
+        if self.parallel:
+            result = self._finish_parallel(parallel_module.execute(self, stdout, deadline), stdout)
+        elif self.with_stdin:
+            result = self._execute_with_communicate(stdout, deadline)
+        else:
+            result = self._execute_normally(deadline)
 
-    def _execute_with_communicate(self, stdout):
-        p = Popen(self.step, stdin=PIPE, stdout=PIPE, stderr=PIPE)
-        tup = p.communicate(input=stdout)
+        self._cache_store(store, key, result)
+        return result
 
-        self._set_exit_code_and_status(p.returncode, Status.TERMINATED)
+    async def execute_async(self, exit_code=None, stdout=None, stderr=None, deadline=None, step_cache=None):
+        """
+        Same as `execute`, but the process is spawned and supervised
+        by the running event loop instead of blocking a thread
+        """
+
+        # Imported here: asyncio is slow to import and only needed by async executors
+        import asyncio
+
+        logging.debug("Executing step asynchronously: %s, exit_code=%r, stdout=%r, stderr=%r", self, exit_code, stdout, stderr)
+
+        deadline = process.deadline_after(self.timeout, deadline)
+
+        if deadline is not None and process.remaining(deadline) == 0:
+            self._expired()
+            self._exit_code = TIMEOUT_EXIT_CODE
+            await self.set_status_async(Status.TIMED_OUT)
+            return (self.exit_code, None, None)
+
+        self._metrics = metrics.StepMetrics(self.id)
+
+        if self.service is not None:
+            # Readiness is waited for on a thread, status changes stay on the loop
+            await self.set_status_async(Status.RUNNING)
+            supervisor = self._start_service()
+            ready = await asyncio.get_event_loop().run_in_executor(None, supervisor.wait_ready, deadline)
+            (code, status, out, err) = self._service_outcome(ready)
+            self._exit_code = code
+            if status != self.status:
+                await self.set_status_async(status)
+            return (code, out, err)
+
+        (store, key) = self._cache_lookup(stdout, step_cache)
+
+        if key is not None:
+            cached = store.get(key)
+            if cached is not None:
+                logging.info("Step %r: using cached result", self.id)
+                await self.set_status_async(Status.RUNNING)
+                self._exit_code = cached[0]
+                await self.set_status_async(Status.TERMINATED)
+                self._metrics.finished(cached[0])
+                return tuple(cached)
+
+        await self.set_status_async(Status.RUNNING)
+
+        if self.parallel:
+            # Partitions run on a thread pool, status changes stay on the loop
+            (code, out, err, timed_out) = await asyncio.get_event_loop().run_in_executor(
+                None, parallel_module.execute, self, stdout, deadline)
+            self._exit_code = TIMEOUT_EXIT_CODE if timed_out else code
+            await self.set_status_async(Status.TIMED_OUT if timed_out else Status.TERMINATED)
+            self._metrics.finished(self.exit_code, stdin=stdout)
+            (self._metrics.stdout_bytes, self._metrics.stderr_bytes) = (len(out), len(err))
+            result = (self.exit_code, out, err)
+            self._cache_store(store, key, result)
+            return result
+
+        spilled = stdout.open() if self.with_stdin and isinstance(stdout, capture.SpilledOutput) else None
+
+        try:
+            p = await asyncio.create_subprocess_exec(*self.step,
+                                                     stdin=spilled or (PIPE if self.with_stdin else None),
+                                                     stdout=PIPE, stderr=PIPE,
+                                                     start_new_session=deadline is not None)
+        finally:
+            if spilled is not None:
+                spilled.close()
+
+        self._metrics.spawned()
+        (out, err) = self.create_captures()
+
+        async def _communicate():
+            await capture.drain_async({p.stdout: out, p.stderr: err},
+                                      None if p.stdin is None else {p.stdin: stdout})
+            await p.wait()
+
+        try:
+            await asyncio.wait_for(_communicate(), process.remaining(deadline))
+        except asyncio.TimeoutError:
+            logging.warning("Step %r timed out, terminating it", self.id)
+            await process.kill_group_async(p)
+            self._exit_code = TIMEOUT_EXIT_CODE
+            await self.set_status_async(Status.TIMED_OUT)
+        except BaseException:
+            if p.returncode is None:
+                p.kill()
+            raise
+        else:
+            self._exit_code = p.returncode
+            await self.set_status_async(Status.TERMINATED)
+
+        # The event loop reaps the process, so its rusage is not available
+        self._metrics.finished(self.exit_code, stdin=stdout if self.with_stdin else None, out=out, err=err)
+
+        (stdout, stderr) = (out.getvalue(), err.getvalue())
+        out.close()
+        err.close()
+
+        result = (self.exit_code, stdout, stderr)
+        self._cache_store(store, key, result)
+        return result
+
+    def _cache_lookup(self, stdin, step_cache=None):
+        """
+        Return the (store, key) of this execution, or (None, None)
+        if the step is not cached. `cache:` is either a boolean or:
+
+            cache: {inputs: [src/*.c, Makefile], fingerprint: hash|mtime, env: [CC, CFLAGS]}
+
+        By default the whole environment is part of the key,
+        `env:` restricts it to the listed variables.
+        """
+
+        config = self.cache
+
+        if not config or self.step is None:
+            return (None, None)
+
+        if not isinstance(config, dict):
+            config = {}
+
+        env = os.environ
+        if config.get('env') is not None:
+            env = {name: env.get(name) for name in self._as_list(config['env'])}
+
+        key = stepcache.StepCache.key(self.step, stdin if self.with_stdin else None, dict(env),
+                                      self._as_list(config.get('inputs')),
+                                      config.get('fingerprint', 'hash'))
+
+        return (step_cache or stepcache.default_cache(), key)
+
+    def _cache_hit(self, cached):
+        logging.info("Step %r: using cached result", self.id)
+        self.status = Status.RUNNING
+        self._set_exit_code_and_status(cached[0], Status.TERMINATED)
+        self._metrics.finished(cached[0])
+        return tuple(cached)
+
+    @staticmethod
+    def _cache_store(store, key, result):
+        """
+        Only successful runs are stored, so that failures are always retried
+        """
+
+        if key is not None and result[0] == 0:
+            store.put(key, result)
+
+    def _finish_parallel(self, parallel_result, stdin):
+        (code, out, err, timed_out) = parallel_result
+
+        if timed_out:
+            logging.warning("Step %r timed out, terminating it", self.id)
+            self._set_exit_code_and_status(TIMEOUT_EXIT_CODE, Status.TIMED_OUT)
+        else:
+            self._set_exit_code_and_status(code, Status.TERMINATED)
+
+        # Copies run concurrently, so there is no single rusage to report
+        self._metrics.finished(self.exit_code, stdin=stdin)
+        (self._metrics.stdout_bytes, self._metrics.stderr_bytes) = (len(out), len(err))
+
+        return (self.exit_code, out, err)
+
+    def _start_service(self):
+        """
+        Start the step in the background, after stopping the service
+        it started before (when the flow loops back to the step)
+        """
+
+        self.stop_service()
+        self._supervisor = service_module.Service(self.step, self.service, self.create_captures())
+        self._metrics.spawned()
+        return self._supervisor
+
+    def _service_outcome(self, exit_code):
+        """
+        Return the (exit_code, status, stdout, stderr) of the step given the
+        result of `Service.wait_ready`. A service that is not ready is stopped.
+        """
+
+        self._metrics.finished(TIMEOUT_EXIT_CODE if exit_code is None else exit_code)
 
-        return (self.exit_code, tup[0], tup[1])
+        if exit_code == 0:
+            logging.info("Service %r is ready (pid %s)", self.id, self._supervisor.pid)
+            return (0, Status.RUNNING, b'', b'')
 
-    def _execute_normally(self):
-        with Popen(self.step, stdout=PIPE, stderr=PIPE) as p:
-            stdout = None if p.stdout is None else p.stdout.read()
-            stderr = None if p.stderr is None else p.stderr.read()
+        (supervisor, self._supervisor) = (self._supervisor, None)
+        (out, err) = supervisor.stop()
+
+        if exit_code is None:
+            logging.warning("Service %r was not ready in time, terminating it", self.id)
+            return (TIMEOUT_EXIT_CODE, Status.TIMED_OUT, out, err)
+
+        logging.warning("Service %r exited before it was ready, exit_code=%r", self.id, exit_code)
+        return (exit_code, Status.TERMINATED, out, err)
+
+    def stop_service(self):
+        """
+        Stop the service started by the step. Return True if there was
+        one: its status is then left for the caller to update.
+        """
+
+        if self._supervisor is None:
+            return False
+
+        (supervisor, self._supervisor) = (self._supervisor, None)
+        (out, err) = supervisor.stop()
+        logging.debug("Stopped service %r, stdout=%r, stderr=%r", self.id, out, err)
+        return True
+
+    def _execute_with_communicate(self, stdout, deadline=None):
+        if isinstance(stdout, capture.SpilledOutput):
+            # The child reads the spilled file directly, nothing goes through swen
+            with stdout.open() as f:
+                p = process.spawn(self.step, stdin=f, stdout=PIPE, stderr=PIPE, start_new_session=deadline is not None)
+            self._metrics.spawned()
+            result = self._communicate(p, deadline=deadline)
+            self._metrics.stdin_bytes = len(stdout)
+            return result
+
+        p = process.spawn(self.step, stdin=PIPE, stdout=PIPE, stderr=PIPE, start_new_session=deadline is not None)
+        self._metrics.spawned()
+        return self._communicate(p, stdout, deadline)
+
+    def _execute_normally(self, deadline=None):
+        p = process.spawn(self.step, stdout=PIPE, stderr=PIPE, start_new_session=deadline is not None)
+        self._metrics.spawned()
+        return self._communicate(p, deadline=deadline)
+
+    def _communicate(self, p, stdin=None, deadline=None):
+        """
+        Feed `stdin` to the process and drain its stdout and stderr
+        concurrently, so that neither pipe can fill up and block the child.
+        Processes still running at `deadline` are killed with their process group.
+        """
+
+        (out, err) = self.create_captures()
+        rusage = None
+
+        try:
+            finished = capture.drain({p.stdout: out, p.stderr: err},
+                                     None if p.stdin is None else {p.stdin: stdin},
+                                     deadline=deadline)
+            if finished:
+                rusage = process.wait(p, timeout=process.remaining(deadline))
+        except TimeoutExpired:
+            finished = False
+        except BaseException:
+            p.kill()
+            p.wait()
+            raise
+
+        if not finished:
+            logging.warning("Step %r timed out, terminating it", self.id)
+            process.kill_group(p)
+            self._metrics.finished(TIMEOUT_EXIT_CODE, stdin=stdin, out=out, err=err)
+            return self._time_out(out, err)
 
         self._set_exit_code_and_status(p.returncode, Status.TERMINATED)
+        self._metrics.finished(p.returncode, rusage, stdin, out, err)
+
+        return (self.exit_code,) + self._collect(out, err)
+
+    def _expired(self):
+        # Nothing is run, but the metrics of a previous execution must not be reported again
+        self._metrics = metrics.StepMetrics(self.id)
+        self._metrics.finished(TIMEOUT_EXIT_CODE)
+
+    def _time_out(self, out, err):
+        self._set_exit_code_and_status(TIMEOUT_EXIT_CODE, Status.TIMED_OUT)
+
+        if out is None:
+            return (self.exit_code, None, None)
+        return (self.exit_code,) + self._collect(out, err)
+
+    @staticmethod
+    def _collect(out, err):
+        (stdout, stderr) = (out.getvalue(), err.getvalue())
+        out.close()
+        err.close()
+        return (stdout, stderr)
+
+    def create_captures(self):
+        """
+        Return (stdout, stderr) captures configured by the `capture:` settings.
+        Settings can be shared by both streams or given per stream:
+
+            capture: {head: 1M, tail: 1M, spill: 8M}
+            capture: {stderr: {tail: 64K}}
+        """
+
+        config = self.capture or {}
+
+        if 'stdout' in config or 'stderr' in config:
+            return (capture.Capture.from_config(config.get('stdout')),
+                    capture.Capture.from_config(config.get('stderr')))
 
-        return (self.exit_code, stdout, stderr)
+        return (capture.Capture.from_config(config), capture.Capture.from_config(config))
 
     def _set_exit_code_and_status(self, code, status):
         self._exit_code = code
         self.status = status
 
     def __str__(self):
-        return json.dumps(self.__dict__, cls=StepEncoder, indent=4)
+        return json.dumps({name: getattr(self, name) for name in self.__slots__}, cls=StepEncoder, indent=4)
@@ -0,0 +1,192 @@
+import os
+import glob
+import json
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+
+from . import capture
+from . import cachedir
+
+
+# Default size of the store, can be overridden with SWEN_STEP_CACHE_SIZE
+DEFAULT_MAX_SIZE = '1G'
+
+# Header of an entry: the exit code and the sizes of stdout and stderr
+# (-1 for None), followed by the outputs themselves
+_HEADER = struct.Struct('<qqq')
+
+
+class StepCache:
+    """
+    This class is a local content-addressed store of step results.
+
+    Each result is stored in a file named after its key. Reading an entry
+    refreshes its modification time, and when the store grows past
+    `max_size` bytes the least recently used entries are evicted.
+
+    Entries are plain data. A `root` that is not private to the user
+    (see `cachedir.private`) is not used: nothing is read from it
+    nor written to it, so steps are always executed.
+    """
+
+    def __init__(self, root, max_size=DEFAULT_MAX_SIZE):
+        self._root = root
+        self._max_size = capture.parse_size(max_size)
+        self._lock = threading.Lock()
+        self._enabled = cachedir.private(root)
+
+    @property
+    def root(self):
+        return self._root
+
+    @staticmethod
+    def key(argv, stdin=None, env=None, inputs=None, fingerprint='hash', cwd=None):
+        """
+        Return the key of a step execution: a hash of its argv, stdin,
+        environment, working directory and the fingerprints (content hash
+        or mtime and size) of the files matching the `inputs` globs
+        """
+
+        h = hashlib.sha256()
+        h.update(json.dumps([argv, sorted((env or {}).items()), cwd or os.getcwd()]).encode('utf-8'))
+        h.update(b'\0stdin\0')
+        h.update(stdin or b'')
+
+        for pattern in inputs or []:
+            paths = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+            for path in paths:
+                h.update(b'\0input\0' + path.encode('utf-8') + b'\0')
+                h.update(StepCache._fingerprint(path, fingerprint))
+
+        return h.hexdigest()
+
+    @staticmethod
+    def _fingerprint(path, fingerprint):
+        try:
+            if fingerprint == 'mtime':
+                st = os.stat(path)
+                return '{}:{}'.format(st.st_mtime_ns, st.st_size).encode('utf-8')
+
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    h.update(chunk)
+            return h.digest()
+        except (FileNotFoundError, IsADirectoryError):
+            return b'missing'
+
+    def _path(self, key):
+        return os.path.join(self._root, key[:2], key)
+
+    def get(self, key):
+        """
+        Return the cached (exit_code, stdout, stderr) for `key`, or None
+        """
+
+        if not self._enabled:
+            return None
+
+        path = self._path(key)
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            (exit_code, *sizes) = _HEADER.unpack_from(data)
+            outputs = []
+            offset = _HEADER.size
+
+            for size in sizes:
+                outputs.append(None if size < 0 else data[offset:offset + size])
+                offset += max(size, 0)
+
+            if offset != len(data):
+                raise ValueError("entry of {} bytes instead of {}".format(len(data), offset))
+
+            os.utime(path)
+            return (exit_code,) + tuple(outputs)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logging.warning("Ignoring corrupted step cache entry: %s", path)
+            return None
+
+    def put(self, key, result):
+        """
+        Store (exit_code, stdout, stderr) under `key` and evict old entries if needed
+        """
+
+        if not self._enabled:
+            return
+
+        (exit_code, *outputs) = result
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+        # Write to a temporary file first so that concurrent readers
+        # never see a partially written entry
+        (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(exit_code, *(-1 if out is None else len(out) for out in outputs)))
+            for out in outputs:
+                if out is not None:
+                    f.write(out)
+        os.replace(tmp_path, path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the store fits in `max_size`
+        """
+
+        if self._max_size is None or not self._enabled:
+            return
+
+        with self._lock:
+            entries = []
+            total = 0
+
+            for directory in os.scandir(self._root):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                    total += st.st_size
+
+            entries.sort()
+
+            while total > self._max_size and entries:
+                (mtime, size, path) = entries.pop(0)
+                logging.debug("Evicting step cache entry: %s", path)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+_default_cache = None
+
+
+def default_cache():
+    """
+    Return the store shared by all steps: $SWEN_CACHE_DIR/steps
+    (or ~/.cache/swen/steps) limited to $SWEN_STEP_CACHE_SIZE bytes
+    """
+
+    global _default_cache
+
+    if _default_cache is None:
+        cache_dir = os.environ.get('SWEN_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'swen'))
+        _default_cache = StepCache(os.path.join(cache_dir, 'steps'),
+                                   os.environ.get('SWEN_STEP_CACHE_SIZE', DEFAULT_MAX_SIZE))
+
+    return _default_cache
@@ -0,0 +1,177 @@
+import re
+
+from . import graph
+
+
+# Placeholders substituted natively: $name and ${name}
+_PLACEHOLDER = re.compile(r'\$(?:([A-Za-z_]\w*)|\{([A-Za-z_]\w*)\})')
+
+# What only Cheetah understands: directives (#if, #set, ##comment...),
+# escaped placeholders, placeholders with attribute lookups, calls
+# or indexing ($a.b, $f(), $a[0], ${a.b}) and cached placeholders ($*a, $!a)
+CHEETAH_SYNTAX = re.compile(r'#[#A-Za-z@{]'
+                            r'|\\\$'
+                            r'|\$[!*(\[]'
+                            r'|\$\{(?![A-Za-z_]\w*\})'
+                            r'|\$[A-Za-z_]\w*(?:\.[A-Za-z_]|[(\[])')
+
+
+class _Parts:
+    """
+    This class is a string with placeholders compiled into its literal
+    parts and the names of the variables between them
+    """
+
+    __slots__ = ('literals', 'names')
+
+    def __init__(self, literals, names):
+        self.literals = literals
+        self.names = names
+
+    def render(self, values):
+        try:
+            # A string made of a single placeholder takes the type of the value
+            if len(self.names) == 1 and not self.literals[0] and not self.literals[1]:
+                return values[self.names[0]]
+
+            parts = [self.literals[0]]
+            for (name, literal) in zip(self.names, self.literals[1:]):
+                value = values[name]
+                parts.append('' if value is None else str(value))
+                parts.append(literal)
+        except KeyError as e:
+            raise graph.FlowError("Unknown variable {!r}".format(e.args[0]))
+
+        return ''.join(parts)
+
+
+def _compile(node):
+    """
+    Return the substitution plan of `node`: the `_Parts` of a string,
+    a dict from keys (or list positions) to the plans of the children
+    holding placeholders, or None if there is nothing to substitute.
+    Mapping keys are never substituted.
+    """
+
+    if isinstance(node, str):
+        if '$' not in node:
+            return None
+
+        literals = []
+        names = []
+        start = 0
+
+        for match in _PLACEHOLDER.finditer(node):
+            literals.append(node[start:match.start()])
+            names.append(match.group(1) or match.group(2))
+            start = match.end()
+
+        if not names:
+            return None
+
+        literals.append(node[start:])
+        return _Parts(tuple(literals), tuple(names))
+
+    if isinstance(node, dict):
+        children = node.items()
+    elif isinstance(node, list):
+        children = enumerate(node)
+    else:
+        return None
+
+    plan = {}
+    for (key, child) in children:
+        child_plan = _compile(child)
+        if child_plan is not None:
+            plan[key] = child_plan
+
+    return plan or None
+
+
+def _render(node, plan, values):
+    """
+    Return a copy of `node` with the placeholders of `plan` substituted.
+    Only the containers on the way to a placeholder are copied,
+    everything else is shared with `node`.
+    """
+
+    if plan is None:
+        return node
+
+    if isinstance(plan, _Parts):
+        return plan.render(values)
+
+    copy = dict(node) if isinstance(node, dict) else list(node)
+
+    for (key, child_plan) in plan.items():
+        copy[key] = _render(node[key], child_plan, values)
+
+    return copy
+
+
+def _names(plan):
+    if plan is None:
+        return ()
+    if isinstance(plan, _Parts):
+        return plan.names
+    return tuple(name for child_plan in plan.values() for name in _names(child_plan))
+
+
+def resolve(flow_vars):
+    """
+    Return `flow_vars` with the placeholders in their own values substituted.
+    Variables are resolved in dependency order, so that a variable may be
+    defined with others (`path: $root/$flow_id`) whatever the order of their
+    definitions. Unknown variables and cycles raise a `FlowError`.
+    """
+
+    plans = {name: _compile(value) for (name, value) in flow_vars.items()}
+    resolved = {}
+    resolving = []
+
+    def _resolve(name):
+        if name in resolved:
+            return
+
+        if name in resolving:
+            cycle = resolving[resolving.index(name):] + [name]
+            raise graph.FlowError("Variables depend on each other: {}".format(' -> '.join(cycle)))
+
+        if name not in plans:
+            raise graph.FlowError("Unknown variable {!r} in the definition of {!r}".format(name, resolving[-1]))
+
+        resolving.append(name)
+        for dependency in _names(plans[name]):
+            _resolve(dependency)
+        resolving.pop()
+
+        resolved[name] = _render(flow_vars[name], plans[name], resolved)
+
+    for name in flow_vars:
+        _resolve(name)
+
+    return resolved
+
+
+class Substitution:
+    """
+    This class substitutes `$name`/`${name}` placeholders in a parsed flow
+    without going through Cheetah. The flow is compiled once into the plan
+    of where its placeholders are, rendering it with a set of vars only
+    rebuilds the strings holding placeholders (and their containers).
+    """
+
+    def __init__(self, parsed_yaml):
+        self._parsed_yaml = parsed_yaml
+        self._plan = _compile(parsed_yaml)
+
+    @property
+    def has_placeholders(self):
+        return self._plan is not None
+
+    def render(self, flow_vars):
+        """
+        Return the parsed flow with `flow_vars` substituted
+        """
+
+        return _render(self._parsed_yaml, self._plan, resolve(flow_vars or {}))
@@ -0,0 +1,187 @@
+import json
+import math
+import array
+import struct
+
+from . import step as step_module
+
+
+# Stored for exit codes and output sizes that are not known
+_MISSING = -2 ** 63
+
+# Layout of a record spilled to disk, in the order of `ExecutionTrace._COLUMNS`
+_RECORD = struct.Struct('<lqbddqq')
+
+# Spilled records read back at once by `ExecutionTrace.history`
+_SPILL_BATCH = 4096
+
+
+def _known(value):
+    return None if value == _MISSING or (isinstance(value, float) and math.isnan(value)) else value
+
+
+class TraceRecord:
+    """
+    This class is one transition of a flow: a step that was executed
+    (every attempt of a retried step is a transition of its own) and its
+    outcome. `started` and `finished` are `time.monotonic()` values.
+    Values that are not known (e.g. for steps without a command) are None.
+    """
+
+    __slots__ = ('id', 'index', 'exit_code', 'status', 'started', 'finished', 'stdout_bytes', 'stderr_bytes')
+
+    def __init__(self, id, index, exit_code, status, started, finished, stdout_bytes, stderr_bytes):
+        self.id = id
+        self.index = index
+        self.exit_code = exit_code
+        self.status = status
+        self.started = started
+        self.finished = finished
+        self.stdout_bytes = stdout_bytes
+        self.stderr_bytes = stderr_bytes
+
+    def as_dict(self):
+        record = {name: getattr(self, name) for name in self.__slots__}
+        record['status'] = self.status.name
+        return record
+
+    def __eq__(self, other):
+        if not isinstance(other, TraceRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return 'TraceRecord({!r}, exit_code={!r}, status={})'.format(self.id, self.exit_code, self.status.name)
+
+    def __str__(self):
+        return json.dumps(self.as_dict(), indent=4)
+
+
+class ExecutionTrace:
+    """
+    This class is the history of a flow execution: one record per
+    transition, stored in typed arrays (one per field) rather than as
+    objects, so that a record costs a few dozen bytes.
+
+    With `capacity` set, only the last `capacity` records are kept in
+    memory: the arrays are used as a ring buffer and older records are
+    appended to the `spill` file if there is one, dropped otherwise.
+    `history()` returns every record, spilled ones included.
+    """
+
+    _COLUMNS = (('index', 'l'), ('exit_code', 'q'), ('status', 'b'),
+                ('started', 'd'), ('finished', 'd'), ('stdout_bytes', 'q'), ('stderr_bytes', 'q'))
+
+    def __init__(self, table, capacity=None, spill=None):
+        if capacity is not None and capacity < 1:
+            raise ValueError("Trace capacity must be at least 1, not {!r}".format(capacity))
+
+        self._ids = table.ids
+        self._index = table.index
+        self._capacity = capacity
+        self._spill_path = spill
+        self._spill_file = None
+        self._columns = tuple(array.array(code) for (_, code) in self._COLUMNS)
+        self._oldest = 0
+        self._dropped = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def dropped(self):
+        """
+        Number of records no longer kept in memory
+        """
+
+        return self._dropped
+
+    def add(self, step):
+        """
+        Record the outcome of the last execution of `step`
+        """
+
+        m = step.metrics
+        (started, finished) = (math.nan, math.nan) if m is None or m.wall_time is None else (m.start, m.start + m.wall_time)
+
+        def _or_missing(value):
+            return _MISSING if value is None else value
+
+        self._append((self._index[step.id], _or_missing(step.exit_code), int(step.status), started, finished,
+                      _or_missing(None if m is None else m.stdout_bytes),
+                      _or_missing(None if m is None else m.stderr_bytes)))
+
+    def _append(self, values):
+        if self._capacity is None or len(self) < self._capacity:
+            for (column, value) in zip(self._columns, values):
+                column.append(value)
+            return
+
+        # The ring is full: the oldest record makes room for the new one
+        i = self._oldest
+
+        if self._spill_path is not None:
+            self._spill(self._row(i))
+
+        for (column, value) in zip(self._columns, values):
+            column[i] = value
+
+        self._oldest = (i + 1) % self._capacity
+        self._dropped += 1
+
+    def _row(self, i):
+        return tuple(column[i] for column in self._columns)
+
+    def _spill(self, row):
+        if self._spill_file is None:
+            self._spill_file = open(self._spill_path, 'wb')
+        self._spill_file.write(_RECORD.pack(*row))
+
+    def _record(self, row):
+        (index, exit_code, status, started, finished, stdout_bytes, stderr_bytes) = (_known(v) for v in row)
+        return TraceRecord(self._ids[index], index, exit_code, step_module.Status(status),
+                           started, finished, stdout_bytes, stderr_bytes)
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("trace index out of range")
+
+        return self._record(self._row((self._oldest + i) % len(self)))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if isinstance(other, (ExecutionTrace, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def history(self):
+        """
+        Iterate over every record of the trace, from the spill file first
+        """
+
+        if self._spill_file is not None:
+            if not self._spill_file.closed:
+                self._spill_file.flush()
+
+            with open(self._spill_path, 'rb') as f:
+                for _ in range(0, self._dropped, _SPILL_BATCH):
+                    for row in _RECORD.iter_unpack(f.read(_SPILL_BATCH * _RECORD.size)):
+                        yield self._record(row)
+
+        yield from self
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
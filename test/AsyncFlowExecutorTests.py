@@ -0,0 +1,115 @@
+#!/usr/bin/env python3.6
+
+import sys
+import asyncio
+import logging
+import unittest
+import time
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import asyncflowexecutor
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+YAML_SLEEP = """---
+version: 1.0
+id: "sleep"
+flow:
+- id: s_1
+  step: sleep 0.5
+- id: s_2
+  step: echo done
+"""
+
+
+class AsyncFlowExecutorTests(unittest.TestCase):
+    def setUp(self):
+        self.flow_dir = "flow"
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_flow_0000(self):
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0000")
+        self.assertEqual(exit_code, None)
+        self.assertEqual(stdout, None)
+        self.assertEqual(stderr, None)
+
+    def test_flow_0007(self):
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0007")
+        self.assertEqual(exit_code, 10)
+
+    def test_flow_0012(self):
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0012")
+        self.assertEqual(str(stdout, 'utf-8'), '4\n')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0013(self):
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0013")
+        self.assertEqual(str(stdout, 'utf-8'), '10\n')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0014(self):
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0014")
+        self.assertEqual(exit_code, 1)
+
+    def test_flow_0018_dag(self):
+        start = time.monotonic()
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0018")
+        self.assertLess(time.monotonic() - start, 1.4)
+        self.assertEqual(str(stdout, 'utf-8').strip(), '3')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0020_with_timeout(self):
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0020")
+        self.assertEqual(str(stdout, 'utf-8'), 'timed out\n')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0021_with_deadline(self):
+        start = time.monotonic()
+        (exit_code, stdout, stderr) = self._call_flow_executor("flow_0021")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(exit_code, 124)
+
+    def test_concurrent_flows(self):
+        executors = [asyncflowexecutor.AsyncFlowExecutor(YAML_SLEEP) for i in range(20)]
+
+        async def _execute_all():
+            return await asyncio.gather(*[fe.execute() for fe in executors])
+
+        start = time.monotonic()
+        results = self.loop.run_until_complete(_execute_all())
+        self.assertLess(time.monotonic() - start, 2.5)
+        for (exit_code, stdout, stderr) in results:
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(str(stdout, 'utf-8'), 'done\n')
+
+    def test_awaitable_status_callback(self):
+        transitions = []
+
+        async def status_callback(current_status=None, new_status=None):
+            await asyncio.sleep(0)
+            transitions.append((current_status, new_status))
+
+        fe = asyncflowexecutor.AsyncFlowExecutor(YAML_SLEEP)
+        for s in fe.flow.steps.values():
+            s.on_status_change = status_callback
+        self.loop.run_until_complete(fe.execute())
+        self.assertEqual(transitions, [(0, 1), (1, 2), (0, 1), (1, 2)])
+
+    def _call_flow_executor(self, flow_id):
+        yml_path = self.flow_dir + "/" + "{}/{}.yml".format(flow_id, flow_id)
+        logging.info("Testing flow: id={!r}, yaml={!r}".format(flow_id, yml_path))
+        with open(yml_path) as yml:
+            fe = asyncflowexecutor.AsyncFlowExecutor(yml)
+        return self.loop.run_until_complete(fe.execute())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3.6
+
+import sys
+import json
+import logging
+import unittest
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import batch
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+YAML_SLEEP = """---
+version: 1.0
+id: "sleep"
+priority: {}
+flow:
+- id: s_1
+  step: sleep 0.3
+"""
+
+
+YAML_DAG = """---
+version: 1.0
+id: "dag"
+flow:
+- id: s_1
+  step: sleep 0.3
+- id: s_2
+  step: sleep 0.3
+- id: s_3
+  step: "true"
+  depends_on: [s_1, s_2]
+"""
+
+
+class BatchTests(unittest.TestCase):
+    def setUp(self):
+        self.flow_dir = "flow"
+
+    def test_expand(self):
+        flows = batch.BatchRunner.expand(self.flow_dir)
+        self.assertIn("flow/flow_0001/flow_0001.yml", flows)
+        self.assertEqual(batch.BatchRunner.expand("flow/flow_000[12]/*.yml"),
+                         ["flow/flow_0001/flow_0001.yml", "flow/flow_0002/flow_0002.yml"])
+        self.assertEqual(batch.BatchRunner.expand("flow/flow_0001/flow_0001.yml"),
+                         ["flow/flow_0001/flow_0001.yml"])
+
+    def test_expand_nothing(self):
+        with self.assertRaises(FileNotFoundError):
+            batch.BatchRunner.expand("flow/*.nothing")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(FileNotFoundError):
+                batch.BatchRunner.expand(tmp_dir)
+
+    def test_batch_report(self):
+        runner = batch.BatchRunner(workers=4)
+        for path in ["flow/flow_0001/flow_0001.yml", "flow/flow_0012/flow_0012.yml",
+                     "flow/flow_0014/flow_0014.yml", "flow/does_not_exist.yml"]:
+            runner.add(path)
+        report = runner.run()
+        self.assertEqual(len(report.results), 4)
+        self.assertEqual(sorted(r.path for r in report.failed),
+                         ["flow/does_not_exist.yml", "flow/flow_0014/flow_0014.yml"])
+        self.assertEqual(report.exit_code, 1)
+        self.assertEqual(json.loads(str(report))["passed"], 2)
+
+        summary = report.summary().splitlines()
+        self.assertEqual(len(summary), 5)
+        self.assertIn("(FileNotFoundError:", [line for line in summary if "does_not_exist" in line][0])
+        self.assertTrue(summary[-1].startswith("4 flows, 2 passed, 2 failed in "))
+
+    def test_batch_concurrency(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.yml') as tmp_file:
+            tmp_file.write(YAML_SLEEP.format(0))
+            tmp_file.flush()
+            runner = batch.BatchRunner(workers=8)
+            for i in range(8):
+                runner.add(tmp_file.name)
+            start = time.monotonic()
+            report = runner.run()
+            self.assertLess(time.monotonic() - start, 1.5)
+            self.assertEqual(len(report.passed), 8)
+
+    def test_batch_priorities(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for priority in [1, 5, 3]:
+                with open("{}/flow_{}.yml".format(tmp_dir, priority), 'w') as f:
+                    f.write(YAML_SLEEP.format(priority))
+            runner = batch.BatchRunner(workers=1)
+            for path in batch.BatchRunner.expand(tmp_dir):
+                runner.add(path)
+            report = runner.run()
+            self.assertEqual([r.priority for r in report.results], [5, 3, 1])
+
+    def test_batch_max_parallel(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.yml') as tmp_file:
+            tmp_file.write(YAML_DAG)
+            tmp_file.flush()
+            runner = batch.BatchRunner(workers=1, max_parallel=1)
+            runner.add(tmp_file.name)
+            report = runner.run()
+            self.assertEqual(len(report.passed), 1)
+            self.assertGreaterEqual(report.results[0].elapsed, 0.6)
+
+    def test_batch_with_processes(self):
+        runner = batch.BatchRunner(workers=1, processes=True)
+        runner.add("flow/flow_0012/flow_0012.yml")
+        runner.add("flow/flow_0014/flow_0014.yml", priority=10)
+        report = runner.run()
+        self.assertEqual([r.exit_code for r in report.results], [1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3.6
+
+import io
+import os
+import sys
+import json
+import logging
+import unittest
+import tempfile
+import contextlib
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import bench
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+# Every benchmark but `import`, which needs swen to be importable from a fresh interpreter
+TINY = ['--steps', '3', '--loop', '10', '--spawn', '2', '--payloads', '1K',
+        '--only', 'yaml', 'load', 'vars', 'memory', 'next_step', 'dag', 'spawn', 'pipe']
+
+
+def _result(seconds, count=1, **params):
+    return dict(bench._result('load', seconds, count, steps=10), **params)
+
+
+class BenchTests(unittest.TestCase):
+
+    def tearDown(self):
+        # main() disables logging below WARNING
+        logging.disable(logging.NOTSET)
+
+    def _main(self, argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            passed = bench.main(argv)
+        return (passed, [json.loads(line) for line in out.getvalue().splitlines()])
+
+    def test_main(self):
+        (passed, results) = self._main(TINY)
+
+        self.assertTrue(passed)
+        self.assertEqual({'yaml', 'load', 'load_cached', 'vars_first', 'vars_new', 'memory',
+                          'next_step', 'next_step_loop', 'dag', 'spawn', 'pipe_streaming', 'pipe_buffered'},
+                         {r['benchmark'] for r in results})
+
+        for r in results:
+            self.assertLessEqual({'benchmark', 'seconds', 'count', 'per_op_us'}, set(r))
+            self.assertGreaterEqual(r['seconds'], 0)
+            self.assertNotIn('ratio', r)
+
+    def test_compare(self):
+        baseline = [_result(1.0), _result(1.0, parser='swen')]
+        compared = bench.compare([_result(1.3), _result(1.1, parser='swen'), _result(5.0, parser='libyaml')],
+                                 baseline, 0.2)
+
+        self.assertTrue(compared[0]['regression'])
+        self.assertAlmostEqual(compared[0]['ratio'], 1.3)
+        self.assertFalse(compared[1]['regression'])
+        self.assertNotIn('regression', compared[2])
+
+    def test_compare_per_operation(self):
+        compared = bench.compare([_result(2.0, count=20)], [_result(1.0, count=10)], 0.2)
+        self.assertFalse(compared[0]['regression'])
+
+    def test_main_compare(self):
+        argv = ['--steps', '3', '--only', 'load']
+
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, 'baseline.jsonl')
+
+            for (seconds, passed) in ((1000.0, True), (1e-12, False)):
+                with open(baseline, 'w') as f:
+                    for name in ('load', 'load_cached'):
+                        f.write(json.dumps(bench._result(name, seconds, 3, steps=3)) + '\n')
+
+                (result, results) = self._main(argv + ['--compare', baseline, '--threshold', '0.2'])
+                self.assertEqual(passed, result)
+                self.assertEqual([not passed] * 2, [r['regression'] for r in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
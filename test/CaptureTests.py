@@ -0,0 +1,117 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import pickle
+import subprocess
+import logging
+import unittest
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import capture
+from swen import step
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+class CaptureTests(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(capture.parse_size(None), None)
+        self.assertEqual(capture.parse_size(100), 100)
+        self.assertEqual(capture.parse_size("100"), 100)
+        self.assertEqual(capture.parse_size("64K"), 64 * 1024)
+        self.assertEqual(capture.parse_size("10M"), 10 * 1024 ** 2)
+        self.assertEqual(capture.parse_size("1gb"), 1024 ** 3)
+
+    def test_unbounded_capture(self):
+        c = capture.Capture()
+        c.write(b"abc")
+        c.write(b"def")
+        self.assertEqual(c.getvalue(), b"abcdef")
+        self.assertEqual(c.size, 6)
+        self.assertEqual(c.dropped, 0)
+
+    def test_head_capture(self):
+        c = capture.Capture(head=4)
+        c.write(b"abc")
+        c.write(b"def")
+        self.assertEqual(c.getvalue(), b"abcd")
+        self.assertEqual(c.dropped, 2)
+
+    def test_tail_capture(self):
+        c = capture.Capture(tail=4)
+        for chunk in [b"ab", b"cde", b"f", b"ghij"]:
+            c.write(chunk)
+        self.assertEqual(c.getvalue(), b"ghij")
+        self.assertEqual(c.size, 10)
+        self.assertEqual(c.dropped, 6)
+
+    def test_head_and_tail_capture(self):
+        c = capture.Capture(head=2, tail=3)
+        c.write(b"0123456789")
+        self.assertEqual(c.getvalue(), b"01789")
+        self.assertEqual(c.dropped, 5)
+
+    def test_spilled_capture(self):
+        c = capture.Capture(spill=16)
+        for i in range(100):
+            c.write(b"0123456789")
+        self.assertEqual(c.getvalue(), b"0123456789" * 100)
+        c.close()
+
+    def test_spilled_output(self):
+        c = capture.Capture(spill=16)
+        c.write(b"0123456789" * 10)
+        value = c.getvalue()
+        c.close()
+
+        self.assertIsInstance(value, capture.SpilledOutput)
+        self.assertTrue(os.path.exists(value.path))
+        self.assertEqual(len(value), 100)
+        self.assertEqual(value[:10], b"0123456789")
+        self.assertEqual(pickle.loads(pickle.dumps(value)), b"0123456789" * 10)
+
+        value.close()
+        self.assertFalse(os.path.exists(value.path))
+
+    def test_bounded_capture_is_not_handed_over(self):
+        c = capture.Capture(spill=16, tail=4)
+        c.write(b"0123456789" * 10)
+        self.assertEqual(c.getvalue(), b"6789")
+        c.close()
+
+    def test_large_output_is_bytes_by_default(self):
+        s = step.Step(id="produce", step="head -c 67108865 /dev/zero")
+        (exit_code, stdout, _) = s.execute()
+        self.assertEqual(exit_code, 0)
+        self.assertIs(type(stdout), bytes)
+        self.assertEqual(len(stdout), 67108865)
+
+    def test_spilled_output_as_stdin(self):
+        producer = step.Step(id="produce", step="head -c 100000 /dev/zero", capture={"spill": "1K"})
+        (_, stdout, _) = producer.execute()
+        self.assertIsInstance(stdout, capture.SpilledOutput)
+
+        consumer = step.Step(id="consume", step="wc -c", with_stdin=True)
+        (exit_code, out, _) = consumer.execute(stdout=stdout)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(out.strip(), b"100000")
+        self.assertEqual(consumer.metrics.stdin_bytes, 100000)
+
+    def test_drain(self):
+        p = subprocess.Popen(["sh", "-c", "wc -c; head -c 1000000 /dev/zero >&2"],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (out, err) = (capture.Capture(), capture.Capture())
+        capture.drain({p.stdout: out, p.stderr: err}, {p.stdin: b"x" * 1000000})
+        p.wait()
+        self.assertEqual(p.returncode, 0)
+        self.assertEqual(out.getvalue().strip(), b"1000000")
+        self.assertEqual(err.size, 1000000)
+
+
+if __name__ == '__main__':
+    unittest.main()
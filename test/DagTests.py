@@ -0,0 +1,153 @@
+#!/usr/bin/env python3.6
+
+import sys
+import logging
+import unittest
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import flow
+from swen import dag
+from swen import graph
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+YAML_FAN_OUT = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: a
+  step: ./a
+- id: b
+  step: ./b
+  depends_on: a
+- id: c
+  step: ./c
+  depends_on: a
+- id: d
+  step: ./d
+  with_stdin: yes
+  needs: [b, c]
+"""
+
+YAML_FAILURE = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: a
+  step: ./a
+- id: b
+  step: ./b
+  depends_on: a
+- id: c
+  step: ./c
+"""
+
+YAML_ROUTED = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: a
+  step: ./a
+  on_success: c
+- id: b
+  step: ./b
+  depends_on: []
+- id: c
+  step: ./c
+  depends_on: b
+"""
+
+YAML_CYCLE = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: a
+  step: ./a
+  depends_on: b
+- id: b
+  step: ./b
+  depends_on: a
+"""
+
+YAML_UNKNOWN_DEPENDENCY = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: a
+  step: ./a
+  depends_on: z
+"""
+
+
+class DagTests(unittest.TestCase):
+    def test_fan_out(self):
+        steps = flow.Flow(YAML_FAN_OUT).steps
+        s = dag.DagScheduler(steps)
+        self.assertEqual([st.id for st in s.ready()], ["a"])
+        self.assertEqual(s.ready(), [])
+        s.complete(steps["a"], (0, b"a\n", b""))
+        self.assertEqual([st.id for st in s.ready()], ["b", "c"])
+        s.complete(steps["c"], (0, b"c\n", b""))
+        self.assertEqual(s.ready(), [])
+        s.complete(steps["b"], (0, b"b\n", b""))
+        ready = s.ready()
+        self.assertEqual([st.id for st in ready], ["d"])
+        self.assertEqual(s.stdin_for(ready[0]), b"b\nc\n")
+        s.complete(ready[0], (0, b"2\n", b""))
+        self.assertTrue(s.finished)
+        self.assertEqual(s.result(), (0, b"2\n", b""))
+
+    def test_failure_stops_scheduling(self):
+        steps = flow.Flow(YAML_FAILURE).steps
+        s = dag.DagScheduler(steps)
+        self.assertEqual([st.id for st in s.ready()], ["a", "c"])
+        s.complete(steps["a"], (1, b"", b"error"))
+        self.assertEqual(s.ready(), [])
+        self.assertFalse(s.finished)
+        s.complete(steps["c"], (0, b"", b""))
+        self.assertTrue(s.finished)
+        self.assertEqual(s.failed_step.id, "a")
+        self.assertEqual(s.result(), (1, b"", b"error"))
+
+    def test_routed_target_waits_for_dependencies(self):
+        steps = flow.Flow(YAML_ROUTED).steps
+
+        for (first, second) in (("a", "b"), ("b", "a")):
+            s = dag.DagScheduler(steps)
+            self.assertEqual([st.id for st in s.ready()], ["a", "b"])
+            s.complete(steps[first], (0, b"", b""))
+            self.assertEqual(s.ready(), [])
+            self.assertFalse(s.finished)
+            s.complete(steps[second], (0, b"", b""))
+            self.assertEqual([st.id for st in s.ready()], ["c"])
+            s.complete(steps["c"], (0, b"c\n", b""))
+            self.assertTrue(s.finished)
+            self.assertEqual(s.result(), (0, b"c\n", b""))
+
+    def test_cycle(self):
+        with self.assertRaisesRegex(graph.FlowError, "Cyclic"):
+            flow.Flow(YAML_CYCLE)
+        with self.assertRaises(graph.FlowError):
+            flow.Flow(YAML_CYCLE.replace("depends_on: b", "depends_on: a"))
+
+    def test_unknown_dependency(self):
+        with self.assertRaises(graph.FlowError):
+            flow.Flow(YAML_UNKNOWN_DEPENDENCY)
+
+    def test_parallel_roots_warning(self):
+        with self.assertLogs(level='WARNING') as logs:
+            flow.Flow(YAML_FAILURE)
+        self.assertIn("['c']", logs.output[0])
+
+        with self.assertRaises(AssertionError):
+            with self.assertLogs(level='WARNING'):
+                flow.Flow(YAML_FAILURE.replace("step: ./c", "step: ./c\n  depends_on: []"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import logging
+import unittest
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import flow
+from swen import flowcache
+from swen import graph
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+YAML_WITH_VARS = """---
+version: 1.0
+id: "id-test"
+vars:
+  cmd: ls
+  arg: -l
+flow:
+- id: s_1
+  step: $cmd $arg
+"""
+
+YAML_WITH_DIRECTIVES = """---
+version: 1.0
+id: "id-test"
+vars:
+  cmd: ls
+  arg: -l
+flow:
+- id: s_1
+#if $arg == "-l"
+  step: $cmd $arg
+#else
+  step: $cmd
+#end if
+"""
+
+
+class CountingParser:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, data):
+        self.calls += 1
+        return flow.Flow._parse_yaml(data)
+
+
+class FlowCacheTests(unittest.TestCase):
+    def test_cache_hit(self):
+        cache = flowcache.FlowCache()
+        parse = CountingParser()
+        for i in range(3):
+            compiled = cache.compile(YAML_WITH_DIRECTIVES, parse)
+            parsed_yaml = cache.render(compiled, compiled.flow_vars, parse)
+        self.assertEqual(parse.calls, 2)
+        self.assertEqual(parsed_yaml['flow'][0]['step'], 'ls -l')
+
+    def test_cache_with_new_vars(self):
+        cache = flowcache.FlowCache()
+        parse = CountingParser()
+        compiled = cache.compile(YAML_WITH_DIRECTIVES, parse)
+        cache.render(compiled, {'cmd': 'ls', 'arg': '-l'}, parse)
+        template_class = compiled.template_class
+        parsed_yaml = cache.render(cache.compile(YAML_WITH_DIRECTIVES, parse), {'cmd': 'ls', 'arg': '-a'}, parse)
+        self.assertEqual(parse.calls, 3)
+        self.assertIs(compiled.template_class, template_class)
+        self.assertEqual(parsed_yaml['flow'][0]['step'], 'ls')
+
+    def test_native_substitution(self):
+        cache = flowcache.FlowCache()
+        parse = CountingParser()
+        for vars in [None, {'cmd': 'ls', 'arg': '-a'}, {'cmd': 'date', 'arg': '-u'}]:
+            compiled = cache.compile(YAML_WITH_VARS, parse)
+            parsed_yaml = cache.render(compiled, vars or compiled.flow_vars, parse)
+        self.assertTrue(compiled.is_template)
+        self.assertFalse(compiled.uses_cheetah)
+        self.assertIsNone(compiled.template_class)
+        self.assertEqual(parse.calls, 1)
+        self.assertEqual(parsed_yaml['flow'][0]['step'], 'date -u')
+        self.assertEqual(compiled.parsed_yaml['flow'][0]['step'], '$cmd $arg')
+
+    def test_flow_without_template_syntax(self):
+        cache = flowcache.FlowCache()
+        parse = CountingParser()
+        source = YAML_WITH_VARS.replace('$cmd $arg', 'ls -l')
+        compiled = cache.compile(source, parse)
+        parsed_yaml = cache.render(compiled, compiled.flow_vars, parse)
+        self.assertFalse(compiled.is_template)
+        self.assertIsNone(compiled.template_class)
+        self.assertEqual(parse.calls, 1)
+        self.assertEqual(parsed_yaml['flow'][0]['step'], 'ls -l')
+
+    def test_cache_eviction(self):
+        cache = flowcache.FlowCache(size=2)
+        parse = CountingParser()
+        for cmd in ['ls', 'date', 'ls', 'hostname', 'ls']:
+            cache.compile(YAML_WITH_VARS.replace('ls', cmd), parse)
+        self.assertEqual(parse.calls, 3)
+        cache.compile(YAML_WITH_VARS.replace('ls', 'date'), parse)
+        self.assertEqual(parse.calls, 4)
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parse = CountingParser()
+            cache = flowcache.FlowCache(cache_dir=cache_dir)
+            compiled = cache.compile(YAML_WITH_DIRECTIVES, parse)
+            cache.render(compiled, compiled.flow_vars, parse)
+            self.assertEqual(parse.calls, 2)
+            self.assertTrue(os.listdir(cache_dir))
+
+            cache = flowcache.FlowCache(cache_dir=cache_dir)
+            compiled = cache.compile(YAML_WITH_DIRECTIVES, parse)
+            parsed_yaml = cache.render(compiled, {'cmd': 'ls', 'arg': '-l'}, parse)
+            self.assertEqual(parse.calls, 2)
+            self.assertEqual(parsed_yaml['flow'][0]['step'], 'ls -l')
+
+            parsed_yaml = cache.render(compiled, {'cmd': 'date', 'arg': '-u'}, parse)
+            self.assertEqual(parse.calls, 3)
+            self.assertEqual(parsed_yaml['flow'][0]['step'], 'date')
+
+    def test_disk_cache_stores_data_only(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            parse = CountingParser()
+            source = YAML_WITH_DIRECTIVES + "  on_exit_code: {1: s_1, 2-3: s_1}\n"
+            cache = flowcache.FlowCache(cache_dir=cache_dir)
+            compiled = cache.compile(source, parse)
+            cache.render(compiled, compiled.flow_vars, parse)
+            self.assertTrue(all(name.endswith('.json') for name in os.listdir(cache_dir)))
+
+            cache = flowcache.FlowCache(cache_dir=cache_dir)
+            compiled = cache.compile(source, parse)
+            parsed_yaml = cache.render(compiled, compiled.flow_vars, parse)
+            self.assertEqual(parse.calls, 2)
+            self.assertEqual(parsed_yaml['flow'][0]['on_exit_code'], {1: 's_1', '2-3': 's_1'})
+
+    def test_shared_cache_dir_is_not_used(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, 'flows')
+            os.mkdir(cache_dir)
+            os.chmod(cache_dir, 0o777)
+            parse = CountingParser()
+            cache = flowcache.FlowCache(cache_dir=cache_dir)
+            compiled = cache.compile(YAML_WITH_DIRECTIVES, parse)
+            cache.render(compiled, compiled.flow_vars, parse)
+            self.assertEqual(os.listdir(cache_dir), [])
+
+    def test_flow_with_vars_override(self):
+        f = flow.Flow(YAML_WITH_VARS, vars={'arg': '-a'})
+        self.assertEqual(f._flow_vars, {'cmd': 'ls', 'arg': '-a'})
+        self.assertEqual(f.steps['s_1'].step, ['ls', '-a'])
+
+    def test_flow_with_nested_vars(self):
+        f = flow.Flow(YAML_WITH_VARS.replace('arg: -l', 'arg: -l $dir').replace('cmd: ls', 'cmd: ls\n  dir: /tmp'))
+        self.assertEqual(f.steps['s_1'].step, ['ls', '-l', '/tmp'])
+        self.assertEqual(f._parsed_yaml['vars']['arg'], '-l /tmp')
+
+    def test_flow_with_nested_vars_and_directives(self):
+        data = YAML_WITH_DIRECTIVES.replace('arg: -l', 'arg: -l\n  dir: $arg/tmp')
+        data = data.replace('step: $cmd $arg\n', 'step: $cmd $dir\n')
+        f = flow.Flow(data)
+        self.assertTrue(f._cache.compile(data, flow.Flow._parse_yaml).uses_cheetah)
+        self.assertEqual(f.steps['s_1'].step, ['ls', '-l/tmp'])
+
+    def test_flow_with_unknown_var(self):
+        with self.assertRaises(graph.FlowError):
+            flow.Flow(YAML_WITH_VARS.replace('$arg', '$args'))
+
+    def test_flow_instances_are_independent(self):
+        f1 = flow.Flow(YAML_WITH_VARS)
+        f2 = flow.Flow(YAML_WITH_VARS)
+        self.assertIsNot(f1.steps['s_1'], f2.steps['s_1'])
+        f1.steps['s_1'].execute()
+        self.assertEqual(f2.steps['s_1'].exit_code, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@ import time
 from pathlib import Path
 sys.path.append(str(Path('.').cwd().parent))
 from swen import flowexecutor
+from swen import step
 
 
 logging.basicConfig(
@@ -131,18 +132,113 @@ class FlowTests(unittest.TestCase):
         self.assertEqual(exit_code, 0)
         self.assertEqual(str(stdout, "utf-8"), "hello world\n")
 
-    def _call_flow_executor(self, flow_id):
+    def test_flow_0005_streaming(self):
+        flow_id = "flow_0005"
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id, streaming=True)
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0007_streaming(self):
+        flow_id = "flow_0007"
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id, streaming=True)
+        self.assertEqual(exit_code, 10)
+
+    def test_flow_0012_streaming(self):
+        flow_id = "flow_0012"
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id, streaming=True)
+        self.assertEqual(str(stdout, 'utf-8'), '4\n')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0013_streaming(self):
+        flow_id = "flow_0013"
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id, streaming=True)
+        self.assertEqual(str(stdout, 'utf-8'), '10\n')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0013_streaming_with_execution_graph(self):
+        flow_id = "flow_0013"
+        eg = self._call_flow_executor_execution_graph(flow_id, streaming=True)
+        self.assertEqual(len(eg), 4)
+        for s in [str(s) for s in eg]:
+            self.assertTrue("TERMINATED" in s)
+
+    def test_flow_0018_dag(self):
+        flow_id = "flow_0018"
+        start = time.monotonic()
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id)
+        self.assertLess(time.monotonic() - start, 1.4)
+        self.assertEqual(str(stdout, 'utf-8').strip(), '3')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0018_dag_sequential(self):
+        flow_id = "flow_0018"
+        start = time.monotonic()
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id, max_parallel=1)
+        self.assertGreaterEqual(time.monotonic() - start, 1.5)
+        self.assertEqual(str(stdout, 'utf-8').strip(), '3')
+        self.assertEqual(exit_code, 0)
+
+    def test_flow_0019_dag_with_execution_graph(self):
+        flow_id = "flow_0019"
+        eg = self._call_flow_executor_execution_graph(flow_id)
+        self.assertEqual(sorted(s.id for s in eg), ["Build", "Lint", "Report"])
+
+    def test_flow_0020_with_timeout(self):
+        flow_id = "flow_0020"
+        eg = self._call_flow_executor_execution_graph(flow_id)
+        self.assertEqual([s.id for s in eg], ["Step 1", "Step 3"])
+        self.assertEqual(eg[0].status, step.Status.TIMED_OUT)
+        self.assertEqual(eg[0].exit_code, step.TIMEOUT_EXIT_CODE)
+        self.assertEqual(eg[1].exit_code, 0)
+
+    def test_flow_0021_with_deadline(self):
+        flow_id = "flow_0021"
+        start = time.monotonic()
+        eg = self._call_flow_executor_execution_graph(flow_id)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual([s.status for s in eg], [step.Status.TERMINATED, step.Status.TIMED_OUT])
+
+    def test_flow_0021_streaming_with_deadline(self):
+        flow_id = "flow_0021"
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id, streaming=True, timeout=0.2)
+        self.assertEqual(exit_code, step.TIMEOUT_EXIT_CODE)
+
+    def test_flow_0022_with_exit_code_routing(self):
+        flow_id = "flow_0022"
+        eg = self._call_flow_executor_execution_graph(flow_id)
+        self.assertEqual([s.id for s in eg], ["Classify", "Fatal", "Done"])
+        self.assertEqual(eg[0].exit_code, 3)
+
+    def test_flow_0023_parallel_with_reduce(self):
+        flow_id = "flow_0023"
+        (exit_code, stdout, stderr) = self._call_flow_executor(flow_id)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(stdout, b"10000\n")
+
+    def test_flow_0024_service(self):
+        with open(self.flow_dir + "/flow_0024/flow_0024.yml") as yml:
+            fe = flowexecutor.FlowExecutor(yml)
+            start = time.monotonic()
+            (exit_code, stdout, stderr) = fe.execute()
+
+        # The server was terminated with the flow, not waited for
+        self.assertLess(time.monotonic() - start, 30)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(stdout, b"ready\n")
+        self.assertEqual(fe.flow.steps["Server"].exit_code, 0)
+        self.assertEqual(fe.flow.steps["Server"].status, step.Status.TERMINATED)
+
+    def _call_flow_executor(self, flow_id, **kwargs):
         yml_path = self.flow_dir + "/" + "{}/{}.yml".format(flow_id, flow_id)
         logging.info("Testing flow: id={!r}, yaml={!r}".format(flow_id, yml_path))
         with open(yml_path) as yml:
-            fe = flowexecutor.FlowExecutor(yml) 
+            fe = flowexecutor.FlowExecutor(yml, **kwargs)
             return fe.execute()
 
-    def _call_flow_executor_execution_graph(self, flow_id):
+    def _call_flow_executor_execution_graph(self, flow_id, **kwargs):
         yml_path = self.flow_dir + "/" + "{}/{}.yml".format(flow_id, flow_id)
         logging.info("Testing flow: id={!r}, yaml={!r}".format(flow_id, yml_path))
         with open(yml_path) as yml:
-            fe = flowexecutor.FlowExecutor(yml) 
+            fe = flowexecutor.FlowExecutor(yml, **kwargs)
             fe.execute()
         return fe.execution_graph
 
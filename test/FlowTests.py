@@ -1,6 +1,7 @@
 #!/usr/bin/env python3.6
 
 import sys
+import gc
 import logging
 import unittest
 import tempfile
@@ -189,5 +190,22 @@ class FlowTests(unittest.TestCase):
         f = flow.Flow(YAML_WITH_DUP_VARS)
         self.assertEqual(f._flow_vars, {'var2': 'val2'})
 
+    def test_gc_pause_is_shared(self):
+        self.assertTrue(gc.isenabled())
+        with flow._gc_pause:
+            with flow._gc_pause:
+                self.assertFalse(gc.isenabled())
+            # Another load is still in progress
+            self.assertFalse(gc.isenabled())
+        self.assertTrue(gc.isenabled())
+
+        gc.disable()
+        try:
+            with flow._gc_pause:
+                pass
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()
+
 if __name__ == '__main__':
     unittest.main()
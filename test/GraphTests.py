@@ -0,0 +1,187 @@
+#!/usr/bin/env python3.6
+
+import sys
+import logging
+import unittest
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import flow
+from swen import graph
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+YAML_TRANSITIONS = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: s_1
+  step: ./s_1.py
+  on_failure: s_3
+- id: s_2
+  step: ./s_2.py
+  on_success: s_1
+- id: s_3
+  step: ./s_3.py
+- id: s_4
+  step: ./s_4.py
+"""
+
+YAML_UNKNOWN_TARGET = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: s_1
+  step: ./s_1.py
+  on_failure: fail
+"""
+
+YAML_ENDLESS_LOOP = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: s_1
+  step: ./s_1.py
+- id: s_2
+  step: ./s_2.py
+  on_success: s_3
+  on_failure: s_3
+- id: s_3
+  step: ./s_3.py
+  on_success: s_2
+  on_failure: s_2
+- id: s_4
+  step: ./s_4.py
+"""
+
+YAML_UNREACHABLE = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: s_1
+  step: ./s_1.py
+  on_success: s_3
+  on_failure: s_3
+- id: s_2
+  step: ./s_2.py
+  on_success: s_2
+  on_failure: s_2
+- id: s_3
+  step: ./s_3.py
+  on_success: s_1
+"""
+
+YAML_EXIT_CODES = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: s_1
+  step: ./s_1.py
+  on_failure: s_4
+  on_exit_code:
+    0: s_2
+    "1-5": s_3
+    4: s_2
+    "-15": s_4
+- id: s_2
+  step: ./s_2.py
+- id: s_3
+  step: ./s_3.py
+- id: s_4
+  step: ./s_4.py
+"""
+
+YAML_INVALID_EXIT_CODES = """---
+version: 1.0
+id: "id-test"
+flow:
+- id: s_1
+  step: ./s_1.py
+  on_exit_code: {}
+- id: s_2
+  step: ./s_2.py
+"""
+
+
+class GraphTests(unittest.TestCase):
+    def test_transition_table(self):
+        t = graph.TransitionTable(flow.Flow(YAML_TRANSITIONS).steps)
+        self.assertEqual(t.ids, ("s_1", "s_2", "s_3", "s_4"))
+        self.assertEqual(t.index["s_3"], 2)
+        self.assertEqual(t.successor, (1, 2, 3, None))
+        self.assertEqual(t.on_success, (None, 0, None, None))
+        self.assertEqual(t.on_failure, (2, None, None, None))
+        self.assertEqual(t.terminal, (False, False, False, True))
+
+    def test_next(self):
+        t = graph.TransitionTable(flow.Flow(YAML_TRANSITIONS).steps)
+        self.assertEqual(t.next(0, 0), 1)
+        self.assertEqual(t.next(0, 1), 2)
+        self.assertEqual(t.next(1, 0), 0)
+        self.assertEqual(t.next(1, 1), 2)
+        self.assertEqual(t.next(2, 0), 3)
+        self.assertEqual(t.next(3, 0), None)
+
+    def test_unknown_target(self):
+        with self.assertRaises(graph.FlowError):
+            flow.Flow(YAML_UNKNOWN_TARGET)
+
+    def test_reachable(self):
+        t = graph.TransitionTable(flow.Flow(YAML_TRANSITIONS).steps)
+        self.assertEqual(t.reachable, (True, True, True, True))
+        self.assertEqual(t.edges(0), {1, 2})
+        self.assertEqual(t.edges(3), {None})
+
+    def test_unreachable_loop(self):
+        with self.assertLogs(level=logging.WARNING):
+            t = graph.TransitionTable(flow.Flow(YAML_UNREACHABLE).steps)
+        self.assertEqual(t.reachable, (True, False, True))
+
+    def test_endless_loop(self):
+        with self.assertRaises(graph.FlowError):
+            flow.Flow(YAML_ENDLESS_LOOP)
+
+    def test_exit_code_routing(self):
+        t = graph.TransitionTable(flow.Flow(YAML_EXIT_CODES).steps)
+        self.assertEqual(t.next(0, 0), 1)
+        self.assertEqual(t.next(0, 1), 2)
+        self.assertEqual(t.next(0, 4), 1)
+        self.assertEqual(t.next(0, 5), 2)
+        self.assertEqual(t.next(0, -15), 3)
+        self.assertEqual(t.next(0, 6), 3)
+        self.assertTrue(t.routes(0, 6))
+
+    def test_exit_code_routing_without_on_failure(self):
+        t = graph.TransitionTable(flow.Flow(YAML_INVALID_EXIT_CODES.format("{2: s_2}")).steps)
+        self.assertTrue(t.routes(0, 2))
+        self.assertFalse(t.routes(0, 1))
+        self.assertEqual(t.next(0, 1), 1)
+
+    def test_invalid_exit_codes(self):
+        for on_exit_code in ["{1: unknown}", "{x: s_2}", "{5-1: s_2}", "{0-1000: s_2}",
+                             "{1-3: s_2, 2-4: s_2}", "[s_2]"]:
+            with self.assertRaises(graph.FlowError):
+                flow.Flow(YAML_INVALID_EXIT_CODES.format(on_exit_code))
+
+    def test_step_map(self):
+        f = flow.Flow(YAML_TRANSITIONS)
+        self.assertIsInstance(f.steps, graph.StepMap)
+        self.assertEqual(list(f.steps), ["s_1", "s_2", "s_3", "s_4"])
+        self.assertEqual(len(f.steps), 4)
+        self.assertIs(f.steps["s_3"], f.table.steps[2])
+        self.assertTrue("s_4" in f.steps)
+        self.assertFalse("s_5" in f.steps)
+        with self.assertRaises(KeyError):
+            f.steps["s_5"]
+
+    def test_empty_table(self):
+        t = graph.TransitionTable({})
+        self.assertEqual(len(t), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
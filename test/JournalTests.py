@@ -0,0 +1,130 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import logging
+import unittest
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import flowexecutor
+from swen import journal
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+FLOW = """---
+version: 1.0
+id: "journal-test"
+flow:
+- id: s_1
+  step: sh -c "echo run >> {dir}/counter; echo hello"
+- id: s_2
+  step: sh -c "test -e {dir}/ready"
+- id: s_3
+  step: cat
+  with_stdin: true
+"""
+
+
+class JournalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flow = FLOW.format(dir=self.tmp.name)
+        self.path = os.path.join(self.tmp.name, 'flow.journal')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _execute(self, resume=False):
+        fe = flowexecutor.FlowExecutor(self.flow, journal=self.path, resume=resume)
+        return (fe.execute(), [s.id for s in fe.execution_graph])
+
+    def test_resume_skips_checkpointed_steps(self):
+        ((exit_code, _, _), graph) = self._execute()
+        self.assertEqual(1, exit_code)
+        self.assertEqual(['s_1', 's_2'], graph)
+
+        Path(self.tmp.name, 'ready').touch()
+
+        ((exit_code, stdout, _), graph) = self._execute(resume=True)
+        self.assertEqual(0, exit_code)
+        self.assertEqual(b'', stdout)
+        self.assertEqual(['s_1', 's_2', 's_3'], graph)
+        self.assertEqual('run\n', Path(self.tmp.name, 'counter').read_text())
+
+    def test_resume_twice(self):
+        self._execute()
+        self._execute(resume=True)
+        Path(self.tmp.name, 'ready').touch()
+
+        ((exit_code, _, _), graph) = self._execute(resume=True)
+        self.assertEqual(0, exit_code)
+        self.assertEqual(['s_1', 's_2', 's_3'], graph)
+        self.assertEqual('run\n', Path(self.tmp.name, 'counter').read_text())
+
+    def test_without_resume_starts_over(self):
+        self._execute()
+        self._execute()
+
+        self.assertEqual('run\nrun\n', Path(self.tmp.name, 'counter').read_text())
+
+    def test_truncated_record_is_ignored(self):
+        self._execute()
+
+        with open(self.path, 'a') as f:
+            f.write('{"step": "s_2", "exit_')
+
+        Path(self.tmp.name, 'ready').touch()
+
+        ((exit_code, _, _), graph) = self._execute(resume=True)
+        self.assertEqual(0, exit_code)
+        self.assertEqual('run\n', Path(self.tmp.name, 'counter').read_text())
+
+    def test_resume_twice_after_truncated_record(self):
+        self._execute()
+
+        with open(self.path) as f:
+            header = f.readline()
+        with open(self.path, 'w') as f:
+            f.write(header + '{"step": "s_1", "exit_')
+
+        self._execute(resume=True)
+        self.assertEqual('run\nrun\n', Path(self.tmp.name, 'counter').read_text())
+
+        Path(self.tmp.name, 'ready').touch()
+
+        ((exit_code, _, _), graph) = self._execute(resume=True)
+        self.assertEqual(0, exit_code)
+        self.assertEqual(['s_1', 's_2', 's_3'], graph)
+        self.assertEqual('run\nrun\n', Path(self.tmp.name, 'counter').read_text())
+
+    def test_resume_looping_flow(self):
+        with open('flow/flow_0007/flow_0007.yml') as yml:
+            self.flow = yml.read()
+
+        ((exit_code, _, _), graph) = self._execute()
+        self.assertEqual(10, exit_code)
+        self.assertEqual(12, len(graph))
+
+        ((exit_code, stdout, _), graph) = self._execute(resume=True)
+        self.assertEqual(10, exit_code)
+        self.assertEqual(b'', stdout)
+        self.assertEqual(12, len(graph))
+        self.assertEqual(['call_me', 'call_me'], graph[-2:])
+
+    def test_journal_of_another_flow(self):
+        self._execute()
+        self.flow = self.flow.replace('journal-test', 'another-flow')
+
+        with self.assertRaises(journal.JournalError):
+            self._execute(resume=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3.6
+
+import sys
+import glob
+import logging
+import unittest
+import yaml
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import loader
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+YAML_TYPES = """---
+version: 1.0
+id: "id-test"
+count: 3
+negative: -15
+empty:
+enabled: yes
+disabled: false
+quoted: "yes"
+single: '1.0'
+on_exit_code: {0: s_2, "1-5": s_3}
+depends_on: [s_1, s_2]
+flow:
+- id: s_1
+  step: ./s_1.py
+  capture:
+    stderr: {tail: 64K}
+- id: s_2
+  doc: >
+    folded
+    text
+"""
+
+YAML_ANCHORS = """---
+defaults: &defaults
+  with_stdin: yes
+flow:
+- id: s_1
+  <<: *defaults
+- id: s_2
+  step: *defaults
+"""
+
+YAML_TAGS = """---
+id: !!str 123
+version: !!float 1
+"""
+
+
+class LoaderTests(unittest.TestCase):
+    def test_types(self):
+        self.assertEqual(loader.load(YAML_TYPES), yaml.safe_load(YAML_TYPES))
+
+    def test_fallback(self):
+        for data in [YAML_ANCHORS, YAML_TAGS]:
+            self.assertEqual(loader.load(data), yaml.safe_load(data))
+
+    def test_empty(self):
+        self.assertIsNone(loader.load(""))
+        self.assertEqual(loader.load("[]"), [])
+
+    def test_multiple_documents(self):
+        with self.assertRaises(yaml.YAMLError):
+            loader.load("--- 1\n--- 2\n")
+
+    def test_syntax_error(self):
+        with self.assertRaises(yaml.YAMLError):
+            loader.load("flow: [s_1\n")
+
+    def test_flows(self):
+        for path in sorted(glob.glob("flow/*/*.yml")) + ["swen_self_tests.yml"]:
+            with open(path) as yml:
+                data = yml.read()
+            self.assertEqual(loader.load(data), yaml.safe_load(data), path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import logging
+import unittest
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import step
+from swen import pipeline
+from swen import flowexecutor
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+FLOW = """---
+version: 1.0
+id: "metrics-test"
+flow:
+- id: s_1
+  step: printf hello
+- id: s_2
+  step: cat
+  with_stdin: true
+"""
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_step_metrics(self):
+        s = step.Step(id='s_1', step='sh -c "printf 12345; printf 123 >&2"')
+        s.execute()
+        m = s.metrics
+
+        self.assertEqual('s_1', m.step_id)
+        self.assertEqual(0, m.exit_code)
+        self.assertEqual(5, m.stdout_bytes)
+        self.assertEqual(3, m.stderr_bytes)
+        self.assertIsNone(m.stdin_bytes)
+        self.assertGreater(m.max_rss, 0)
+        self.assertIsNotNone(m.user_time)
+        self.assertIsNotNone(m.system_time)
+        self.assertGreaterEqual(m.wall_time, m.spawn_latency)
+
+    def test_step_metrics_with_stdin(self):
+        s = step.Step(id='s_1', step='cat', with_stdin=True)
+        s.execute(stdout=b'x' * 1000)
+
+        self.assertEqual(1000, s.metrics.stdin_bytes)
+        self.assertEqual(1000, s.metrics.stdout_bytes)
+
+    def test_metrics_of_expired_deadline(self):
+        s = step.Step(id='s_1', step='printf hello')
+        s.execute()
+        previous = s.metrics
+
+        (exit_code, _, _) = s.execute(deadline=0)
+
+        self.assertEqual(step.TIMEOUT_EXIT_CODE, exit_code)
+        self.assertIsNot(previous, s.metrics)
+        self.assertEqual(step.TIMEOUT_EXIT_CODE, s.metrics.exit_code)
+        self.assertIsNone(s.metrics.stdout_bytes)
+
+    def test_pipeline_metrics(self):
+        steps = [step.Step(id='s_1', step='printf hello'),
+                 step.Step(id='s_2', step='cat', with_stdin=True)]
+        pipeline.Pipeline(steps).execute()
+
+        self.assertIsNone(steps[0].metrics.stdout_bytes)
+        self.assertEqual(5, steps[1].metrics.stdout_bytes)
+        self.assertTrue(all(s.metrics.max_rss for s in steps))
+
+    def test_flow_metrics(self):
+        for streaming in (False, True):
+            fe = flowexecutor.FlowExecutor(FLOW, streaming=streaming)
+            fe.execute()
+
+            self.assertEqual(['s_1', 's_2'], [m.step_id for m in fe.metrics.steps])
+            self.assertEqual(['s_1', 's_2'], sorted(fe.metrics.by_step()))
+            self.assertEqual(5, fe.metrics.as_dicts()[1]['stdout_bytes'])
+
+    def test_openmetrics_export(self):
+        fe = flowexecutor.FlowExecutor(FLOW)
+        fe.execute()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'metrics.txt')
+            fe.metrics.write(path)
+            text = Path(path).read_text()
+
+        self.assertTrue(text.endswith('# EOF\n'))
+        self.assertIn('# TYPE swen_step_wall_seconds gauge', text)
+        self.assertIn('swen_step_stdout_bytes{flow="metrics-test",step="s_2",execution="1"} 5', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3.6
+
+import sys
+import logging
+import unittest
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import step
+from swen import graph
+from swen import parallel
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+LINES = b''.join(b'line %d\n' % i for i in range(1000))
+
+
+class ParallelTests(unittest.TestCase):
+
+    def test_split_lines(self):
+        parts = parallel.split_lines(LINES, partitions=3)
+
+        self.assertEqual(3, len(parts))
+        self.assertEqual(LINES, b''.join(parts))
+        self.assertTrue(all(bytes(part).endswith(b'\n') for part in parts))
+
+    def test_split_lines_by_chunk_size(self):
+        parts = parallel.split_lines(b'a\nbb\nccc\n', chunk=2)
+        self.assertEqual([b'a\n', b'bb\n', b'ccc\n'], [bytes(part) for part in parts])
+
+    def test_split_without_trailing_newline(self):
+        parts = parallel.split_lines(b'aaaa\nbbbb', partitions=2)
+        self.assertEqual([b'aaaa\n', b'bbbb'], [bytes(part) for part in parts])
+
+    def test_config(self):
+        self.assertEqual({'workers': 4, 'chunk': None, 'ordered': True}, parallel.config(4))
+        self.assertEqual({'workers': 2, 'chunk': 1024, 'ordered': False},
+                         parallel.config({'workers': 2, 'chunk': '1K', 'ordered': False}))
+
+    def test_ordered_output(self):
+        s = step.Step(id='s_1', step='cat', with_stdin=True, parallel=4)
+        self.assertEqual((0, LINES, b''), s.execute(stdout=LINES))
+        self.assertEqual(step.Status.TERMINATED, s.status)
+
+    def test_unordered_output(self):
+        s = step.Step(id='s_1', step='cat', with_stdin=True, parallel={'workers': 4, 'ordered': False})
+        (exit_code, stdout, _) = s.execute(stdout=LINES)
+
+        self.assertEqual(0, exit_code)
+        self.assertEqual(sorted(LINES.splitlines()), sorted(stdout.splitlines()))
+
+    def test_reduce(self):
+        s = step.Step(id='s_1', step='wc -l', with_stdin=True, parallel=4,
+                      reduce="awk '{ total += $1 } END { print total }'")
+        self.assertEqual((0, b'1000\n', b''), s.execute(stdout=LINES))
+
+    def test_failure(self):
+        s = step.Step(id='s_1', step='grep "line 999$"', with_stdin=True, parallel=4,
+                      reduce='wc -l')
+        (exit_code, stdout, _) = s.execute(stdout=LINES)
+
+        # grep fails on the partitions without a match, so the reducer never runs
+        self.assertEqual(1, exit_code)
+        self.assertEqual(b'line 999\n', stdout)
+
+    def test_parallel_needs_stdin(self):
+        with self.assertRaises(graph.FlowError):
+            step.Step(id='s_1', step='cat', parallel=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3.6
+
+import sys
+import logging
+import unittest
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import step
+from swen import pipeline
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+class PipelineTests(unittest.TestCase):
+    def test_pipeline_successful_execution(self):
+        steps = [step.Step(id="s_1", step="printf 'b\\na\\nc\\n'"),
+                 step.Step(id="s_2", step="sort", with_stdin=True),
+                 step.Step(id="s_3", step="head -n 2", with_stdin=True)]
+        (exit_code, stdout, stderr, s) = pipeline.Pipeline(steps).execute()
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(str(stdout, 'utf-8'), 'a\nb\n')
+        self.assertIs(s, steps[-1])
+        for st in steps:
+            self.assertEqual(st.status, step.Status.TERMINATED)
+            self.assertEqual(st.exit_code, 0)
+
+    def test_pipeline_with_buffered_input(self):
+        steps = [step.Step(id="s_1", step="sort", with_stdin=True),
+                 step.Step(id="s_2", step="wc -l", with_stdin=True)]
+        (exit_code, stdout, stderr, s) = pipeline.Pipeline(steps).execute(stdout=b"John\nBob\nAlice\n")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(str(stdout, 'utf-8').strip(), '3')
+
+    def test_pipeline_failed_execution(self):
+        steps = [step.Step(id="s_1", step="ls"),
+                 step.Step(id="s_2", step="false", with_stdin=True),
+                 step.Step(id="s_3", step="wc -l", with_stdin=True)]
+        (exit_code, stdout, stderr, s) = pipeline.Pipeline(steps).execute()
+        self.assertEqual(exit_code, 1)
+        self.assertIs(s, steps[1])
+        self.assertEqual(steps[2].exit_code, 0)
+
+    def test_pipeline_with_early_exit(self):
+        steps = [step.Step(id="s_1", step="yes"),
+                 step.Step(id="s_2", step="head -n 3", with_stdin=True)]
+        (exit_code, stdout, stderr, s) = pipeline.Pipeline(steps).execute()
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(str(stdout, 'utf-8'), 'y\ny\ny\n')
+        self.assertIs(s, steps[-1])
+
+    def test_pipeline_with_timeout(self):
+        steps = [step.Step(id="s_1", step="yes"),
+                 step.Step(id="s_2", step="sleep 30", with_stdin=True, timeout=0.5)]
+        (exit_code, stdout, stderr, s) = pipeline.Pipeline(steps).execute()
+        self.assertEqual(exit_code, step.TIMEOUT_EXIT_CODE)
+        self.assertIs(s, steps[0])
+        for st in steps:
+            self.assertEqual(st.status, step.Status.TIMED_OUT)
+
+    def test_pipeline_with_large_payload(self):
+        steps = [step.Step(id="s_1", step="head -c 10000000 /dev/zero"),
+                 step.Step(id="s_2", step="wc -c", with_stdin=True)]
+        (exit_code, stdout, stderr, s) = pipeline.Pipeline(steps).execute()
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(str(stdout, 'utf-8').strip(), '10000000')
+
+
+if __name__ == '__main__':
+    unittest.main()
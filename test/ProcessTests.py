@@ -0,0 +1,103 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import signal
+import logging
+import unittest
+from subprocess import PIPE
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import process
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+@unittest.skipUnless(hasattr(os, 'posix_spawnp'), 'os.posix_spawnp is not available')
+class SpawnedProcessTests(unittest.TestCase):
+
+    def test_exit_code(self):
+        p = process.SpawnedProcess(['sh', '-c', 'exit 3'])
+        self.assertEqual(3, p.wait())
+
+    def test_pipes(self):
+        p = process.SpawnedProcess(['sh', '-c', 'cat; echo err >&2'], stdin=PIPE, stdout=PIPE, stderr=PIPE)
+        p.stdin.write(b'hello')
+        p.stdin.close()
+
+        self.assertEqual(b'hello', p.stdout.read())
+        self.assertEqual(b'err\n', p.stderr.read())
+        self.assertEqual(0, p.wait())
+        p.stdout.close()
+        p.stderr.close()
+
+    def test_rusage(self):
+        p = process.SpawnedProcess(['true'])
+        rusage = process.wait(p)
+
+        self.assertEqual(0, p.returncode)
+        self.assertGreater(rusage.ru_maxrss, 0)
+
+    def test_killed_by_signal(self):
+        p = process.SpawnedProcess(['sleep', '10'])
+        p.kill()
+        self.assertEqual(-signal.SIGKILL, p.wait())
+
+    def test_sigpipe_is_restored(self):
+        p = process.SpawnedProcess(['yes'], stdout=PIPE)
+        p.stdout.read(10)
+        p.stdout.close()
+        self.assertEqual(-signal.SIGPIPE, p.wait())
+
+    def _spawn(self, backend, args):
+        saved = process.SPAWN_BACKEND
+        process.SPAWN_BACKEND = backend
+        try:
+            return process.spawn(args)
+        finally:
+            process.SPAWN_BACKEND = saved
+
+    def test_inheritable_fd_is_not_leaked(self):
+        (r, w) = os.pipe()
+        os.set_inheritable(w, True)
+        try:
+            for backend in ('auto', 'posix_spawn', 'popen'):
+                p = self._spawn(backend, ['sh', '-c', 'test -e /proc/self/fd/{}'.format(w)])
+                self.assertEqual(1, p.wait())
+        finally:
+            os.close(r)
+            os.close(w)
+
+        # Without inheritable descriptors, steps are still started with posix_spawn
+        if process._inheritable_fds() == []:
+            p = self._spawn('posix_spawn', ['true'])
+            self.assertIsInstance(p, process.SpawnedProcess)
+            p.wait()
+
+    def test_auto_backend(self):
+        p = self._spawn('auto', ['true'])
+        p.wait()
+
+        if process._POPEN_USES_VFORK:
+            self.assertNotIsInstance(p, process.SpawnedProcess)
+        elif process._inheritable_fds() == []:
+            self.assertIsInstance(p, process.SpawnedProcess)
+
+    def test_new_session(self):
+        p = process.SpawnedProcess(['sleep', '10'], start_new_session=True)
+        try:
+            self.assertEqual(p.pid, os.getsid(p.pid))
+        finally:
+            process.kill_group(p, grace=1)
+
+    def test_unknown_command(self):
+        with self.assertRaises(FileNotFoundError):
+            process.SpawnedProcess(['swen-no-such-command'])
+
+
+if __name__ == '__main__':
+    unittest.main()
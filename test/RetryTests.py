@@ -0,0 +1,150 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import time
+import asyncio
+import logging
+import unittest
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import step
+from swen import graph
+from swen import retry
+from swen import flowexecutor
+from swen import asyncflowexecutor
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+# Fails until it has been executed $1 times
+FLAKY = 'echo x >> "$(dirname "$0")/counter"; test "$(wc -l < "$(dirname "$0")/counter")" -ge "$1"\n'
+
+SEQUENTIAL_FLOW = """---
+version: 1.0
+id: "retry-test"
+flow:
+- id: flaky
+  step: {step}
+  retry: {retry}
+- id: after
+  step: echo done
+"""
+
+DAG_FLOW = """---
+version: 1.0
+id: "retry-dag-test"
+flow:
+- id: flaky
+  step: {step}
+  retry: {retry}
+- id: slow
+  step: sleep 0.2
+- id: after
+  step: echo done
+  needs: [flaky, slow]
+"""
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def test_shorthand(self):
+        policy = step.Step(id='s', step='true', retry=2).retry
+
+        self.assertTrue(policy.should_retry(1, 1))
+        self.assertTrue(policy.should_retry(2, 1))
+        self.assertFalse(policy.should_retry(3, 1))
+        self.assertFalse(policy.should_retry(1, 0))
+
+    def test_no_retry(self):
+        self.assertIsNone(step.Step(id='s', step='true').retry)
+
+    def test_on_codes(self):
+        policy = retry.RetryPolicy(max=3, on_codes=[1, '75-78'])
+
+        self.assertTrue(policy.should_retry(1, 1))
+        self.assertTrue(policy.should_retry(1, 76))
+        self.assertFalse(policy.should_retry(1, 2))
+
+    def test_backoff(self):
+        policy = retry.RetryPolicy(max=5, backoff=1, factor=2, max_backoff=5)
+        self.assertEqual([1, 2, 4, 5, 5], [policy.delay(n) for n in range(1, 6)])
+
+    def test_jitter(self):
+        policy = retry.RetryPolicy(max=5, backoff=1, jitter=0.5)
+        self.assertTrue(all(0.5 <= policy.delay(1) <= 1.5 for _ in range(100)))
+
+    def test_invalid_settings(self):
+        with self.assertRaises(graph.FlowError):
+            step.Step(id='s', step='true', retry={'tries': 3})
+        with self.assertRaises(graph.FlowError):
+            step.Step(id='s', step='true', retry={'max': 'three'})
+
+    def test_invalid_settings_fail_at_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            marker = os.path.join(tmp, 'ran')
+            data = 'flow:\n- id: s_1\n  step: touch {}\n- id: s_2\n  step: "false"\n  retry: {{tries: 3}}\n'.format(marker)
+            with self.assertRaises(graph.FlowError):
+                flowexecutor.FlowExecutor(data).execute()
+            self.assertFalse(os.path.exists(marker))
+
+
+class RetryExecutionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.script = os.path.join(self.tmp.name, 'flaky.sh')
+        Path(self.script).write_text(FLAKY)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _flow(self, template, times, retry_settings):
+        return template.format(step='sh {} {}'.format(self.script, times), retry=retry_settings)
+
+    def test_sequential_retry(self):
+        fe = flowexecutor.FlowExecutor(self._flow(SEQUENTIAL_FLOW, 3, '{max: 3, backoff: 0.01}'))
+        (exit_code, stdout, _) = fe.execute()
+
+        self.assertEqual(0, exit_code)
+        self.assertEqual(b'done\n', stdout)
+        self.assertEqual(['flaky', 'flaky', 'flaky', 'after'], [s.id for s in fe.execution_graph])
+        self.assertEqual([1, 2, 3, 1], [m.attempt for m in fe.metrics.steps])
+        self.assertEqual([1, 1, 0, 0], [m.exit_code for m in fe.metrics.steps])
+
+    def test_retries_exhausted(self):
+        fe = flowexecutor.FlowExecutor(self._flow(SEQUENTIAL_FLOW, 5, '{max: 2, backoff: 0.01}'))
+        (exit_code, _, _) = fe.execute()
+
+        self.assertEqual(1, exit_code)
+        self.assertEqual(['flaky'] * 3, [s.id for s in fe.execution_graph])
+
+    def test_dag_retry_does_not_hold_a_worker(self):
+        fe = flowexecutor.FlowExecutor(self._flow(DAG_FLOW, 2, '{max: 1, backoff: 0.3}'), max_parallel=1)
+        start = time.monotonic()
+        (exit_code, stdout, _) = fe.execute()
+
+        self.assertEqual(0, exit_code)
+        self.assertEqual(b'done\n', stdout)
+        # `slow` runs during the backoff of `flaky` instead of after it
+        self.assertLess(time.monotonic() - start, 0.5 + 0.2)
+        self.assertEqual(['flaky', 'slow', 'flaky', 'after'], [s.id for s in fe.execution_graph])
+
+    def test_async_retry(self):
+        async def _execute():
+            fe = asyncflowexecutor.AsyncFlowExecutor(self._flow(DAG_FLOW, 2, '{max: 1, backoff: 0.01}'))
+            return (await fe.execute(), fe)
+
+        ((exit_code, _, _), fe) = asyncio.get_event_loop().run_until_complete(_execute())
+
+        self.assertEqual(0, exit_code)
+        self.assertEqual([1, 2], [m.attempt for m in fe.metrics.steps if m.step_id == 'flaky'])
+
+
+if __name__ == '__main__':
+    unittest.main()
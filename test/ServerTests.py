@@ -0,0 +1,102 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import logging
+import unittest
+import tempfile
+import socket
+import threading
+import concurrent.futures
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import client
+from swen import server
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+FLOW = """---
+version: 1.0
+id: "server-test"
+vars:
+  word: hello
+flow:
+- id: s_1
+  step: printf $word
+- id: s_2
+  step: tr a-z A-Z
+  with_stdin: true
+"""
+
+
+class ServerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmp.name, 'swen.sock')
+        self.server = server.FlowServer(self.socket_path, max_flows=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.tmp.cleanup()
+
+    def test_ping(self):
+        self.assertEqual({'pong': True}, client.request({'command': 'ping'}, self.socket_path))
+
+    def test_socket_is_private(self):
+        self.assertEqual(0o600, os.stat(self.socket_path).st_mode & 0o777)
+
+    def test_request_not_an_object(self):
+        for message in ([], 1, "flow"):
+            reply = client.request(message, self.socket_path)
+            self.assertIn('JSON object', reply['error'])
+
+    def test_socket_in_use(self):
+        with self.assertRaises(FileExistsError):
+            server.FlowServer(self.socket_path)
+        self.assertEqual({'pong': True}, client.request({'command': 'ping'}, self.socket_path))
+
+    def test_file_is_not_removed(self):
+        path = os.path.join(self.tmp.name, 'file')
+        Path(path).write_text('data')
+        with self.assertRaises(FileExistsError):
+            server.FlowServer(path)
+        self.assertEqual('data', Path(path).read_text())
+
+    def test_stale_socket_is_removed(self):
+        path = os.path.join(self.tmp.name, 'stale.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(path)
+        stale = server.FlowServer(path)
+        stale.server_close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_submit(self):
+        self.assertEqual((0, b'HELLO', b''), client.submit(FLOW, self.socket_path))
+
+    def test_submit_with_vars(self):
+        (exit_code, stdout, _) = client.submit(FLOW, self.socket_path, vars={'word': 'bye'})
+        self.assertEqual(b'BYE', stdout)
+
+    def test_invalid_flow(self):
+        with self.assertRaises(client.ClientError):
+            client.submit('flow: [', self.socket_path)
+
+    def test_concurrent_submissions(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: client.submit(FLOW, self.socket_path), range(8)))
+
+        self.assertEqual([(0, b'HELLO', b'')] * 8, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
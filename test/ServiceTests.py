@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import socket
+import logging
+import unittest
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import service
+from swen import process
+from swen import graph
+from swen import capture
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+class ServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.services = []
+
+    def tearDown(self):
+        for s in self.services:
+            s.stop()
+        self.tmp.cleanup()
+
+    def _start(self, script, config=True):
+        s = service.Service(['sh', '-c', script], service.probes('s_1', config),
+                            (capture.Capture(), capture.Capture()))
+        self.services.append(s)
+        return s
+
+    def test_probes(self):
+        self.assertEqual(service.probes('s_1', True), {})
+        self.assertEqual(service.probes('s_1', {'tcp': 8080})['tcp'], ('localhost', 8080))
+        self.assertEqual(service.probes('s_1', {'tcp': "127.0.0.1:8080"})['tcp'], ('127.0.0.1', 8080))
+        self.assertEqual(service.probes('s_1', {'file': "/tmp/x"})['file'], "/tmp/x")
+
+        for config in ["yes", {'tcp': "host:port"}, {'http': "/"}]:
+            with self.assertRaises(graph.FlowError):
+                service.probes('s_1', config)
+
+    def test_ready_when_started(self):
+        s = self._start("exec sleep 60")
+        self.assertEqual(s.wait_ready(), 0)
+
+    def test_log_probe(self):
+        s = self._start("echo starting; sleep 0.2; echo listening >&2; exec sleep 60", {'log': "^listen"})
+        start = time.monotonic()
+        self.assertEqual(s.wait_ready(process.deadline_after(10)), 0)
+        self.assertLess(time.monotonic() - start, 5)
+        self.services.remove(s)
+        (stdout, stderr) = s.stop()
+        self.assertEqual(stdout, b"starting\n")
+        self.assertEqual(stderr, b"listening\n")
+
+    def test_file_probe(self):
+        path = os.path.join(self.tmp.name, "pid")
+        s = self._start("sleep 0.2; echo $$ > {}; exec sleep 60".format(path), {'file': path})
+        self.assertEqual(s.wait_ready(process.deadline_after(10)), 0)
+        self.assertTrue(os.path.exists(path))
+
+    def test_tcp_probe(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        script = "sleep 0.2; exec {} -c 'import socket, time; s = socket.socket(); s.bind((\"127.0.0.1\", {})); s.listen(); time.sleep(60)'"
+        s = self._start(script.format(sys.executable, port), {'tcp': "127.0.0.1:{}".format(port)})
+        self.assertEqual(s.wait_ready(process.deadline_after(10)), 0)
+
+    def test_exit_before_ready(self):
+        s = self._start("exit 3", {'log': "never"})
+        self.assertEqual(s.wait_ready(process.deadline_after(10)), 3)
+
+        s = self._start("exit 0", {'log': "never"})
+        self.assertEqual(s.wait_ready(process.deadline_after(10)), 1)
+
+    def test_not_ready_in_time(self):
+        s = self._start("exec sleep 60", {'log': "never"})
+        start = time.monotonic()
+        self.assertIsNone(s.wait_ready(process.deadline_after(0.3)))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_stop_process_group(self):
+        path = os.path.join(self.tmp.name, "child")
+        s = self._start("sleep 60 & echo $! > {}; wait".format(path), {'file': path})
+        self.assertEqual(s.wait_ready(process.deadline_after(10)), 0)
+
+        with open(path) as f:
+            child = int(f.read())
+
+        self.services.remove(s)
+        s.stop()
+
+        # Killed, at most waiting to be reaped by init
+        try:
+            with open("/proc/{}/stat".format(child)) as f:
+                self.assertEqual(f.read().split()[2], "Z")
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == '__main__':
+    unittest.main()
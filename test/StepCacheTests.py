@@ -0,0 +1,121 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import time
+import logging
+import unittest
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import step
+from swen import stepcache
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+class StepCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = stepcache.StepCache(os.path.join(self.tmp.name, 'steps'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_argv_stdin_and_env(self):
+        key = stepcache.StepCache.key(['cat'], b'a', {'X': '1'})
+
+        self.assertEqual(key, stepcache.StepCache.key(['cat'], b'a', {'X': '1'}))
+        self.assertNotEqual(key, stepcache.StepCache.key(['cat', '-n'], b'a', {'X': '1'}))
+        self.assertNotEqual(key, stepcache.StepCache.key(['cat'], b'b', {'X': '1'}))
+        self.assertNotEqual(key, stepcache.StepCache.key(['cat'], b'a', {'X': '2'}))
+
+    def test_key_depends_on_inputs(self):
+        path = os.path.join(self.tmp.name, 'input.txt')
+        Path(path).write_text('one')
+        key = stepcache.StepCache.key(['cat', path], inputs=[path])
+
+        self.assertEqual(key, stepcache.StepCache.key(['cat', path], inputs=[path]))
+
+        Path(path).write_text('two')
+        self.assertNotEqual(key, stepcache.StepCache.key(['cat', path], inputs=[path]))
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.store.get('ab' * 32))
+
+        self.store.put('ab' * 32, (0, b'out', b'err'))
+
+        self.assertEqual((0, b'out', b'err'), self.store.get('ab' * 32))
+
+    def test_put_and_get_without_outputs(self):
+        self.store.put('ab' * 32, (0, None, b''))
+
+        self.assertEqual((0, None, b''), self.store.get('ab' * 32))
+
+    def test_shared_root_is_not_used(self):
+        root = os.path.join(self.tmp.name, 'shared')
+        os.mkdir(root)
+        os.chmod(root, 0o777)
+        store = stepcache.StepCache(root)
+
+        store.put('ab' * 32, (0, b'out', b'err'))
+
+        self.assertIsNone(store.get('ab' * 32))
+        self.assertEqual([], os.listdir(root))
+
+    def test_lru_eviction(self):
+        store = stepcache.StepCache(os.path.join(self.tmp.name, 'small'), max_size=2 * 1024)
+        payload = b'x' * 900
+
+        store.put('aa' * 32, (0, payload, b''))
+        time.sleep(0.01)
+        store.put('bb' * 32, (0, payload, b''))
+        time.sleep(0.01)
+        # Touch the oldest entry so that the second one is evicted instead
+        store.get('aa' * 32)
+        time.sleep(0.01)
+        store.put('cc' * 32, (0, payload, b''))
+
+        self.assertIsNotNone(store.get('aa' * 32))
+        self.assertIsNone(store.get('bb' * 32))
+        self.assertIsNotNone(store.get('cc' * 32))
+
+    def test_cached_step_runs_once(self):
+        counter = os.path.join(self.tmp.name, 'counter')
+        s = step.Step(id='s_1', step='sh -c "echo run >> {0}; cat {0}"'.format(counter), cache=True)
+
+        first = s.execute(step_cache=self.store)
+        second = s.execute(step_cache=self.store)
+
+        self.assertEqual((0, b'run\n', b''), first)
+        self.assertEqual(first, second)
+        self.assertEqual(step.Status.TERMINATED, s.status)
+        self.assertEqual('run\n', Path(counter).read_text())
+
+    def test_cached_step_reruns_when_input_changes(self):
+        path = os.path.join(self.tmp.name, 'input.txt')
+        Path(path).write_text('one')
+        s = step.Step(id='s_1', step='cat {}'.format(path), cache={'inputs': [path]})
+
+        self.assertEqual(b'one', s.execute(step_cache=self.store)[1])
+
+        Path(path).write_text('two')
+        self.assertEqual(b'two', s.execute(step_cache=self.store)[1])
+
+    def test_failures_are_not_cached(self):
+        counter = os.path.join(self.tmp.name, 'counter')
+        s = step.Step(id='s_1', step='sh -c "echo run >> {}; false"'.format(counter), cache=True)
+
+        s.execute(step_cache=self.store)
+        s.execute(step_cache=self.store)
+
+        self.assertEqual('run\nrun\n', Path(counter).read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
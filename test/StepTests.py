@@ -4,6 +4,8 @@ import sys
 import os
 import stat
 import json
+import shlex
+import time
 import logging
 import unittest
 from pathlib import Path
@@ -36,9 +38,19 @@ class FlowTests(unittest.TestCase):
             '    "on_success": null,\n'\
             '    "on_failure": null,\n'\
             '    "on_exit_code": null,\n'\
+            '    "capture": null,\n'\
+            '    "depends_on": null,\n'\
+            '    "timeout": null,\n'\
+            '    "cache": null,\n'\
+            '    "parallel": null,\n'\
+            '    "reduce": null,\n'\
+            '    "retry": null,\n'\
+            '    "service": null,\n'\
             '    "exit_code": null,\n'\
             '    "status": "READY",\n'\
-            '    "on_status_change": null\n'\
+            '    "on_status_change": null,\n'\
+            '    "metrics": null,\n'\
+            '    "supervisor": null\n'\
             '}'
 
         self.assertTrue('"status": "READY"' in str(s))
@@ -96,6 +108,68 @@ class FlowTests(unittest.TestCase):
         self.assertEqual(exit_code, 1)
         self.assertTrue('"status": "TERMINATED"' in str(s))
 
+    def test_split_command(self):
+        for command in ["ls", "ls -a  -l\t/tmp", "", "echo 'a b' \"c d\"", "echo a\\ b", "echo \u00e9\u00a0x", "grep \"Hello from\""]:
+            self.assertEqual(step.split_command(command), shlex.split(command))
+
+    def test_step_slots(self):
+        s = step.Step(id="".join(["s", "_1"]), step="true", on_success="".join(["s", "_2"]))
+        self.assertIs(s.id, "s_1")
+        self.assertIs(s.on_success, "s_2")
+        with self.assertRaises(AttributeError):
+            s.unknown = None
+
+    def test_step_with_large_stderr(self):
+        s = step.Step(id="Step writing more than a pipe buffer to stderr",
+                      step="sh -c 'head -c 1000000 /dev/zero >&2; echo done'")
+        (exit_code, stdout, stderr) = s.execute()
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(str(stdout, 'utf-8'), 'done\n')
+        self.assertEqual(len(stderr), 1000000)
+
+    def test_step_with_capture_limits(self):
+        s = step.Step(id="Step with bounded stderr",
+                      step="sh -c 'seq 1 100000 >&2; echo done'",
+                      capture={'stderr': {'head': 2, 'tail': 7}})
+        (exit_code, stdout, stderr) = s.execute()
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(str(stdout, 'utf-8'), 'done\n')
+        self.assertEqual(str(stderr, 'utf-8'), '1\n100000\n')
+
+    def test_step_with_timeout(self):
+        s = step.Step(id="Step exceeding its timeout",
+                      step="sh -c 'echo started; sleep 30'",
+                      timeout=0.5)
+        start = time.monotonic()
+        (exit_code, stdout, stderr) = s.execute()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(exit_code, step.TIMEOUT_EXIT_CODE)
+        self.assertEqual(s.status, step.Status.TIMED_OUT)
+        self.assertEqual(str(stdout, 'utf-8'), 'started\n')
+        self.assertTrue('"status": "TIMED_OUT"' in str(s))
+
+    def test_step_with_timeout_kills_process_tree(self):
+        s = step.Step(id="Step with a background child holding stdout",
+                      step="sh -c 'sleep 30 & sleep 30'",
+                      timeout=0.5)
+        start = time.monotonic()
+        (exit_code, stdout, stderr) = s.execute()
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(s.status, step.Status.TIMED_OUT)
+
+    def test_step_within_timeout(self):
+        s = step.Step(id="Step finishing in time", step="sort", with_stdin=True, timeout=10)
+        (exit_code, stdout, stderr) = s.execute(stdout=b"b\na\n")
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(str(stdout, 'utf-8'), 'a\nb\n')
+        self.assertEqual(s.status, step.Status.TERMINATED)
+
+    def test_step_with_expired_deadline(self):
+        s = step.Step(id="Step started after the flow deadline", step="ls")
+        (exit_code, stdout, stderr) = s.execute(deadline=time.monotonic() - 1)
+        self.assertEqual(exit_code, step.TIMEOUT_EXIT_CODE)
+        self.assertEqual(s.status, step.Status.TIMED_OUT)
+
     def test_step_with_status_transitions(self):
         def status_callback(current_status=None, new_status=None):
             if current_status == 0:
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3.6
+
+import sys
+import logging
+import unittest
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import substitution
+from swen import graph
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+class SubstitutionTests(unittest.TestCase):
+    def test_render(self):
+        parsed_yaml = {'id': 'f', 'flow': [{'id': 's_1', 'step': '$cmd ${arg}s'}, {'id': 's_2', 'step': 'date'}]}
+        rendered = substitution.Substitution(parsed_yaml).render({'cmd': 'ls', 'arg': '-l'})
+        self.assertEqual(rendered['flow'][0]['step'], 'ls -ls')
+        self.assertEqual(parsed_yaml['flow'][0]['step'], '$cmd ${arg}s')
+        self.assertIs(rendered['flow'][1], parsed_yaml['flow'][1])
+
+    def test_keys_and_literals(self):
+        parsed_yaml = {'$key': 'cost: 5$ or $$x\\.tar', 'n': 5}
+        plan = substitution.Substitution(parsed_yaml)
+        self.assertTrue(plan.has_placeholders)
+        self.assertEqual(plan.render({'x': 'f'}), {'$key': 'cost: 5$ or $f\\.tar', 'n': 5})
+        self.assertFalse(substitution.Substitution({'step': 'awk "{print $1}"'}).has_placeholders)
+
+    def test_typed_values(self):
+        plan = substitution.Substitution({'timeout': '$t', 'doc': 'after $t s, $none'})
+        self.assertEqual(plan.render({'t': 5, 'none': None}), {'timeout': 5, 'doc': 'after 5 s, '})
+
+    def test_resolve(self):
+        flow_vars = {'path': '$root/$flow_id', 'root': 'flow', 'flow_id': '${name}_0006', 'name': 'flow'}
+        self.assertEqual(substitution.resolve(flow_vars),
+                         {'path': 'flow/flow_0006', 'root': 'flow', 'flow_id': 'flow_0006', 'name': 'flow'})
+
+    def test_resolve_cycle(self):
+        with self.assertRaisesRegex(graph.FlowError, 'a -> b -> c -> a'):
+            substitution.resolve({'a': '$b', 'b': 'x$c', 'c': '$a', 'd': 'y'})
+        with self.assertRaises(graph.FlowError):
+            substitution.resolve({'a': '$a'})
+
+    def test_unknown_var(self):
+        with self.assertRaises(graph.FlowError):
+            substitution.resolve({'a': '$b'})
+        with self.assertRaises(graph.FlowError):
+            substitution.Substitution({'step': 'ls $dir'}).render({'cmd': 'ls'})
+
+    def test_cheetah_syntax(self):
+        for text in ['#if $a', '## comment', '$a.upper()', '$f(1)', '$a[0]', '${a.b}', '\\$a', '$!a', '$*a']:
+            self.assertIsNotNone(substitution.CHEETAH_SYNTAX.search(text), text)
+        for text in ['$a', '${a}', '$a.', '$a\\.tar', 'a # b', 'awk "{print $1}"']:
+            self.assertIsNone(substitution.CHEETAH_SYNTAX.search(text), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
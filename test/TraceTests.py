@@ -0,0 +1,112 @@
+#!/usr/bin/env python3.6
+
+import sys
+import os
+import logging
+import unittest
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path('.').cwd().parent))
+from swen import flow
+from swen import step
+from swen import trace
+from swen import flowexecutor
+
+
+logging.basicConfig(
+    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+    level=logging.DEBUG
+)
+
+
+YAML = """---
+version: 1.0
+id: "trace-test"
+flow:
+- id: s_1
+  step: ./s_1.py
+- id: s_2
+  step: ./s_2.py
+"""
+
+
+class TraceTests(unittest.TestCase):
+    def setUp(self):
+        self.flow = flow.Flow(YAML)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _add(self, t, step_id, exit_code):
+        s = self.flow.steps[step_id]
+        s._exit_code = exit_code
+        s._status = step.Status.TERMINATED
+        t.add(s)
+
+    def test_records(self):
+        t = trace.ExecutionTrace(self.flow.table)
+        self.assertEqual(t, [])
+
+        self._add(t, "s_1", 0)
+        self._add(t, "s_2", None)
+
+        self.assertEqual(len(t), 2)
+        self.assertEqual([r.id for r in t], ["s_1", "s_2"])
+        self.assertEqual(t[1].index, 1)
+        self.assertEqual(t[-1].exit_code, None)
+        self.assertEqual(t[0].status, step.Status.TERMINATED)
+        self.assertEqual(t[0].started, None)
+        self.assertTrue("TERMINATED" in str(t[0]))
+        self.assertEqual([r.id for r in t[1:]], ["s_2"])
+
+        with self.assertRaises(IndexError):
+            t[2]
+
+    def test_ring_buffer(self):
+        t = trace.ExecutionTrace(self.flow.table, capacity=3)
+
+        for code in range(10):
+            self._add(t, "s_1", code)
+
+        self.assertEqual(len(t), 3)
+        self.assertEqual(t.dropped, 7)
+        self.assertEqual([r.exit_code for r in t], [7, 8, 9])
+        self.assertEqual([r.exit_code for r in t.history()], [7, 8, 9])
+
+    def test_spill(self):
+        path = os.path.join(self.tmp.name, "trace")
+        t = trace.ExecutionTrace(self.flow.table, capacity=2, spill=path)
+
+        for code in range(10000):
+            self._add(t, "s_1" if code % 2 else "s_2", code)
+        t.close()
+
+        self.assertEqual(len(t), 2)
+        history = list(t.history())
+        self.assertEqual([r.exit_code for r in history], list(range(10000)))
+        self.assertEqual(history[0].id, "s_2")
+
+    def test_invalid_capacity(self):
+        with self.assertRaises(ValueError):
+            trace.ExecutionTrace(self.flow.table, capacity=0)
+
+    def test_loop_keeps_every_exit_code(self):
+        with open("flow/flow_0007/flow_0007.yml") as yml:
+            fe = flowexecutor.FlowExecutor(yml, trace_size=4)
+            (exit_code, _, _) = fe.execute()
+
+        eg = fe.execution_graph
+        self.assertEqual(exit_code, 10)
+        self.assertEqual([r.exit_code for r in eg], [0, 0, 0, 10])
+        self.assertEqual(eg[-1].stdout_bytes, 0)
+        self.assertLessEqual(eg[-1].started, eg[-1].finished)
+
+        # Metrics are bounded like the trace
+        self.assertEqual([m.exit_code for m in fe.metrics.steps], [0, 0, 0, 10])
+        self.assertEqual(fe.metrics.dropped, 8)
+        self.assertIn('execution="11"', fe.metrics.to_openmetrics())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -285,7 +285,9 @@ daemonize()
 int
 main(int argc, char *argv[])
 {
-    daemonize();
+    // -f: stay in the foreground (e.g. when supervised by swen)
+    if (argc < 2 || std::string(argv[1]) != "-f")
+        daemonize();
 
     setlogmask(LOG_UPTO (LOG_INFO));
     openlog("tcp_server", LOG_CONS | LOG_PID | LOG_NDELAY, LOG_LOCAL1);
@@ -2,30 +2,85 @@
 
 import logging
 import argparse
-import yaml
-import subprocess
 import sys
 
 from pathlib import Path
 sys.path.append(str(Path('.').cwd().parent))
 from swen import flowexecutor
-
-
-logging.basicConfig(
-    format="%(asctime)s %(name)s %(levelname)s: %(message)s",
-    level=logging.DEBUG
-)
+from swen import batch
 
 
 def main():
     parser = argparse.ArgumentParser(prog='swen')
-    parser.add_argument('-f', '--flow', required=True)
+    parser.add_argument('-f', '--flow', required=True, action='append',
+                        help='flow file, directory or glob (can be repeated)')
+    parser.add_argument('-s', '--streaming', action='store_true',
+                        help='connect consecutive with_stdin steps with OS pipes')
+    parser.add_argument('-j', '--max-parallel', type=int,
+                        help='maximum number of steps running at once in each DAG flow')
+
+    parser.add_argument('--journal',
+                        help='checkpoint the execution of a single flow to this file')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue the flow from the last checkpoint of --journal')
+
+    parser.add_argument('-m', '--metrics',
+                        help='write the metrics of the steps of a single flow to this file (OpenMetrics text)')
+    parser.add_argument('--trace-size', type=int,
+                        help='keep only the last TRACE_SIZE steps of the execution trace and their metrics in memory')
+    parser.add_argument('--trace-file',
+                        help='append the steps dropped from the execution trace to this file')
+
+    parser.add_argument('-w', '--workers', type=int,
+                        help='maximum number of flows running at once')
+    parser.add_argument('-p', '--processes', action='store_true',
+                        help='run flows in worker processes instead of threads')
+    parser.add_argument('-r', '--report',
+                        help='write the aggregated JSON report of a batch to this file')
+
+    parser.add_argument('-l', '--log-level', default='WARNING',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='messages below this level are not even formatted')
 
     args = parser.parse_args()
 
-    with open(args.flow) as yml:
-        fe = flowexecutor.FlowExecutor(yml) 
-        return fe.execute()
+    logging.basicConfig(
+        format="%(asctime)s %(name)s %(levelname)s: %(message)s",
+        level=getattr(logging, args.log_level)
+    )
+
+    if args.resume and args.journal is None:
+        parser.error('--resume requires --journal')
+
+    try:
+        flows = [path for pattern in args.flow for path in batch.BatchRunner.expand(pattern)]
+    except FileNotFoundError as e:
+        parser.error(str(e))
+
+    if len(flows) == 1 and args.report is None:
+        with open(flows[0]) as yml:
+            fe = flowexecutor.FlowExecutor(yml, streaming=args.streaming, max_parallel=args.max_parallel,
+                                           journal=args.journal, resume=args.resume,
+                                           trace_size=args.trace_size, trace_file=args.trace_file)
+            try:
+                return fe.execute()
+            finally:
+                if args.metrics is not None:
+                    fe.metrics.write(args.metrics)
+
+    runner = batch.BatchRunner(workers=args.workers, processes=args.processes, streaming=args.streaming,
+                               max_parallel=args.max_parallel)
+    for path in flows:
+        runner.add(path)
+
+    report = runner.run()
+    print(report.summary())
+
+    if args.report is not None:
+        with open(args.report, 'w') as f:
+            f.write(str(report))
+
+    sys.exit(report.exit_code)
 
 
 if __name__ == '__main__':